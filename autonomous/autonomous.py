@@ -13,7 +13,7 @@ from wpimath.geometry import Pose2d, Translation2d, Rotation2d
 
 
 def rotation_to_red_speaker(position: Translation2d) -> Rotation2d:
-    t = game.RED_SPEAKER_POSE.toPose2d().translation() - position
+    t = game.RED_SPEAKER_POSITION_2D - position
     return t.angle() + Rotation2d(math.pi)
 
 
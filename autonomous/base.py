@@ -19,6 +19,7 @@ from wpimath.geometry import Rotation2d, Translation2d, Pose2d
 from wpimath.spline import Spline3
 
 from utilities.position import Path
+from utilities.profiler import LoopProfiler
 import utilities.game as game
 
 from components.chassis import ChassisComponent
@@ -28,11 +29,15 @@ from controllers.note import NoteManager
 
 
 class AutoBase(AutonomousStateMachine):
+    # set by each mode, so the base class isn't picked up as one
+    MODE_NAME: str
+
     chassis: ChassisComponent
     note_manager: NoteManager
     field: Field2d
 
     intake_component: IntakeComponent
+    loop_profiler: LoopProfiler
 
     POSITION_TOLERANCE = 0.05
     SHOOTING_POSITION_TOLERANCE = 1
@@ -67,6 +72,8 @@ class AutoBase(AutonomousStateMachine):
         self.trajectory_marker = self.field.getObject("auto_trajectory")
         self.trajectory: Optional[Trajectory] = None
 
+        self.loop_profiler.wrap_component(self.MODE_NAME, self)
+
     def on_enable(self):
         # Setup starting position in the simulator
         starting_pose = self.get_starting_pose()
@@ -4,6 +4,7 @@ from components.chassis import ChassisComponent
 from controllers.note import NoteManager
 
 from utilities.game import is_red
+from utilities.profiler import LoopProfiler
 
 
 class SimpleAuto(AutonomousStateMachine):
@@ -12,6 +13,10 @@ class SimpleAuto(AutonomousStateMachine):
 
     chassis: ChassisComponent
     note_manager: NoteManager
+    loop_profiler: LoopProfiler
+
+    def setup(self) -> None:
+        self.loop_profiler.wrap_component(self.MODE_NAME, self)
 
     @timed_state(first=True, duration=5, next_state="drive_forward")
     def shoot_note(self) -> None:
@@ -0,0 +1,183 @@
+"""
+Compare deploying the intake with the profile on the rio against on the SparkMax.
+
+The intake arm is simulated from its identified feedforward gains, with the
+SparkMax's closed loop running at 1 kHz. With the rio profile, a new position
+setpoint arrives every 20 ms loop, as IntakeComponent.follow_rio_profile sends
+it. With the onboard profile the goal is sent once and the SparkMax steps the
+profile itself, closing a velocity loop as Smart Motion does, until the
+profile ends and it holds the goal with the position gains.
+
+Run with `python -m benchmarks.intake_profile`.
+"""
+
+import math
+import timeit
+from collections.abc import Callable
+
+from wpimath.controller import ArmFeedforward
+from wpimath.trajectory import TrapezoidProfile
+
+from components.intake import IntakeComponent
+
+LOOP_PERIOD = 0.02
+SPARK_PERIOD = 0.001
+PHYSICS_STEPS = 10  # per SparkMax period
+DURATION = 3.0  # s
+BATTERY_VOLTAGE = 12.0
+ITERATIONS = 20_000
+
+CONSTRAINTS = TrapezoidProfile.Constraints(maxVelocity=6.0, maxAcceleration=math.pi)
+FEEDFORWARD = ArmFeedforward(kS=0.0, kG=0.16, kV=1.17, kA=0.02)
+KF = 1 / (5700.0 * IntakeComponent.MOTOR_RPM_TO_SHAFT_RAD_PER_SEC)
+# (kP, kD) for the retract and deploy slots
+RETRACT_GAINS = (0.2, 0.4)
+DEPLOY_GAINS = (0.6, 0.6)
+SMART_MOTION_KP = IntakeComponent.SMART_MOTION_KP
+SMART_MOTION_KF = FEEDFORWARD.kV / BATTERY_VOLTAGE
+
+
+class Arm:
+    """The intake arm, between its hard stops."""
+
+    def __init__(self, position: float) -> None:
+        self.position = position
+        self.velocity = 0.0
+
+    def step(self, duty_cycle: float, dt: float) -> None:
+        voltage = max(-1.0, min(1.0, duty_cycle)) * BATTERY_VOLTAGE
+        for _ in range(PHYSICS_STEPS):
+            acceleration = (
+                voltage
+                - FEEDFORWARD.kG * math.cos(self.position)
+                - FEEDFORWARD.kV * self.velocity
+            ) / FEEDFORWARD.kA
+            self.velocity += acceleration * dt / PHYSICS_STEPS
+            self.position += self.velocity * dt / PHYSICS_STEPS
+            if not (
+                IntakeComponent.SHAFT_REV_DEPLOY_HARD_LIMIT
+                <= self.position
+                <= IntakeComponent.SHAFT_REV_RETRACT_HARD_LIMIT
+            ):
+                self.position = max(
+                    IntakeComponent.SHAFT_REV_DEPLOY_HARD_LIMIT,
+                    min(IntakeComponent.SHAFT_REV_RETRACT_HARD_LIMIT, self.position),
+                )
+                self.velocity = 0.0
+
+
+def simulate(
+    start: TrapezoidProfile.State,
+    goal: TrapezoidProfile.State,
+    gains: tuple[float, float],
+    onboard: bool,
+) -> list[float]:
+    """Move the arm from start to goal, returning its position every SparkMax period."""
+    kP, kD = gains
+    arm = Arm(start.position)
+    profile = TrapezoidProfile(CONSTRAINTS)
+    # like the component, only hold against gravity when retracting
+    arb_ff = (
+        FEEDFORWARD.calculate(goal.position, 0.0)
+        if goal is IntakeComponent.RETRACTED_STATE
+        else 0.0
+    )
+    setpoint = start.position
+    last_error = 0.0
+    profile.calculate(0.0, start, goal)
+    profile_end = profile.totalTime()
+    positions = []
+    ticks_per_loop = round(LOOP_PERIOD / SPARK_PERIOD)
+    for tick in range(round(DURATION / SPARK_PERIOD)):
+        t = tick * SPARK_PERIOD
+        if onboard and t < profile_end:
+            reference = profile.calculate(t, start, goal)
+            error = reference.velocity - arm.velocity
+            output = SMART_MOTION_KP * error + SMART_MOTION_KF * reference.velocity
+        elif onboard:
+            # the component holds the goal once the profile has finished
+            error = goal.position - arm.position
+            if t - SPARK_PERIOD < profile_end:
+                last_error = error
+            output = kP * error + kD * (error - last_error) + KF * goal.position
+        else:
+            if tick % ticks_per_loop == 0:
+                desired = profile.calculate(
+                    t, TrapezoidProfile.State(arm.position, arm.velocity), goal
+                )
+                setpoint = desired.position
+                if goal is IntakeComponent.RETRACTED_STATE:
+                    arb_ff = FEEDFORWARD.calculate(desired.position, desired.velocity)
+            error = setpoint - arm.position
+            output = kP * error + kD * (error - last_error) + KF * setpoint
+        last_error = error
+        arm.step(output + arb_ff / BATTERY_VOLTAGE, SPARK_PERIOD)
+        positions.append(arm.position)
+    return positions
+
+
+def settle_time(positions: list[float], goal: float) -> float:
+    """When the arm last came within the allowable error of the goal."""
+    for i in range(len(positions) - 1, -1, -1):
+        if abs(positions[i] - goal) >= IntakeComponent.ALLOWABLE_ERROR:
+            return (i + 1) * SPARK_PERIOD if i + 1 < len(positions) else math.inf
+    return 0.0
+
+
+def time_call(func: Callable[[], object]) -> float:
+    return min(timeit.repeat(func, number=ITERATIONS, repeat=5)) / ITERATIONS * 1e6
+
+
+def main() -> None:
+    moves = (
+        (
+            "deploy",
+            IntakeComponent.RETRACTED_STATE,
+            IntakeComponent.DEPLOYED_STATE,
+            DEPLOY_GAINS,
+        ),
+        (
+            "retract",
+            IntakeComponent.DEPLOYED_STATE,
+            IntakeComponent.RETRACTED_STATE,
+            RETRACT_GAINS,
+        ),
+        (
+            "hover",
+            IntakeComponent.RETRACTED_STATE,
+            IntakeComponent.HOVER_STATE,
+            RETRACT_GAINS,
+        ),
+    )
+    print(f"settle time to within {IntakeComponent.ALLOWABLE_ERROR} rad")
+    for name, start, goal, gains in moves:
+        rio = settle_time(simulate(start, goal, gains, False), goal.position)
+        onboard = settle_time(simulate(start, goal, gains, True), goal.position)
+        profile = TrapezoidProfile(CONSTRAINTS)
+        profile.calculate(0.0, start, goal)
+        print(
+            f"  {name:8} rio {rio:5.3f} s  onboard {onboard:5.3f} s"
+            f"  (profile {profile.totalTime():5.3f} s)"
+        )
+
+    profile = TrapezoidProfile(CONSTRAINTS)
+    measured = TrapezoidProfile.State(1.0, 2.0)
+    goal = IntakeComponent.DEPLOYED_STATE
+
+    def rio_loop() -> None:
+        desired = profile.calculate(0.1, measured, goal)
+        FEEDFORWARD.calculate(desired.position, desired.velocity)
+
+    applied = goal
+
+    def onboard_loop() -> None:
+        if goal is not applied:
+            raise AssertionError
+
+    print("rio time per loop")
+    print(f"  rio profile     {time_call(rio_loop):6.2f} us")
+    print(f"  onboard profile {time_call(onboard_loop):6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
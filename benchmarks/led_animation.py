@@ -0,0 +1,74 @@
+"""
+Time rendering and writing LED frames for each kind of animation.
+
+Run with `python -m benchmarks.led_animation`.
+"""
+
+import timeit
+
+from magicbot.magic_tunable import setup_tunables
+
+from components import led
+
+STRIP_LENGTH = (28 * 3) * 2 + (30 * 3) - 2
+ITERATIONS = 2_000
+
+
+def time_frames(strip: led.LightStrip) -> tuple[float, float]:
+    """Time a render, and a render followed by a write, in microseconds."""
+    render = min(timeit.repeat(strip.render, number=ITERATIONS, repeat=5))
+
+    def frame() -> None:
+        strip.last_write_time = -1.0
+        strip.execute()
+
+    execute = min(timeit.repeat(frame, number=ITERATIONS, repeat=5))
+    return render / ITERATIONS * 1e6, execute / ITERATIONS * 1e6
+
+
+def main() -> None:
+    strip = led.LightStrip(STRIP_LENGTH)
+    setup_tunables(strip, "status_lights")
+    # a fake clock a frame ahead every call, so animations change every frame
+    ticks = iter(range(10**9))
+
+    def clock() -> float:
+        return next(ticks) * 0.04
+
+    animations: dict[str, led.Animation | None] = {
+        "solid": None,
+        "chase": led.Chase(led.HsvColour.BLUE, clock=clock),
+        "gradient": led.Gradient(
+            led.HsvColour.RED, led.HsvColour.BLUE, speed=30, clock=clock
+        ),
+    }
+    strip.in_range()
+    print("per frame, every segment animated")
+    for name, animation in animations.items():
+        for segment in strip.segments:
+            if animation is None:
+                segment.animations.clear()
+            else:
+                strip.show(segment, animation, 0)
+        render, execute = time_frames(strip)
+        print(
+            f"  {name:10} render {render:7.1f} us  render and write {execute:7.1f} us"
+        )
+
+    for segment in strip.segments:
+        segment.animations.clear()
+    progress = 0.0
+
+    def spin_up() -> None:
+        nonlocal progress
+        progress = (progress + 0.01) % 1
+        strip.flywheel_spin_up(progress)
+        strip.last_write_time = -1.0
+        strip.execute()
+
+    execute = min(timeit.repeat(spin_up, number=ITERATIONS, repeat=5))
+    print(f"  progress   render and write {execute / ITERATIONS * 1e6:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare the precompiled shooting table against numpy.interp on the same data.
+
+Run with `python -m benchmarks.shooter_lookup`.
+"""
+
+import csv
+import random
+import timeit
+
+import numpy as np
+
+from components.shooter import ShooterComponent
+from utilities.lookup import LookupTable
+
+ITERATIONS = 20_000
+
+
+def read_columns() -> tuple[list[float], list[float], list[float]]:
+    with open(ShooterComponent.SHOOTING_TABLE_PATH, newline="") as f:
+        rows = list(csv.DictReader(line for line in f if not line.startswith("#")))
+    return (
+        [float(row["range"]) for row in rows],
+        [float(row["inclination"]) for row in rows],
+        [float(row["flywheel_speed"]) for row in rows],
+    )
+
+
+DISTANCES, ANGLES, SPEEDS = read_columns()
+
+
+def numpy_interp(range: float) -> tuple[float, float]:
+    """Interpolating each column with numpy, as ShooterComponent used to."""
+    angle = float(np.interp(range, DISTANCES, ANGLES))
+    speed = float(np.interp(range, DISTANCES, SPEEDS))
+    return angle, speed
+
+
+def time_calls(func, ranges: list[float]) -> float:
+    """Mean time per call in us."""
+
+    def run() -> None:
+        for range in ranges:
+            func(range)
+
+    return min(timeit.repeat(run, number=1, repeat=5)) / len(ranges) * 1e6
+
+
+def main() -> None:
+    rng = random.Random(4774)
+    ranges = [rng.uniform(0, 8) for _ in range(ITERATIONS)]
+    linear = LookupTable(DISTANCES, (ANGLES, SPEEDS))
+    cubic = LookupTable(DISTANCES, (ANGLES, SPEEDS), cubic=True)
+
+    print(f"{len(DISTANCES)} point table")
+    for name, func in (
+        ("np.interp x2", numpy_interp),
+        ("linear table", linear.evaluate),
+        ("cubic table", cubic.evaluate),
+    ):
+        print(f"{name:>14}: {time_calls(func, ranges):6.2f} us per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Report the time taken to import the robot code and the memory it holds.
+
+Each run imports robot.py in a fresh interpreter with -X importtime, so
+the times are for a cold start of the robot code. This is not a full boot:
+robotInit also starts the HAL and the devices.
+
+Run with `python -m benchmarks.startup`.
+"""
+
+import collections
+import json
+import statistics
+import subprocess
+import sys
+
+RUNS = 5
+TOP = 15
+# the robot code itself, as opposed to its dependencies
+OWN_PACKAGES = ("robot", "components", "controllers", "autonomous", "utilities", "ids")
+
+MEASURE = """
+import json, sys
+import robot
+from utilities.profiler import resident_memory
+print(json.dumps({"rss": resident_memory(), "numpy": "numpy" in sys.modules}))
+"""
+
+
+def import_once() -> tuple[dict[str, tuple[int, int]], dict]:
+    """Import the robot code, returning (self, cumulative) us per module and stats."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", MEASURE],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times, json.loads(completed.stdout.splitlines()[-1])
+
+
+def main() -> None:
+    runs = [import_once() for _ in range(RUNS)]
+    modules = runs[0][0].keys()
+    self_times = {
+        name: statistics.median(times[name][0] for times, _ in runs if name in times)
+        for name in modules
+    }
+    cumulative_times = {
+        name: statistics.median(times[name][1] for times, _ in runs if name in times)
+        for name in modules
+    }
+    rss = statistics.median(stats["rss"] for _, stats in runs if stats["rss"])
+    numpy_loaded = any(stats["numpy"] for _, stats in runs)
+
+    print(f"median of {RUNS} cold imports of robot.py")
+    print(f"import time {cumulative_times['robot'] / 1000:.0f} ms,", end=" ")
+    print(f"{len(modules)} modules, RSS {rss / 2**20:.1f} MiB,", end=" ")
+    print(f"numpy {'loaded' if numpy_loaded else 'not loaded'}")
+
+    print("\nrobot code, cumulative ms:")
+    for name in modules:
+        if name.split(".")[0] in OWN_PACKAGES and cumulative_times[name] >= 1000:
+            print(f"  {cumulative_times[name] / 1000:7.1f}  {name}")
+
+    packages: collections.defaultdict[str, float] = collections.defaultdict(float)
+    for name, self_time in self_times.items():
+        packages[name.split(".")[0]] += self_time
+    print(f"\ntop {TOP} packages, total self ms:")
+    for name in sorted(packages, key=packages.__getitem__, reverse=True)[:TOP]:
+        self_time = packages[name]
+        print(f"  {self_time / 1000:7.1f}  {name}")
+
+    print(f"\ntop {TOP} modules, self ms:")
+    for name in sorted(self_times, key=self_times.__getitem__, reverse=True)[:TOP]:
+        print(f"  {self_times[name] / 1000:7.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
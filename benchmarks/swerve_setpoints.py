@@ -0,0 +1,82 @@
+"""
+Compare the batched swerve setpoint calculation against the per module path.
+
+Run with `python -m benchmarks.swerve_setpoints`.
+"""
+
+import math
+import random
+import timeit
+
+from phoenix6.controls import PositionDutyCycle
+from wpimath.geometry import Rotation2d, Translation2d
+from wpimath.kinematics import ChassisSpeeds, SwerveDrive4Kinematics, SwerveModuleState
+
+from utilities.functions import rate_limit_module
+from utilities.swerve import SwerveSetpoints
+
+MODULE_POSITIONS = (
+    (0.2335, 0.2335),
+    (-0.2335, 0.2335),
+    (-0.2335, -0.2335),
+    (0.2335, -0.2335),
+)
+MAX_WHEEL_SPEED = 4.9
+ACCEL_LIMIT = 15
+DT = 0.02
+ITERATIONS = 20_000
+
+
+def random_commands(count: int) -> list[tuple[float, float, float, list[float]]]:
+    rng = random.Random(4774)
+    return [
+        (
+            rng.uniform(-4, 4),
+            rng.uniform(-4, 4),
+            rng.uniform(-4, 4),
+            [rng.uniform(-math.pi, math.pi) for _ in MODULE_POSITIONS],
+        )
+        for _ in range(count)
+    ]
+
+
+def main() -> None:
+    commands = random_commands(ITERATIONS)
+
+    kinematics = SwerveDrive4Kinematics(
+        *(Translation2d(x, y) for x, y in MODULE_POSITIONS)
+    )
+    states = [SwerveModuleState(0, Rotation2d(0)) for _ in MODULE_POSITIONS]
+
+    def per_module() -> None:
+        for vx, vy, omega, current_angles in commands:
+            desired_states = kinematics.desaturateWheelSpeeds(
+                kinematics.toSwerveModuleStates(ChassisSpeeds(vx, vy, omega)),
+                MAX_WHEEL_SPEED,
+            )
+            for i, desired in enumerate(desired_states):
+                current = Rotation2d(current_angles[i])
+                state = rate_limit_module(states[i], desired, ACCEL_LIMIT, DT)
+                state = SwerveModuleState.optimize(state, current)
+                states[i] = state
+                PositionDutyCycle(state.angle.radians() / math.tau)
+                _ = state.speed * (state.angle - current).cos() ** 2
+
+    setpoints = SwerveSetpoints(MODULE_POSITIONS)
+    requests = [PositionDutyCycle(0) for _ in MODULE_POSITIONS]
+
+    def batched() -> None:
+        for vx, vy, omega, current_angles in commands:
+            setpoints.calculate(
+                vx, vy, omega, current_angles, MAX_WHEEL_SPEED, ACCEL_LIMIT, DT
+            )
+            for request, angle in zip(requests, setpoints.angles):
+                request.with_position(angle / math.tau)
+
+    for name, func in (("per module", per_module), ("batched", batched)):
+        best = min(timeit.repeat(func, number=1, repeat=5))
+        print(f"{name:>10}: {best / ITERATIONS * 1e6:.1f} us per loop")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Run the vision pipeline against simulated cameras to measure its cost and accuracy.
+
+The robot drives circles in front of the blue speaker. Wheel odometry
+slips and is slightly miscalibrated, and the estimator with vision is
+compared against odometry alone. The ingest time includes simulating the
+camera's frame.
+
+Run with `python -m benchmarks.vision_sim`.
+"""
+
+import math
+import random
+import tempfile
+import time
+
+import wpilib
+import wpiutil.log
+from magicbot.magic_tunable import setup_tunables
+from wpilib.simulation import pauseTiming, resumeTiming, stepTiming
+from wpimath.geometry import (
+    Pose2d,
+    Rotation2d,
+    Rotation3d,
+    Translation2d,
+    Translation3d,
+)
+from wpimath.kinematics import (
+    ChassisSpeeds,
+    SwerveDrive4Kinematics,
+)
+
+from components.vision import VisualLocalizer
+from components.vision_fusion import VisionFusion
+from utilities.estimator import EstimatorChassis, module_positions
+from utilities.vision_sim import SimulatedCamera
+
+DT = 0.02
+DURATION = 20.0  # s
+CENTRE = Translation2d(3.5, 5.5)
+RADIUS = 1.0  # m
+LAP_TIME = 8.0  # s
+# std dev of wheel slip, as a fraction of distance travelled
+SLIP = 0.03
+# measured wheel diameter is off by this factor
+WHEEL_SCALE = 1.02
+
+# the robot's cameras look out the back, either side of centre
+CAMERAS = (
+    (
+        "sim_port",
+        Translation3d(0.005, 0.221, 0.503),
+        Rotation3d(0, -math.radians(20), math.radians(180 - 18.747237)),
+    ),
+    (
+        "sim_starboard",
+        Translation3d(0.005, 0.161, 0.503),
+        Rotation3d(0, -math.radians(20), math.radians(180 + 18.747237)),
+    ),
+)
+
+
+def true_pose(t: float) -> Pose2d:
+    angle = math.tau * t / LAP_TIME
+    return Pose2d(
+        CENTRE + Translation2d(RADIUS * math.cos(angle), RADIUS * math.sin(angle)),
+        Rotation2d(0.3 * math.sin(angle)),
+    )
+
+
+def main() -> None:
+    kinematics = SwerveDrive4Kinematics(
+        Translation2d(0.3, 0.3),
+        Translation2d(-0.3, 0.3),
+        Translation2d(-0.3, -0.3),
+        Translation2d(0.3, -0.3),
+    )
+    data_log = wpiutil.log.DataLog(tempfile.gettempdir())
+    field = wpilib.Field2d()
+    start = true_pose(0)
+    chassis = EstimatorChassis(kinematics, start)
+    odometry_only = EstimatorChassis(kinematics, start)
+
+    fusion = VisionFusion()
+    fusion.chassis = chassis  # type: ignore[assignment]
+    cameras = []
+    for seed, (name, pos, rot) in enumerate(CAMERAS):
+        localizer = VisualLocalizer(
+            name,
+            pos,
+            rot,
+            field,
+            data_log,
+            chassis,  # type: ignore[arg-type]
+        )
+        localizer.vision_fusion = fusion
+        setup_tunables(localizer, name)
+        cameras.append(SimulatedCamera(localizer, seed=seed))
+
+    slip = random.Random(0)
+    distances = [0.0] * 4
+    pose = start
+    vision_error = odometry_error = 0.0
+    ingest_time = execute_time = 0.0
+    steps = int(DURATION / DT)
+
+    pauseTiming()
+    for step in range(1, steps + 1):
+        stepTiming(DT)
+        now = wpilib.Timer.getFPGATimestamp()
+        next_pose = true_pose(step * DT)
+        speeds = ChassisSpeeds.fromFieldRelativeSpeeds(
+            (next_pose.x - pose.x) / DT,
+            (next_pose.y - pose.y) / DT,
+            (next_pose.rotation() - pose.rotation()).radians() / DT,
+            pose.rotation(),
+        )
+        pose = next_pose
+        chassis.velocity = speeds
+        states = kinematics.toSwerveModuleStates(speeds)
+        for i, state in enumerate(states):
+            distances[i] += state.speed * DT * (WHEEL_SCALE + slip.gauss(0, SLIP))
+        positions = module_positions(distances, [state.angle for state in states])
+        for estimator in (chassis.estimator, odometry_only.estimator):
+            estimator.updateWithTime(now, pose.rotation(), positions)
+
+        begin = time.perf_counter()
+        for camera in cameras:
+            camera.update(now, pose)
+        ingested = time.perf_counter()
+        for camera in cameras:
+            camera.localizer.execute()
+        fusion.execute()
+        executed = time.perf_counter()
+        ingest_time += ingested - begin
+        execute_time += executed - ingested
+
+        truth = pose.translation()
+        vision_error += chassis.get_pose().translation().distance(truth) ** 2
+        odometry_error += odometry_only.get_pose().translation().distance(truth) ** 2
+    resumeTiming()
+
+    frames = sum(camera.frames_captured for camera in cameras)
+    print(f"{steps} loops, {frames} frames, {fusion.submitted_count} measurements")
+    print(
+        f"ingest {ingest_time / frames * 1e6:6.1f} us per frame,"
+        f" main loop {execute_time / steps * 1e6:6.1f} us per loop"
+    )
+    print(
+        f"RMS position error: odometry {math.sqrt(odometry_error / steps):.3f} m,"
+        f" with vision {math.sqrt(vision_error / steps):.3f} m"
+    )
+
+
+if __name__ == "__main__":
+    main()
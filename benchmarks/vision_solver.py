@@ -0,0 +1,143 @@
+"""
+Compare the batched single tag solver against solving and fusing each tag.
+
+Run with `python -m benchmarks.vision_solver`.
+"""
+
+import timeit
+
+from photonlibpy.photonTrackedTarget import PhotonTrackedTarget
+from wpimath import objectToRobotPose
+from wpimath.estimator import SwerveDrive4PoseEstimator
+from wpimath.geometry import (
+    Pose2d,
+    Pose3d,
+    Rotation2d,
+    Rotation3d,
+    Transform3d,
+    Translation2d,
+    Translation3d,
+)
+from wpimath.kinematics import SwerveDrive4Kinematics, SwerveModulePosition
+
+from components.vision import VisualLocalizer, solve_single_tags
+from utilities.game import get_tag_pose
+
+ROBOT_TO_CAMERA = Transform3d(Translation3d(0.2, 0.1, 0.5), Rotation3d(0, -0.3, 3.0))
+ROBOT_POSE = Pose3d(8, 4, 0, Rotation3d(0, 0, 1.0))
+TAG_IDS = range(1, 9)
+# odometry history kept by the estimator, which vision measurements are replayed over
+HISTORY_SAMPLES = 75
+DT = 0.02
+ITERATIONS = 2_000
+
+
+def estimate_poses_from_apriltag(
+    robot_to_camera: Transform3d, target: PhotonTrackedTarget
+) -> tuple[Pose2d, Pose2d, float] | None:
+    """Solve one target, as VisualLocalizer did before solve_single_tags."""
+    tag_id = target.getFiducialId()
+    tag_pose = get_tag_pose(tag_id)
+    if tag_pose is None:
+        return None
+
+    best_pose = objectToRobotPose(
+        tag_pose, target.getBestCameraToTarget(), robot_to_camera
+    )
+    alternate_pose = objectToRobotPose(
+        tag_pose, target.getAlternateCameraToTarget(), robot_to_camera
+    )
+    return best_pose.toPose2d(), alternate_pose.toPose2d(), best_pose.z
+
+
+def choose_pose(best_pose: Pose2d, alternate_pose: Pose2d, cur_robot: Pose2d) -> Pose2d:
+    """Picks either the best or alternate pose estimate"""
+    best_dist = best_pose.translation().distance(cur_robot.translation())
+    alternate_dist = (
+        alternate_pose.translation().distance(cur_robot.translation())
+        * VisualLocalizer.BEST_POSE_BIAS
+    )
+
+    if best_dist < alternate_dist:
+        return best_pose
+    else:
+        return alternate_pose
+
+
+def make_target(tag_id: int) -> PhotonTrackedTarget:
+    tag_pose = get_tag_pose(tag_id)
+    assert tag_pose is not None
+    camera_pose = ROBOT_POSE.transformBy(ROBOT_TO_CAMERA)
+    alt_camera_pose = Pose3d(
+        camera_pose.translation() + Translation3d(0.5, 0.5, 0), camera_pose.rotation()
+    )
+    return PhotonTrackedTarget(
+        fiducialId=tag_id,
+        bestCameraToTarget=Transform3d(camera_pose, tag_pose),
+        altCameraToTarget=Transform3d(alt_camera_pose, tag_pose),
+        poseAmbiguity=0.1,
+    )
+
+
+def make_estimator() -> SwerveDrive4PoseEstimator:
+    kinematics = SwerveDrive4Kinematics(
+        Translation2d(0.2, 0.2),
+        Translation2d(-0.2, 0.2),
+        Translation2d(-0.2, -0.2),
+        Translation2d(0.2, -0.2),
+    )
+    positions = (
+        SwerveModulePosition(),
+        SwerveModulePosition(),
+        SwerveModulePosition(),
+        SwerveModulePosition(),
+    )
+    estimator = SwerveDrive4PoseEstimator(
+        kinematics, Rotation2d(), positions, ROBOT_POSE.toPose2d()
+    )
+    for i in range(HISTORY_SAMPLES):
+        estimator.updateWithTime(i * DT, Rotation2d(), positions)
+    return estimator
+
+
+def time_frame(count: int) -> tuple[float, float]:
+    """Time processing a frame with count tags in view both ways, in us."""
+    targets = [make_target(tag_id) for tag_id in TAG_IDS[:count]]
+    estimator = make_estimator()
+    reference = estimator.getEstimatedPosition()
+    timestamp = HISTORY_SAMPLES * DT / 2
+
+    def per_target() -> None:
+        for target in targets:
+            if target.getPoseAmbiguity() > VisualLocalizer.MAX_AMBIGUITY:
+                continue
+            poses = estimate_poses_from_apriltag(ROBOT_TO_CAMERA, target)
+            if poses is None:
+                continue
+            best, alt, _ = poses
+            pose = choose_pose(best, alt, estimator.getEstimatedPosition())
+            estimator.addVisionMeasurement(pose, timestamp)
+
+    def batched() -> None:
+        solution = solve_single_tags(ROBOT_TO_CAMERA, targets, reference)
+        if solution is not None:
+            estimator.addVisionMeasurement(solution[0], timestamp)
+
+    per_target_time, batched_time = (
+        min(timeit.repeat(func, number=ITERATIONS, repeat=5)) / ITERATIONS * 1e6
+        for func in (per_target, batched)
+    )
+    return per_target_time, batched_time
+
+
+def main() -> None:
+    for count in range(1, len(TAG_IDS) + 1):
+        per_target, batched = time_frame(count)
+        print(
+            f"{count} tags: per target {per_target:6.1f} us,"
+            f" batched {batched:6.1f} us per frame"
+        )
+
+
+if __name__ == "__main__":
+    main()
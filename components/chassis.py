@@ -1,6 +1,11 @@
+from collections import deque
+from collections.abc import Iterable
 from logging import Logger
 import math
+import threading
+import time
 
+from phoenix6 import BaseStatusSignal
 from phoenix6.hardware import TalonFX, CANcoder
 from phoenix6.controls import VoltageOut, VelocityVoltage, PositionDutyCycle
 from phoenix6.signals import InvertedValue, NeutralModeValue
@@ -14,6 +19,7 @@ import magicbot
 import navx
 import ntcore
 import wpilib
+import wpiutil.log
 from wpimath.kinematics import (
     SwerveDrive4Kinematics,
     ChassisSpeeds,
@@ -26,14 +32,32 @@ from wpimath.controller import SimpleMotorFeedforwardMeters
 from wpimath.trajectory import TrapezoidProfileRadians
 from wpimath.controller import ProfiledPIDControllerRadians
 
-from magicbot import feedback
 
-from utilities.functions import rate_limit_module
 from utilities.game import is_red
 from utilities.ctre import FALCON_FREE_RPS
 from utilities.position import TeamPoses
+from utilities.replay import (
+    ESTIMATE_ENTRY,
+    ODOMETRY_ENTRY,
+    POSE_RESET_ENTRY,
+    encode_odometry,
+    encode_pose,
+)
+from utilities.swerve import SwerveSetpoints
+from utilities.telemetry import feedback_rate
 from ids import CancoderIds, TalonIds
 
+ModulePositions = tuple[
+    SwerveModulePosition,
+    SwerveModulePosition,
+    SwerveModulePosition,
+    SwerveModulePosition,
+]
+# FPGA timestamp, gyro angle and module positions sampled together
+OdometrySample = tuple[float, Rotation2d, ModulePositions]
+# pose, FPGA timestamp and optional (x, y, theta) standard deviations
+VisionMeasurement = tuple[Pose2d, float, tuple[float, float, float] | None]
+
 
 class SwerveModule:
     DRIVE_GEAR_RATIO = (14.0 / 50.0) * (25.0 / 19.0) * (15.0 / 45.0)
@@ -62,8 +86,6 @@ class SwerveModule:
         *_id: can ids of steer and drive motors and absolute encoder
         """
         self.translation = Translation2d(x, y)
-        self.state = SwerveModuleState(0, Rotation2d(0))
-        self.do_smooth = True
 
         # Create Motor and encoder objects
         self.steer = TalonFX(steer_id)
@@ -125,20 +147,34 @@ class SwerveModule:
         drive_config.apply(drive_gear_ratio_config)
 
         self.central_angle = Rotation2d(x, y)
-        self.module_locked = False
+
+        # Cache the status signals so they can be refreshed together once per loop
+        self.drive_velocity = self.drive.get_velocity()
+        self.drive_position = self.drive.get_position()
+        self.steer_position = self.steer.get_position()
+        self.absolute_position = self.encoder.get_absolute_position()
+        self.status_signals: tuple[BaseStatusSignal, ...] = (
+            self.drive_velocity,
+            self.drive_position,
+            self.steer_position,
+            self.absolute_position,
+        )
 
         self.sync_steer_encoder()
 
         self.drive_request = VelocityVoltage(0)
+        self.steer_request = PositionDutyCycle(0)
         self.stop_request = VoltageOut(0)
+        # stopping sends the same requests every time, so only send them once
+        self.is_stopped = False
 
     def get_angle_absolute(self) -> float:
         """Gets steer angle (rot) from absolute encoder"""
-        return self.encoder.get_absolute_position().value
+        return self.absolute_position.value
 
     def get_angle_integrated(self) -> float:
         """Gets steer angle from motor's integrated relative encoder"""
-        return self.steer.get_position().value * math.tau
+        return self.steer_position.value * math.tau
 
     def get_rotation(self) -> Rotation2d:
         """Get the steer angle as a Rotation2d"""
@@ -146,45 +182,37 @@ class SwerveModule:
 
     def get_speed(self) -> float:
         # velocity is in rot/s, return in m/s
-        return self.drive.get_velocity().value
+        return self.drive_velocity.value
 
     def get_distance_traveled(self) -> float:
-        return self.drive.get_position().value
+        return self.drive_position.value
 
-    def set(self, desired_state: SwerveModuleState):
-        if self.module_locked:
-            desired_state = SwerveModuleState(0, self.central_angle)
-
-        # smooth wheel velocity vector
-        if self.do_smooth:
-            self.state = rate_limit_module(self.state, desired_state, self.accel_limit)
-        else:
-            self.state = desired_state
-        current_angle = self.get_rotation()
-        self.state = SwerveModuleState.optimize(self.state, current_angle)
-
-        if abs(self.state.speed) < 0.01 and not self.module_locked:
-            self.drive.set_control(
-                self.drive_request.with_velocity(0).with_feed_forward(0)
-            )
-            self.steer.set_control(self.stop_request)
+    def set(self, angle: float, speed: float, stopped: bool) -> None:
+        """
+        angle: steer angle setpoint in radians
+        speed: drive speed setpoint in m/s
+        stopped: idle the steer motor and hold the wheel still
+        """
+        if stopped:
+            if not self.is_stopped:
+                self.drive.set_control(
+                    self.drive_request.with_velocity(0).with_feed_forward(0)
+                )
+                self.steer.set_control(self.stop_request)
+                self.is_stopped = True
             return
+        self.is_stopped = False
 
-        target_displacement = self.state.angle - current_angle
-        target_angle = self.state.angle.radians()
-        self.steer_request = PositionDutyCycle(target_angle / math.tau)
-        self.steer.set_control(self.steer_request)
-
-        # rescale the speed target based on how close we are to being correctly aligned
-        target_speed = self.state.speed * target_displacement.cos() ** 2
-        speed_volt = self.drive_ff.calculate(target_speed)
+        self.steer.set_control(self.steer_request.with_position(angle / math.tau))
 
+        speed_volt = self.drive_ff.calculate(speed)
         # original position change/100ms, new m/s -> rot/s
         self.drive.set_control(
-            self.drive_request.with_velocity(target_speed).with_feed_forward(speed_volt)
+            self.drive_request.with_velocity(speed).with_feed_forward(speed_volt)
         )
 
     def sync_steer_encoder(self) -> None:
+        self.absolute_position.refresh()
         self.steer.set_position(self.get_angle_absolute())
 
     def get_position(self) -> SwerveModulePosition:
@@ -206,6 +234,15 @@ class ChassisComponent:
 
     DRIVE_CURRENT_THRESHOLD = 35
 
+    # rate to sample module positions and gyro at when using high rate odometry
+    ODOMETRY_FREQUENCY = 250  # Hz
+    # the navX's maximum update rate, so the yaw odometry samples is at most 5 ms old
+    IMU_UPDATE_RATE = 200  # Hz
+    # rate the module position signals are published at otherwise
+    DEFAULT_POSITION_FREQUENCY = 50  # Hz
+    # samples to buffer between main loop iterations before dropping the oldest
+    MAX_ODOMETRY_SAMPLES = 50
+
     HEADING_TOLERANCE = math.radians(1)
 
     # maxiumum speed for any wheel
@@ -216,16 +253,19 @@ class ChassisComponent:
     chassis_speeds = magicbot.will_reset_to(ChassisSpeeds(0, 0, 0))
     field: wpilib.Field2d
     logger: Logger
+    data_log: wpiutil.log.DataLog
 
     send_modules = magicbot.tunable(False)
     do_fudge = magicbot.tunable(True)
     do_smooth = magicbot.tunable(True)
     swerve_lock = magicbot.tunable(False)
+    high_rate_odometry = magicbot.tunable(False)
 
     # TODO: Read from positions.py once autonomous is finished
 
     def __init__(self) -> None:
-        self.imu = navx.AHRS.create_spi()
+        # run the navX at its maximum rate so high rate odometry gets fresh yaw
+        self.imu = navx.AHRS.create_spi(update_rate_hz=self.IMU_UPDATE_RATE)
         self.heading_controller = ProfiledPIDControllerRadians(
             3, 0, 0, TrapezoidProfileRadians.Constraints(100, 100)
         )
@@ -276,6 +316,37 @@ class ChassisComponent:
             self.modules[2].translation,
             self.modules[3].translation,
         )
+        self.setpoints = SwerveSetpoints(
+            [(module.translation.x, module.translation.y) for module in self.modules]
+        )
+        self.lock_angles = [module.central_angle.radians() for module in self.modules]
+        self.status_signals: list[BaseStatusSignal] = [
+            signal for module in self.modules for signal in module.status_signals
+        ]
+        self.signal_refresh_duration = 0.0
+
+        # Background odometry sampling. The notifier thread only records
+        # samples, the estimator is only ever touched from the main loop.
+        self.odometry_lock = threading.Lock()
+        self.odometry_samples: deque[OdometrySample] = deque(
+            maxlen=self.MAX_ODOMETRY_SAMPLES
+        )
+        self.last_odometry_timestamp = 0.0
+        self.odometry_signals: list[BaseStatusSignal] = [
+            signal
+            for module in self.modules
+            for signal in (module.drive_position, module.steer_position)
+        ]
+        self.odometry_notifier = wpilib.Notifier(self.sample_odometry)
+        self.odometry_notifier.setName("odometry")
+        self.odometry_notifier_running = False
+
+        # Robot state memoized until the estimator or module signals change
+        self.cached_pose: Pose2d | None = None
+        self.cached_rotation: Rotation2d | None = None
+        self.cached_velocity: ChassisSpeeds | None = None
+
+        self.refresh_signals()
         self.sync_all()
         self.imu.zeroYaw()
         self.imu.resetDisplacement()
@@ -291,10 +362,36 @@ class ChassisComponent:
 
         wpilib.SmartDashboard.putData("Heading PID", self.heading_controller)
 
+    def refresh_signals(self) -> None:
+        """Refresh every module status signal in a single batched CAN read.
+
+        The module getters read from these cached signals, so this should be
+        called once at the start of each loop before anything reads them.
+        """
+        start = time.perf_counter()
+        with self.odometry_lock:
+            BaseStatusSignal.refresh_all(self.status_signals)
+        self.signal_refresh_duration = time.perf_counter() - start
+        self.cached_velocity = None
+
+    @feedback_rate(1)
+    def signal_refresh_time(self) -> float:
+        """Time taken by the last status signal refresh in milliseconds."""
+        return self.signal_refresh_duration * 1000
+
     def get_velocity(self) -> ChassisSpeeds:
-        return self.kinematics.toChassisSpeeds(self.get_module_states())
+        """Get the robot relative velocity measured by the modules.
 
-    @feedback
+        This is shared between callers until the next signal refresh,
+        so it must not be modified.
+        """
+        if self.cached_velocity is None:
+            self.cached_velocity = self.kinematics.toChassisSpeeds(
+                self.get_module_states()
+            )
+        return self.cached_velocity
+
+    @feedback_rate(10, threshold=0.1)
     def imu_rotation(self) -> float:
         return self.imu.getAngle()
 
@@ -322,6 +419,16 @@ class ChassisComponent:
             visionMeasurementStdDevs=(0.4, 0.4, 0.03),
         )
         self.field_obj = self.field.getObject("fused_pose")
+        # raw estimator inputs for replaying matches
+        self.odometry_entry = wpiutil.log.DoubleArrayLogEntry(
+            self.data_log, ODOMETRY_ENTRY
+        )
+        self.pose_reset_entry = wpiutil.log.DoubleArrayLogEntry(
+            self.data_log, POSE_RESET_ENTRY
+        )
+        self.estimate_entry = wpiutil.log.DoubleArrayLogEntry(
+            self.data_log, ESTIMATE_ENTRY
+        )
         self.set_pose(initial_pose)
 
     def drive_field(self, vx: float, vy: float, omega: float) -> None:
@@ -349,6 +456,8 @@ class ChassisComponent:
         self.snapping_to_heading = False
 
     def execute(self) -> None:
+        self.refresh_signals()
+
         # rotate desired velocity to compensate for skew caused by discretization
         # see https://www.chiefdelphi.com/t/field-relative-swervedrive-drift-even-with-simulated-perfect-modules/413892/
 
@@ -361,33 +470,38 @@ class ChassisComponent:
                 self.get_rotation().radians(), self.get_rotational_velocity()
             )
 
+        vx = self.chassis_speeds.vx
+        vy = self.chassis_speeds.vy
+        omega = self.chassis_speeds.omega
         if self.do_fudge:
             # in the sim i found using 5 instead of 0.5 did a lot better
-            desired_speed_translation = Translation2d(
-                self.chassis_speeds.vx, self.chassis_speeds.vy
-            ).rotateBy(
-                Rotation2d(-self.chassis_speeds.omega * 5 * self.control_loop_wait_time)
-            )
-            desired_speeds = ChassisSpeeds(
-                desired_speed_translation.x,
-                desired_speed_translation.y,
-                self.chassis_speeds.omega,
-            )
-        else:
-            desired_speeds = self.chassis_speeds
+            skew = -omega * 5 * self.control_loop_wait_time
+            cos_skew = math.cos(skew)
+            sin_skew = math.sin(skew)
+            vx, vy = vx * cos_skew - vy * sin_skew, vx * sin_skew + vy * cos_skew
 
         if self.swerve_lock:
             self.do_smooth = False
 
-        desired_states = self.kinematics.toSwerveModuleStates(desired_speeds)
-        desired_states = self.kinematics.desaturateWheelSpeeds(
-            desired_states, attainableMaxSpeed=self.max_wheel_speed
-        )
+        current_angles = [module.get_angle_integrated() for module in self.modules]
+        if self.swerve_lock:
+            self.setpoints.lock(self.lock_angles, current_angles)
+        else:
+            self.setpoints.calculate(
+                vx,
+                vy,
+                omega,
+                current_angles,
+                self.max_wheel_speed,
+                SwerveModule.accel_limit if self.do_smooth else None,
+                self.control_loop_wait_time,
+            )
 
-        for state, module in zip(desired_states, self.modules):
-            module.module_locked = self.swerve_lock
-            module.do_smooth = self.do_smooth
-            module.set(state)
+        setpoints = self.setpoints
+        for i, module in enumerate(self.modules):
+            module.set(
+                setpoints.angles[i], setpoints.drive_speeds[i], setpoints.stopped[i]
+            )
 
         self.update_odometry()
 
@@ -397,6 +511,7 @@ class ChassisComponent:
         While we should be building the pose buffer while disabled,
         this accounts for the edge case of crashing mid match and immediately enabling with an empty buffer
         """
+        self.refresh_signals()
         self.update_alliance()
         self.update_odometry()
 
@@ -423,11 +538,78 @@ class ChassisComponent:
             else:
                 self.set_pose(TeamPoses.BLUE_TEST_POSE)
 
+    def sample_odometry(self) -> None:
+        """Record a timestamped odometry sample.
+
+        This runs on the odometry notifier thread at ODOMETRY_FREQUENCY.
+        """
+        with self.odometry_lock:
+            BaseStatusSignal.refresh_all(self.odometry_signals)
+            latency = max(
+                signal.timestamp.get_latency() for signal in self.odometry_signals
+            )
+            timestamp = wpilib.Timer.getFPGATimestamp() - latency
+            # nothing new has arrived from the modules since the last sample
+            if timestamp <= self.last_odometry_timestamp:
+                return
+            self.last_odometry_timestamp = timestamp
+            self.odometry_samples.append(
+                (timestamp, self.imu.getRotation2d(), self.get_module_positions())
+            )
+
+    def update_odometry_notifier(self) -> None:
+        """Start or stop the high rate odometry thread to match the tunable."""
+        if self.high_rate_odometry == self.odometry_notifier_running:
+            return
+
+        if self.high_rate_odometry:
+            frequency = self.ODOMETRY_FREQUENCY
+        else:
+            frequency = self.DEFAULT_POSITION_FREQUENCY
+        BaseStatusSignal.set_update_frequency_for_all(frequency, self.odometry_signals)
+
+        if self.high_rate_odometry:
+            self.odometry_notifier.startPeriodic(1 / self.ODOMETRY_FREQUENCY)
+        else:
+            self.odometry_notifier.stop()
+            with self.odometry_lock:
+                self.odometry_samples.clear()
+        self.odometry_notifier_running = self.high_rate_odometry
+
     def update_odometry(self) -> None:
-        self.estimator.update(self.imu.getRotation2d(), self.get_module_positions())
-        self.field_obj.setPose(self.get_pose())
+        self.update_odometry_notifier()
+        if self.odometry_notifier_running:
+            with self.odometry_lock:
+                samples = list(self.odometry_samples)
+                self.odometry_samples.clear()
+        else:
+            samples = [
+                (
+                    wpilib.Timer.getFPGATimestamp(),
+                    self.imu.getRotation2d(),
+                    self.get_module_positions(),
+                )
+            ]
+        for timestamp, gyro_angle, module_positions in samples:
+            self.estimator.updateWithTime(timestamp, gyro_angle, module_positions)
+            self.odometry_entry.append(
+                encode_odometry(timestamp, gyro_angle, module_positions)
+            )
+        self.invalidate_pose()
+        pose = self.get_pose()
+        self.field_obj.setPose(pose)
+        self.estimate_entry.append(
+            [wpilib.Timer.getFPGATimestamp(), *encode_pose(pose)]
+        )
         if self.send_modules:
-            self.setpoints_publisher.set([module.state for module in self.modules])
+            self.setpoints_publisher.set(
+                [
+                    SwerveModuleState(speed, Rotation2d(angle))
+                    for speed, angle in zip(
+                        self.setpoints.speeds, self.setpoints.angles
+                    )
+                ]
+            )
             self.measurements_publisher.set([module.get() for module in self.modules])
 
     def sync_all(self) -> None:
@@ -435,9 +617,19 @@ class ChassisComponent:
             m.sync_steer_encoder()
 
     def set_pose(self, pose: Pose2d) -> None:
-        self.estimator.resetPosition(
-            self.imu.getRotation2d(), self.get_module_positions(), pose
+        # samples from before the reset would drag the pose back
+        with self.odometry_lock:
+            self.odometry_samples.clear()
+        gyro_angle = self.imu.getRotation2d()
+        module_positions = self.get_module_positions()
+        self.estimator.resetPosition(gyro_angle, module_positions, pose)
+        self.pose_reset_entry.append(
+            encode_odometry(
+                wpilib.Timer.getFPGATimestamp(), gyro_angle, module_positions
+            )
+            + encode_pose(pose)
         )
+        self.invalidate_pose()
         self.field.setRobotPose(pose)
         self.field_obj.setPose(pose)
 
@@ -455,14 +647,7 @@ class ChassisComponent:
         else:
             self.set_pose(TeamPoses.BLUE_PODIUM)
 
-    def get_module_positions(
-        self,
-    ) -> tuple[
-        SwerveModulePosition,
-        SwerveModulePosition,
-        SwerveModulePosition,
-        SwerveModulePosition,
-    ]:
+    def get_module_positions(self) -> ModulePositions:
         return (
             self.modules[0].get_position(),
             self.modules[1].get_position(),
@@ -470,14 +655,43 @@ class ChassisComponent:
             self.modules[3].get_position(),
         )
 
+    def add_vision_measurement(
+        self,
+        pose: Pose2d,
+        timestamp: float,
+        std_devs: tuple[float, float, float] | None = None,
+    ) -> None:
+        """Fuse a vision pose measurement into the pose estimate."""
+        self.add_vision_measurements(((pose, timestamp, std_devs),))
+
+    def add_vision_measurements(
+        self, measurements: Iterable[VisionMeasurement]
+    ) -> None:
+        """Fuse a batch of vision pose measurements, oldest first."""
+        for pose, timestamp, std_devs in measurements:
+            if std_devs is None:
+                self.estimator.addVisionMeasurement(pose, timestamp)
+            else:
+                self.estimator.addVisionMeasurement(pose, timestamp, std_devs)
+        self.invalidate_pose()
+
+    def invalidate_pose(self) -> None:
+        """Forget the memoized pose after the estimator has changed."""
+        self.cached_pose = None
+        self.cached_rotation = None
+
     def get_pose(self) -> Pose2d:
         """Get the current location of the robot relative to ???"""
-        return self.estimator.getEstimatedPosition()
+        if self.cached_pose is None:
+            self.cached_pose = self.estimator.getEstimatedPosition()
+        return self.cached_pose
 
     def get_rotation(self) -> Rotation2d:
         """Get the current heading of the robot."""
-        return self.get_pose().rotation()
+        if self.cached_rotation is None:
+            self.cached_rotation = self.get_pose().rotation()
+        return self.cached_rotation
 
-    @feedback
+    @feedback_rate(10)
     def at_desired_heading(self) -> bool:
         return self.heading_controller.atGoal()
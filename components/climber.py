@@ -1,10 +1,10 @@
 import wpilib
 from enum import Enum
-from magicbot import feedback
 from rev import CANSparkMax
 from ids import SparkMaxIds, DioChannels
 
 from components.led import LightStrip
+from utilities.telemetry import feedback_rate
 
 
 class Climber:
@@ -40,11 +40,11 @@ class Climber:
     def on_disable(self) -> None:
         self.seen_deploy_limit_switch = False
 
-    @feedback
+    @feedback_rate(1)
     def has_climb_finished(self) -> bool:
         return not self.retract_limit_switch.get()
 
-    @feedback
+    @feedback_rate(1)
     def has_deploy_finished(self) -> bool:
         return not self.deploy_limit_switch.get()
 
@@ -1,24 +1,32 @@
 import math
+import threading
 from enum import Enum
 import rev
 import time
 
-from magicbot import tunable, feedback
+from magicbot import tunable
 from rev import CANSparkMax
+from phoenix6 import BaseStatusSignal
 from phoenix6.configs import MotorOutputConfigs, FeedbackConfigs, config_groups
 from phoenix6.controls import VoltageOut
 from phoenix6.hardware import TalonFX
+import wpilib
 from wpilib import DigitalInput
 from wpimath.controller import ArmFeedforward
 from wpimath.trajectory import TrapezoidProfile
 
 from ids import TalonIds, SparkMaxIds, DioChannels
+from utilities.stall import StallDetector
+from utilities.telemetry import feedback_rate
 
 
 class IntakeComponent:
     motor_speed = tunable(0.7)
     inject_intake_speed = tunable(0.5)
     inject_shoot_speed = tunable(1.0)
+    # profile deployment on the SparkMax, rather than on the rio every loop.
+    # Off until the Smart Motion gains below have been tuned on the robot.
+    onboard_profile = tunable(False)
 
     INTAKE_GEAR_RATIO = 2
     DEPLOY_GEAR_RATIO = (1 / 5) * (1 / 3) * (24 / 72)
@@ -30,12 +38,25 @@ class IntakeComponent:
     SHAFT_REV_HOVER_POINT = SHAFT_REV_DEPLOY_HARD_LIMIT + math.radians(15)
 
     ALLOWABLE_ERROR = 0.01
+    # Gains of the SparkMax's onboard profile, only checked against
+    # benchmarks/intake_profile.py. The velocity loop is mostly feedforward,
+    # so these are starting points, in duty cycle per rad/s.
+    SMART_MOTION_KP = 0.05
+    SMART_MOTION_KI = 0.0
+    SMART_MOTION_KD = 0.0
 
     RETRACTED_STATE = TrapezoidProfile.State(SHAFT_REV_RETRACT_HARD_LIMIT, 0.0)
     DEPLOYED_STATE = TrapezoidProfile.State(SHAFT_REV_DEPLOY_HARD_LIMIT, 0.0)
     HOVER_STATE = TrapezoidProfile.State(SHAFT_REV_HOVER_POINT, 0.0)
     INTAKE_STALL_VELOCITY = 1  # rot/s below which we consider mechanism stalled
     INTAKE_RUNNING_VELOCITY = 3  # rot/s above which stall detection is enabled
+    INTAKE_STALL_CURRENT = 80  # A of stator current drawn by a jammed note
+    # how long the intake must stall for, so a note being pulled in doesn't count
+    INTAKE_STALL_DEBOUNCE = 0.012  # s
+    STALL_SIGNAL_FREQUENCY = 250  # Hz
+    STALL_SAMPLE_PERIOD = 1 / STALL_SIGNAL_FREQUENCY  # s
+    # how long the break beam thread waits for an edge before checking again
+    BREAK_BEAM_WAIT = 0.5  # s
 
     class Direction(Enum):
         BACKWARD = -1
@@ -44,6 +65,9 @@ class IntakeComponent:
 
     def __init__(self) -> None:
         self.motor = TalonFX(TalonIds.intake)
+        self.intake_request = VoltageOut(0)
+        # the last voltage sent to the intake, so unchanged requests aren't resent
+        self.applied_intake_voltage: float | None = None
 
         self.deploy_motor_l = CANSparkMax(
             SparkMaxIds.intake_deploy_l, CANSparkMax.MotorType.kBrushless
@@ -54,8 +78,8 @@ class IntakeComponent:
         self.deploy_motor_l.setIdleMode(CANSparkMax.IdleMode.kBrake)
         self.deploy_motor_r.setIdleMode(CANSparkMax.IdleMode.kBrake)
 
-        # running the controller on the rio rather than on the motor controller
-        # to allow access to the velocity setpoint for feedforward
+        # the rio profile allows access to the velocity setpoint for feedforward,
+        # but is only stepped once a loop; the SparkMax's profile is shared below
         arm_constraints = TrapezoidProfile.Constraints(
             maxVelocity=6.0, maxAcceleration=math.pi
         )
@@ -99,6 +123,32 @@ class IntakeComponent:
         self.pid_controller.setD(0.6, self.deploy_pid_slot)
         self.pid_controller.setOutputRange(-1, 1, self.deploy_pid_slot)
 
+        # Smart Motion runs the same profile on the SparkMax, closing a velocity
+        # loop, so it needs its own slot. The limits use the conversion factors,
+        # so are in rad/s and rad/s^2
+        self.smart_motion_pid_slot = 2
+        self.pid_controller.setFF(
+            self.feed_forward_calculator.kV / 12, self.smart_motion_pid_slot
+        )
+        self.pid_controller.setP(self.SMART_MOTION_KP, self.smart_motion_pid_slot)
+        self.pid_controller.setI(self.SMART_MOTION_KI, self.smart_motion_pid_slot)
+        self.pid_controller.setD(self.SMART_MOTION_KD, self.smart_motion_pid_slot)
+        self.pid_controller.setOutputRange(-1, 1, self.smart_motion_pid_slot)
+        self.pid_controller.setSmartMotionMaxVelocity(
+            arm_constraints.maxVelocity, self.smart_motion_pid_slot
+        )
+        self.pid_controller.setSmartMotionMaxAccel(
+            arm_constraints.maxAcceleration, self.smart_motion_pid_slot
+        )
+        self.pid_controller.setSmartMotionAllowedClosedLoopError(
+            self.ALLOWABLE_ERROR, self.smart_motion_pid_slot
+        )
+        # the last goal given to the onboard profile, so it's only sent on a change
+        self.applied_deployment_state: TrapezoidProfile.State | None = None
+        # when the onboard profile reaches the goal, and the position gains take over
+        self.onboard_profile_end_time = 0.0
+        self.holding_deployment = False
+
         self.pid_slot = self.retract_pid_slot
 
         self.direction = self.Direction.STOPPED
@@ -135,6 +185,26 @@ class IntakeComponent:
         motor_configurator.apply(motor_config)
         motor_configurator.apply(intake_gear_ratio)
 
+        # Sampled together faster than the loop while intaking, so a jam is
+        # debounced over a few milliseconds of samples rather than judged
+        # from one
+        self.intake_current = self.motor.get_stator_current()
+        self.intake_velocity = self.motor.get_velocity()
+        self.stall_signals: list[BaseStatusSignal] = [
+            self.intake_current,
+            self.intake_velocity,
+        ]
+        BaseStatusSignal.set_update_frequency_for_all(
+            self.STALL_SIGNAL_FREQUENCY, self.stall_signals
+        )
+        self.stall_detector = StallDetector(
+            self.INTAKE_STALL_CURRENT,
+            self.INTAKE_STALL_VELOCITY,
+            self.INTAKE_STALL_DEBOUNCE,
+        )
+        # the latest intake velocity, so the loop doesn't read the signal again
+        self.intake_speed = 0.0
+
         self.deploy_motor_r.follow(self.deploy_motor_l, True)
 
         self.injector = rev.CANSparkMax(
@@ -143,6 +213,42 @@ class IntakeComponent:
         self.injector.setInverted(False)
 
         self.break_beam = DigitalInput(DioChannels.injector_break_beam)
+        # FPGA times the last note broke and cleared the beam, latched by the
+        # break beam thread, so only read or written holding the lock
+        self.break_beam_lock = threading.Lock()
+        self.note_arrival_time = -math.inf
+        self.note_departure_time = -math.inf
+        # the arrival the injector last stopped for
+        self.handled_arrival_time = -math.inf
+        # whether the injector is pulling a note in, so should stop when it arrives
+        self.injecting_note = False
+        # armed by the loop while the injector pulls a note in, so the break
+        # beam thread stops it the moment one arrives rather than next loop
+        self.stop_injector_on_arrival = False
+
+        # Timestamp edges as they happen on the robot, rather than when the
+        # loop next polls. Simulation polls, so the tests don't leak a thread.
+        self.break_beam_interrupt: wpilib.SynchronousInterrupt | None = None
+        self.last_has_note = self.has_note()
+        if not wpilib.RobotBase.isSimulation():
+            self.break_beam_interrupt = wpilib.SynchronousInterrupt(self.break_beam)
+            self.break_beam_interrupt.setInterruptEdges(True, True)
+            threading.Thread(
+                target=self.watch_break_beam, name="break beam", daemon=True
+            ).start()
+
+        # Only sample faster than the loop while intaking, when there may be
+        # a jam to catch. The notifier is stopped the rest of the time.
+        # Simulation samples every loop instead, like the break beam.
+        self.stall_lock = threading.Lock()
+        self.stall_notifier: wpilib.Notifier | None = None
+        if not wpilib.RobotBase.isSimulation():
+            self.stall_notifier = wpilib.Notifier(self.sample_stall_signals_periodic)
+            self.stall_notifier.setName("intake stall")
+        self.sampling_stall = False
+        # when the notifier last sampled, to count the times it fell behind
+        self.last_stall_sample_time: float | None = None
+        self.stall_overrun_count = 0
 
         self.desired_injector_speed = 0.0
         self.has_indexed = False
@@ -150,17 +256,28 @@ class IntakeComponent:
 
         self.locked = False
 
+    def on_enable(self) -> None:
+        # the onboard profile may have been interrupted, so start a new one
+        self.applied_deployment_state = None
+
+    def on_disable(self) -> None:
+        # execute doesn't run while disabled, so it can't stop the sampling
+        if self.sampling_stall:
+            assert self.stall_notifier is not None
+            self.stall_notifier.stop()
+            self.sampling_stall = False
+
     def lock(self) -> None:
         self.locked = True
 
     def unlock(self) -> None:
         self.locked = False
 
-    @feedback
+    @feedback_rate(10)
     def _at_retract_hard_limit(self) -> bool:
         return self.retract_limit_switch.get()
 
-    @feedback
+    @feedback_rate(10)
     def _at_deploy_hard_limit(self) -> bool:
         return self.deploy_limit_switch.get()
 
@@ -188,6 +305,7 @@ class IntakeComponent:
         self.desired_injector_speed = (
             0.0 if self.has_note() else self.inject_intake_speed
         )
+        self.injecting_note = True
 
     def backdrive_intake(self) -> None:
         self.direction = self.Direction.BACKWARD
@@ -198,28 +316,32 @@ class IntakeComponent:
     def feed_shooter(self) -> None:
         self.desired_injector_speed = self.inject_shoot_speed
 
+    @feedback_rate(1)
+    def stall_sample_overruns(self) -> int:
+        return self.stall_overrun_count
+
     def has_intake_stalled(self) -> bool:
         return (
-            self.motor.get_velocity().value < self.INTAKE_STALL_VELOCITY
+            self.stall_detector.stalled
             and self.direction is not self.Direction.STOPPED
             and self.stall_detection_enabled
         )
 
-    @feedback
+    @feedback_rate(10)
     def is_fully_retracted(self) -> bool:
         return self._at_retract_hard_limit() or (
             abs(self.SHAFT_REV_RETRACT_HARD_LIMIT - self.deploy_encoder.getPosition())
             < self.ALLOWABLE_ERROR
         )
 
-    @feedback
+    @feedback_rate(10)
     def is_fully_deployed(self) -> bool:
         return self._at_deploy_hard_limit() or (
             abs(self.SHAFT_REV_DEPLOY_HARD_LIMIT - self.deploy_encoder.getPosition())
             < self.ALLOWABLE_ERROR
         )
 
-    @feedback
+    @feedback_rate(10, threshold=0.005)
     def deploy_current_position(self) -> float:
         return self.deploy_encoder.getPosition()
 
@@ -232,11 +354,106 @@ class IntakeComponent:
             self.deploy_encoder.setPosition(self.SHAFT_REV_DEPLOY_HARD_LIMIT)
             self.has_indexed = True
 
-    @feedback
+    @feedback_rate(10)
     def has_note(self) -> bool:
         return not self.break_beam.get()
 
+    def watch_break_beam(self) -> None:
+        """Wait for break beam edges, forever, on the break beam thread."""
+        interrupt = self.break_beam_interrupt
+        assert interrupt is not None
+        falling = wpilib.SynchronousInterrupt.WaitResult.kFallingEdge.value
+        rising = wpilib.SynchronousInterrupt.WaitResult.kRisingEdge.value
+        while True:
+            result = interrupt.waitForInterrupt(
+                self.BREAK_BEAM_WAIT, ignorePrevious=False
+            ).value
+            # the beam reads low while it's broken by a note
+            edges = []
+            if result & falling:
+                edges.append((interrupt.getFallingTimestamp(), True))
+            if result & rising:
+                edges.append((interrupt.getRisingTimestamp(), False))
+            for timestamp, arrived in sorted(edges):
+                if arrived:
+                    self.note_arrived(timestamp)
+                else:
+                    self.note_departed(timestamp)
+
+    def note_arrived(self, timestamp: float) -> None:
+        with self.break_beam_lock:
+            self.note_arrival_time = timestamp
+            if self.stop_injector_on_arrival:
+                self.injector.set(0.0)
+                self.stop_injector_on_arrival = False
+
+    def note_departed(self, timestamp: float) -> None:
+        with self.break_beam_lock:
+            self.note_departure_time = timestamp
+
+    def break_beam_edges(self) -> tuple[float, float]:
+        """The FPGA times the last note broke and cleared the beam."""
+        with self.break_beam_lock:
+            return self.note_arrival_time, self.note_departure_time
+
+    def poll_break_beam(self) -> None:
+        has_note = self.has_note()
+        if has_note != self.last_has_note:
+            now = wpilib.Timer.getFPGATimestamp()
+            if has_note:
+                self.note_arrived(now)
+            else:
+                self.note_departed(now)
+            self.last_has_note = has_note
+
+    def update_stall_detector(self) -> None:
+        self.intake_speed = self.intake_velocity.value
+        self.stall_detector.update(
+            self.intake_current.value,
+            self.intake_speed,
+            self.intake_current.timestamp.time,
+        )
+
+    def sample_stall_signals(self) -> None:
+        """Sample the intake signals, on the stall notifier or once a loop."""
+        with self.stall_lock:
+            BaseStatusSignal.refresh_all(self.stall_signals)
+            self.update_stall_detector()
+
+    def sample_stall_signals_periodic(self) -> None:
+        """Sample the intake signals on the stall notifier, counting overruns.
+
+        The detector uses the signals' own timestamps, so a late sample only
+        delays detection rather than shortening the debounce.
+        """
+        now = wpilib.Timer.getFPGATimestamp()
+        last_time = self.last_stall_sample_time
+        if last_time is not None and now - last_time > 2 * self.STALL_SAMPLE_PERIOD:
+            self.stall_overrun_count += 1
+        self.last_stall_sample_time = now
+        self.sample_stall_signals()
+
+    def update_stall_sampling(self) -> None:
+        """Sample on the notifier while intaking, otherwise once a loop."""
+        notifier = self.stall_notifier
+        intaking = self.direction is self.Direction.FORWARD
+        if notifier is not None and intaking:
+            if not self.sampling_stall:
+                self.last_stall_sample_time = None
+                notifier.startPeriodic(self.STALL_SAMPLE_PERIOD)
+                self.sampling_stall = True
+            return
+        if self.sampling_stall:
+            assert notifier is not None
+            notifier.stop()
+            self.sampling_stall = False
+        self.sample_stall_signals()
+
     def execute(self) -> None:
+        if self.break_beam_interrupt is None:
+            self.poll_break_beam()
+        self.update_stall_sampling()
+
         if not self.has_indexed:
             self.maybe_reindex_deployment_encoder()
 
@@ -246,7 +463,7 @@ class IntakeComponent:
             or self.direction is self.Direction.BACKWARD
         ):
             self.stall_detection_enabled = False
-        elif self.motor.get_velocity().value > self.INTAKE_RUNNING_VELOCITY:
+        elif self.intake_speed > self.INTAKE_RUNNING_VELOCITY:
             self.stall_detection_enabled = True
 
         # lock the component if climbing or finished a real climb
@@ -255,9 +472,85 @@ class IntakeComponent:
             self.direction = self.Direction.STOPPED
             self.desired_injector_speed = 0.0
 
-        intake_request = VoltageOut(self.direction.value * self.motor_speed * 12.0)
+        intake_voltage = self.direction.value * self.motor_speed * 12.0
+        if intake_voltage != self.applied_intake_voltage:
+            self.motor.set_control(self.intake_request.with_output(intake_voltage))
+            self.applied_intake_voltage = intake_voltage
+
+        if self.onboard_profile:
+            self.follow_onboard_profile()
+        else:
+            self.follow_rio_profile()
+
+        # a note may have broken and cleared the beam between loops, so stop
+        # on the edge rather than only while the beam reads broken. Hold the
+        # lock so an arrival can't slip in between the check and the output.
+        with self.break_beam_lock:
+            if (
+                self.injecting_note
+                and self.note_arrival_time > self.handled_arrival_time
+            ):
+                self.desired_injector_speed = 0.0
+            self.handled_arrival_time = self.note_arrival_time
+            self.injector.set(self.desired_injector_speed)
+            self.stop_injector_on_arrival = (
+                self.injecting_note and self.desired_injector_speed > 0
+            )
+
+        self.direction = self.Direction.STOPPED
+        self.desired_injector_speed = 0.0
+        self.injecting_note = False
+
+    def follow_onboard_profile(self) -> None:
+        """Send the goal to the SparkMax's profile, then hold it there.
+
+        Smart Motion only closes a velocity loop, so once the profile has
+        finished the goal is held with the position gains, as the rio profile
+        does. Each is only sent once per goal.
+        """
+        target = self.target_deployment_state
+        # like the rio profile, only hold against gravity when retracting
+        ff = (
+            self.feed_forward_calculator.calculate(target.position, 0.0)
+            if target is self.RETRACTED_STATE
+            else 0.0
+        )
+        if target is not self.applied_deployment_state:
+            self.arm_profile.calculate(
+                0.0,
+                TrapezoidProfile.State(
+                    self.deploy_encoder.getPosition(),
+                    self.deploy_encoder.getVelocity(),
+                ),
+                target,
+            )
+            self.onboard_profile_end_time = (
+                time.monotonic() + self.arm_profile.totalTime()
+            )
+            self.pid_controller.setReference(
+                target.position,
+                CANSparkMax.ControlType.kSmartMotion,
+                pidSlot=self.smart_motion_pid_slot,
+                arbFeedforward=ff,
+            )
+            self.applied_deployment_state = target
+            self.holding_deployment = False
+        elif (
+            not self.holding_deployment
+            and time.monotonic() >= self.onboard_profile_end_time
+        ):
+            self.pid_controller.setReference(
+                target.position,
+                CANSparkMax.ControlType.kPosition,
+                pidSlot=self.pid_slot,
+                arbFeedforward=ff,
+            )
+            self.holding_deployment = True
 
-        self.motor.set_control(intake_request)
+    def follow_rio_profile(self) -> None:
+        """Step the profile on the rio, sending a new setpoint every loop."""
+        # resend the goal if we switch back to the onboard profile
+        self.applied_deployment_state = None
 
         desired_state = self.arm_profile.calculate(
             time.monotonic() - self.last_setpoint_update_time,
@@ -286,8 +579,3 @@ class IntakeComponent:
                 pidSlot=self.pid_slot,
                 arbFeedforward=ff,
             )
-
-        self.injector.set(self.desired_injector_speed)
-
-        self.direction = self.Direction.STOPPED
-        self.desired_injector_speed = 0.0
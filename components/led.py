@@ -1,13 +1,19 @@
 import dataclasses
+import itertools
 import time
 import math
 import random
 from abc import ABC, abstractmethod
+from array import array
+from collections.abc import Iterable
 from enum import Enum
 from typing import Callable, Protocol
 
 import wpilib
+from magicbot import tunable
+
 from ids import PwmChannels
+from utilities.telemetry import feedback_rate
 
 
 MAX_BRIGHTNESS = 50  # Integer value 0-255
@@ -17,6 +23,16 @@ FLASH_SPEED = 2
 BREATHE_SPEED = 0.5
 RAINBOW_SPEED = 8
 MORSE_SPEED = 0.2
+CHASE_SPEED = 30  # LEDs per second
+
+# LEDs along each side of the robot, the rest of the strip is across the front
+SIDE_LENGTH = 28 * 3
+
+# segment animations are drawn over the strip's pattern, the highest priority on top
+PROGRESS_PRIORITY = 1
+
+# write a little early, so loop jitter doesn't push writes back a whole loop
+REFRESH_SLACK = 0.005  # s
 
 
 class HsvColour(Enum):
@@ -51,13 +67,30 @@ class HsvColour(Enum):
 
 
 class LightStrip:
+    # the most frames a second sent to the strip, so animations don't write every
+    # loop, or no cap if not positive
+    max_refresh_rate = tunable(25.0)
+
     def __init__(self, strip_length: int) -> None:
         self.leds = wpilib.AddressableLED(PwmChannels.led_strip)
         self.leds.setLength(strip_length)
         self.strip_length = strip_length
 
-        self.led_data = wpilib.AddressableLED.LEDData()
-        self.strip_data = [self.led_data] * strip_length
+        self.palette = Palette()
+        self.strip_data = [self.palette.get(HsvColour.OFF.value)] * strip_length
+        # the strip runs down the port side, across the front and up the starboard side
+        if strip_length <= 2 * SIDE_LENGTH:
+            raise ValueError(
+                f"strip of {strip_length} LEDs is too short for both sides"
+                f" of {SIDE_LENGTH} LEDs and the front"
+            )
+        self.port = Segment(0, SIDE_LENGTH)
+        self.front = Segment(SIDE_LENGTH, strip_length - 2 * SIDE_LENGTH)
+        self.starboard = Segment(strip_length - SIDE_LENGTH, SIDE_LENGTH)
+        self.segments = (self.port, self.front, self.starboard)
+        self.last_write_time = -math.inf
+        self.write_duration = 0.0
+        self.writes = 0
 
         self.pattern: Pattern = Rainbow(HsvColour.MAGENTA)
         self.high_priority_pattern: Pattern | None = None
@@ -67,6 +100,7 @@ class LightStrip:
 
     def no_note(self) -> None:
         self.pattern = Solid(HsvColour.OFF)
+        self.clear(self.front, PROGRESS_PRIORITY)
 
     def intake_deployed(self) -> None:
         self.pattern = Flash(HsvColour.MAGENTA)
@@ -76,6 +110,17 @@ class LightStrip:
 
     def not_in_range(self) -> None:
         self.pattern = Solid(HsvColour.RED)
+        self.clear(self.front, PROGRESS_PRIORITY)
+
+    def flywheel_spin_up(self, progress: float) -> None:
+        """Fill the front as the flywheels spin up, progress being in [0, 1]."""
+        bar = self.front.animations.get(PROGRESS_PRIORITY)
+        if isinstance(bar, ProgressBar):
+            bar.progress = progress
+        else:
+            self.show(
+                self.front, ProgressBar(HsvColour.GREEN, progress), PROGRESS_PRIORITY
+            )
 
     def climbing_arm_extending(self) -> None:
         self.high_priority_pattern = Flash(HsvColour.YELLOW)
@@ -117,13 +162,249 @@ class LightStrip:
     def disabled(self) -> None:
         self.pattern = Solid(HsvColour.OFF)
 
+    def show(self, segment: "Segment", animation: "Animation", priority: int) -> None:
+        """Draw an animation on a segment, over any with a lower priority."""
+        segment.animations[priority] = animation
+
+    def clear(self, segment: "Segment", priority: int) -> None:
+        segment.animations.pop(priority, None)
+
+    @feedback_rate(1)
+    def led_write_time(self) -> float:
+        """Time taken by the last write to the strip in milliseconds."""
+        return self.write_duration * 1000
+
+    @feedback_rate(1)
+    def led_writes(self) -> int:
+        """How many frames have been sent to the strip."""
+        return self.writes
+
+    def render(self) -> bool:
+        """Render every segment, returning whether any changed since the last write.
+
+        The high priority pattern covers the whole strip, then each segment
+        shows its highest priority animation, or else the strip's pattern.
+        """
+        pattern = self.high_priority_pattern
+        colour: Hsv | None = None
+        changed = False
+        for segment in self.segments:
+            if pattern is None and segment.animations:
+                segment.animations[max(segment.animations)].render(segment)
+            else:
+                # patterns are only updated once a frame, so segments stay in step
+                if colour is None:
+                    colour = (self.pattern if pattern is None else pattern).update()
+                segment.fill(colour)
+            changed = changed or segment.has_changed()
+        return changed
+
     def execute(self) -> None:
-        if self.high_priority_pattern is None:
-            colour = self.pattern.update()
-        else:
-            colour = self.high_priority_pattern.update()
-        self.led_data.setHSV(*colour)
+        now = time.monotonic()
+        max_refresh_rate = self.max_refresh_rate
+        if (
+            max_refresh_rate > 0
+            and now - self.last_write_time < 1 / max_refresh_rate - REFRESH_SLACK
+        ):
+            return
+
+        if not self.render():
+            return
+
+        start = time.perf_counter()
+        for segment in self.segments:
+            if segment.has_changed():
+                segment.write(self.strip_data, self.palette)
         self.leds.setData(self.strip_data)
+        self.write_duration = time.perf_counter() - start
+
+        self.last_write_time = now
+        self.writes += 1
+
+
+class Segment:
+    """A run of LEDs along the strip, rendered into its own buffer.
+
+    The buffer holds the hue, saturation and value of each LED in turn.
+    Animations render into it with slice copies through its view, so a
+    frame costs a few memcpys rather than a Python loop over every LED, and
+    doesn't allocate a new row.
+    """
+
+    # solid rows kept for filling, a rainbow would otherwise keep adding them
+    MAX_ROWS = 32
+    # frames kept with their LEDData, as animations cycle through a bounded set
+    # of them, the most being a scrolling gradient's twice the segment's length
+    MAX_FRAMES = 256
+
+    def __init__(self, start: int, length: int) -> None:
+        self.start = start
+        self.length = length
+        self.buffer = array("H", bytes(6 * length))
+        self.view = memoryview(self.buffer)
+        # the buffer as last written to the strip, which starts off
+        self.sent = array("H", bytes(6 * length))
+        self.animations: dict[int, Animation] = {}
+        self.rows: dict[Hsv, memoryview] = {}
+        self.frames: dict[bytes, list[wpilib.AddressableLED.LEDData]] = {}
+
+    def fill(self, colour: Hsv) -> None:
+        row = self.rows.get(colour)
+        if row is None:
+            if len(self.rows) >= self.MAX_ROWS:
+                self.rows.clear()
+            row = memoryview(array("H", colour) * self.length)
+            self.rows[colour] = row
+        self.view[:] = row
+
+    def has_changed(self) -> bool:
+        return self.buffer != self.sent
+
+    def write(
+        self,
+        strip_data: list[wpilib.AddressableLED.LEDData],
+        palette: "Palette",
+    ) -> None:
+        """Copy the buffer into this segment of the strip's data.
+
+        Looking up each LED's colour costs a tuple per LED, so the LEDData
+        for a frame is kept and only looked up the first time it is shown.
+        """
+        buffer = self.buffer
+        frame = buffer.tobytes()
+        data = self.frames.get(frame)
+        if data is None:
+            if len(self.frames) >= self.MAX_FRAMES:
+                self.frames.clear()
+            data = palette.lookup(list(zip(buffer[0::3], buffer[1::3], buffer[2::3])))
+            self.frames[frame] = data
+        strip_data[self.start : self.start + self.length] = data
+        self.sent[:] = buffer
+
+
+class Palette:
+    """Share an LEDData between every LED of the same colour.
+
+    Encoding a colour costs far more than looking it up, and an animation
+    only uses a handful of colours, so each is only encoded once.
+    """
+
+    MAX_COLOURS = 1024
+
+    def __init__(self) -> None:
+        self.colours: dict[Hsv, wpilib.AddressableLED.LEDData] = {}
+
+    def get(self, colour: Hsv) -> wpilib.AddressableLED.LEDData:
+        data = self.colours.get(colour)
+        if data is None:
+            # a rainbow or a breathe could keep adding colours
+            if len(self.colours) >= self.MAX_COLOURS:
+                self.colours.clear()
+            data = wpilib.AddressableLED.LEDData()
+            data.setHSV(*colour)
+            self.colours[colour] = data
+        return data
+
+    def lookup(self, colours: list[Hsv]) -> list[wpilib.AddressableLED.LEDData]:
+        try:
+            # all in C while every colour has been seen before
+            return list(map(self.colours.__getitem__, colours))
+        except KeyError:
+            return [self.get(colour) for colour in colours]
+
+
+def hsv_row(colours: Iterable[Hsv]) -> array:
+    """Pack colours into a buffer like a Segment's."""
+    return array("H", itertools.chain.from_iterable(colours))
+
+
+def blend(start: Hsv, end: Hsv, fraction: float) -> Hsv:
+    h1, s1, v1 = start
+    h2, s2, v2 = end
+    return (
+        round(h1 + (h2 - h1) * fraction),
+        round(s1 + (s2 - s1) * fraction),
+        round(v1 + (v2 - v1) * fraction),
+    )
+
+
+class Animation(Protocol):
+    def render(self, segment: Segment) -> None: ...
+
+
+@dataclasses.dataclass(eq=False)
+class Chase:
+    """Blocks of colour running along the segment."""
+
+    colour: HsvColour
+    speed: float = CHASE_SPEED
+    width: int = 3
+    spacing: int = 12
+    clock: Callable[[], float] = time.monotonic
+    # the repeating pattern for each segment length, slid along to animate it
+    rows: dict[int, memoryview] = dataclasses.field(default_factory=dict, init=False)
+
+    def render(self, segment: Segment) -> None:
+        length = segment.length
+        row = self.rows.get(length)
+        if row is None:
+            block = [self.colour.value] * self.width
+            gap = [HsvColour.OFF.value] * (self.spacing - self.width)
+            row = memoryview(hsv_row((block + gap) * (length // self.spacing + 2)))
+            self.rows[length] = row
+        start = -int(self.clock() * self.speed) % self.spacing
+        segment.view[:] = row[3 * start : 3 * (start + length)]
+
+
+@dataclasses.dataclass(eq=False)
+class Gradient:
+    """A gradient from one colour to another, optionally scrolling along the segment."""
+
+    start: HsvColour
+    end: HsvColour
+    speed: float = 0.0  # LEDs per second
+    clock: Callable[[], float] = time.monotonic
+    rows: dict[int, memoryview] = dataclasses.field(default_factory=dict, init=False)
+
+    def render(self, segment: Segment) -> None:
+        length = segment.length
+        row = self.rows.get(length)
+        if row is None:
+            ramp = [
+                blend(self.start.value, self.end.value, i / length)
+                for i in range(length)
+            ]
+            # there and back again, so it scrolls without a seam
+            row = memoryview(hsv_row((ramp + ramp[::-1]) * 2))
+            self.rows[length] = row
+        start = -int(self.clock() * self.speed) % (2 * length)
+        segment.view[:] = row[3 * start : 3 * (start + length)]
+
+
+@dataclasses.dataclass(eq=False)
+class ProgressBar:
+    """Fill the segment from its start in proportion to progress, in [0, 1]."""
+
+    colour: HsvColour
+    progress: float = 0.0
+    # the segment fully lit and fully off, for each segment length
+    rows: dict[int, tuple[memoryview, memoryview]] = dataclasses.field(
+        default_factory=dict, init=False
+    )
+
+    def render(self, segment: Segment) -> None:
+        length = segment.length
+        rows = self.rows.get(length)
+        if rows is None:
+            rows = (
+                memoryview(hsv_row([self.colour.value] * length)),
+                memoryview(hsv_row([HsvColour.OFF.value] * length)),
+            )
+            self.rows[length] = rows
+        lit_row, off_row = rows
+        lit = 3 * round(min(max(self.progress, 0.0), 1.0) * length)
+        segment.view[:lit] = lit_row[:lit]
+        segment.view[lit:] = off_row[lit:]
 
 
 class Pattern(Protocol):
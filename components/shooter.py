@@ -1,6 +1,6 @@
 import math
-import numpy as np
-from magicbot import tunable, feedback
+import pathlib
+from magicbot import tunable
 from rev import CANSparkMax
 from ids import SparkMaxIds, TalonIds, DioChannels
 
@@ -17,6 +17,8 @@ from wpilib import DigitalInput, DutyCycle, SmartDashboard
 from wpimath.controller import PIDController
 
 from utilities.functions import clamp
+from utilities.lookup import LookupTable
+from utilities.telemetry import feedback_rate
 
 
 class ShooterComponent:
@@ -41,26 +43,25 @@ class ShooterComponent:
     )  # rpm -> radians/s
     INCLINATOR_JETTISON_ANGLE = 1.03
 
-    # Add extra point outside our range to ramp speed down to zero
-    FLYWHEEL_DISTANCE_LOOKUP = (0, 1.3, 2.0, 3.0, 4.0, 5.0, 7.0)
-    FLYWHEEL_SPEED_LOOKUP = (
-        54,
-        54,
-        60,
-        64,
-        65,
-        65,
-        0,
+    # Generated offline by tools/shooter_table.py from a ballistic model fitted
+    # to logged shots, or hand-tuned with only the times of flight from a
+    # model fitted to the tuned setpoints. The format version is in the name,
+    # so old code can't misread a new table.
+    # The table extends past the range of shots to ramp the flywheels down.
+    SHOOTING_TABLE_PATH = (
+        pathlib.Path(__file__).resolve().parent.parent
+        / "deploy"
+        / "shooter-table-v1.csv"
     )
-    FLYWHEEL_ANGLE_LOOKUP = (
-        0.93,
-        0.93,
-        0.77,
-        0.57,
-        0.49,
-        0.46,
-        MIN_INCLINE_ANGLE,
+    SHOOTING_TABLE = LookupTable.from_csv(
+        SHOOTING_TABLE_PATH, "range", ("inclination", "flywheel_speed")
     )
+    TIME_OF_FLIGHT_TABLE = LookupTable.from_csv(
+        SHOOTING_TABLE_PATH, "range", ("time_of_flight",)
+    )
+    # the ranges the table has been validated over
+    MIN_SHOT_RANGE = 0.0  # exclusive
+    MAX_SHOT_RANGE = 5.0
 
     desired_inclinator_angle = tunable((MAX_INCLINE_ANGLE + MIN_INCLINE_ANGLE) / 2)
     desired_flywheel_speed = tunable(0.0)
@@ -120,13 +121,18 @@ class ShooterComponent:
         flywheel_right_config.apply(flywheel_pid)
         flywheel_right_config.apply(flywheel_gear_ratio)
 
+        self.flywheel_request = VelocityVoltage(0)
+        self.flywheel_stop_request = NeutralOut()
+        # the last speed sent to the flywheels, so unchanged requests aren't resent
+        self.applied_flywheel_speed: float | None = None
+
         self.inclinator_controller = PIDController(3.0, 0, 0)
         self.inclinator_controller.setTolerance(ShooterComponent.INCLINATOR_TOLERANCE)
         SmartDashboard.putData(self.inclinator_controller)
 
     range = tunable(0.0)
 
-    @feedback
+    @feedback_rate(10, threshold=0.01)
     def get_applied_output(self) -> float:
         return self.inclinator.getAppliedOutput()
 
@@ -139,12 +145,12 @@ class ShooterComponent:
     def unlock(self) -> None:
         self.locked = False
 
-    @feedback
+    @feedback_rate(10)
     def is_ready(self) -> bool:
         """Is the shooter ready to fire?"""
         return self._flywheels_at_speed() and self._at_inclination()
 
-    @feedback
+    @feedback_rate(10)
     def _at_inclination(self) -> bool:
         """Is the inclinator close to the correct angle?"""
         return (
@@ -152,7 +158,7 @@ class ShooterComponent:
             < self.INCLINATOR_TOLERANCE
         )
 
-    @feedback
+    @feedback_rate(10)
     def _flywheels_at_speed(self) -> bool:
         """Are the flywheels close to thier target speed"""
         return (
@@ -160,41 +166,36 @@ class ShooterComponent:
             < self.FLYWHEEL_TOLERANCE
         )
 
-    @feedback
+    @feedback_rate(10, threshold=math.radians(0.1))
     def _inclination_angle(self) -> float:
         """Get the angle of the mechanism in radians measured positive upwards from zero parellel to the ground."""
         return self._raw_inclination_angle() - self.INCLINATOR_OFFSET
 
-    @feedback
+    @feedback_rate(10, threshold=math.radians(0.1))
     def _raw_inclination_angle(self) -> float:
         return (
             self.absolute_inclinator_encoder.getOutput() * self.INCLINATOR_SCALE_FACTOR
         )
 
+    def flywheel_spin_up(self) -> float:
+        """How close the flywheels are to their target speed, in [0, 1]."""
+        if self.desired_flywheel_speed <= 0:
+            return 0.0
+        progress = self.flywheel_left.get_velocity().value / self.desired_flywheel_speed
+        return min(max(progress, 0.0), 1.0)
+
     def is_range_in_bounds(self, range) -> bool:
-        return (
-            self.FLYWHEEL_DISTANCE_LOOKUP[0]
-            < range
-            <= self.FLYWHEEL_DISTANCE_LOOKUP[-2]
-        )
+        return self.MIN_SHOT_RANGE < range <= self.MAX_SHOT_RANGE
 
-    @feedback
+    @feedback_rate(10, threshold=0.1)
     def _flywheel_velocity(self) -> float:
         return self.flywheel_left.get_velocity().value
 
     def set_range(self, range: float) -> None:
         self.range = range
-        self.desired_inclinator_angle = float(
-            np.interp(range, self.FLYWHEEL_DISTANCE_LOOKUP, self.FLYWHEEL_ANGLE_LOOKUP)
-        )
-        self.desired_flywheel_speed = float(
-            np.interp(
-                range,
-                self.FLYWHEEL_DISTANCE_LOOKUP,
-                self.FLYWHEEL_SPEED_LOOKUP,
-                right=0.0,
-            )
-        )
+        angle, speed = self.SHOOTING_TABLE.evaluate(range)
+        self.desired_inclinator_angle = angle
+        self.desired_flywheel_speed = speed
 
     def coast_down(self) -> None:
         self.desired_flywheel_speed = 0
@@ -219,7 +220,12 @@ class ShooterComponent:
         if self.locked:
             self.desired_flywheel_speed = 0
 
-        if self.desired_flywheel_speed == 0:
-            self.flywheel_left.set_control(NeutralOut())
-        else:
-            self.flywheel_left.set_control(VelocityVoltage(self.desired_flywheel_speed))
+        flywheel_speed = self.desired_flywheel_speed
+        if flywheel_speed != self.applied_flywheel_speed:
+            if flywheel_speed == 0:
+                self.flywheel_left.set_control(self.flywheel_stop_request)
+            else:
+                self.flywheel_left.set_control(
+                    self.flywheel_request.with_velocity(flywheel_speed)
+                )
+            self.applied_flywheel_speed = flywheel_speed
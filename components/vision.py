@@ -1,31 +1,112 @@
+import dataclasses
+import enum
 import math
 import time
-from typing import Optional
+from collections import deque
 
+import ntcore
 import wpilib
 import wpiutil.log
-from magicbot import tunable, feedback
+from magicbot import tunable
+from photonlibpy.packet import Packet
 from photonlibpy.photonCamera import PhotonCamera
+from photonlibpy.photonPipelineResult import PhotonPipelineResult
 from photonlibpy.photonTrackedTarget import PhotonTrackedTarget
 from wpimath import objectToRobotPose
 from wpimath.geometry import Pose2d, Rotation3d, Transform3d, Translation3d, Pose3d
 
 from components.chassis import ChassisComponent
-from utilities.game import apriltag_layout
+from components.vision_fusion import CameraMeasurement, VisionFusion
+from utilities.functions import constrain_angle
+from utilities.game import FIELD_LENGTH, FIELD_WIDTH, get_tag_pose
+from utilities.replay import (
+    CAMERA_RESULT_SUFFIX,
+    CAMERA_TRANSFORM_SUFFIX,
+    encode_result,
+    encode_transform,
+)
+from utilities.telemetry import feedback_rate
+
+
+@dataclasses.dataclass
+class PoseCandidate:
+    """A robot pose estimated from a camera result, ready for the main loop."""
+
+    timestamp: float
+    pose: Pose2d
+    # single tag estimates are fused into one pose per result
+    multi_tag: bool
+    reproj_error: float
+    pose_z: float
+    tag_ids: tuple[int, ...]
+    # mean distance from the camera to the tags used
+    tag_distance: float
+    # poses for the field logs
+    best_log: Pose2d
+    alt_log: Pose2d
+
+
+class Rejection(enum.Enum):
+    """Reasons a vision measurement is kept out of the pose estimator."""
+
+    OFF_FIELD = enum.auto()
+    TOO_HIGH = enum.auto()
+    IMPOSSIBLE_JUMP = enum.auto()
+    OUTLIER = enum.auto()
+    # not yet agreed with by enough others to recover the estimate
+    UNCONFIRMED = enum.auto()
 
 
 class VisualLocalizer:
     """
     This localizes the robot from AprilTags on the field,
     using information from a single PhotonVision camera.
+
+    Camera results are fetched and turned into pose candidates on a
+    separate thread, so a slow update from the coprocessor can't hold up
+    the main loop. The main loop only drains the candidates, and hands
+    the accepted measurements to the fusion component.
     """
 
+    vision_fusion: VisionFusion
+
     # Give bias to the best pose by multiplying this const to the alt dist
     BEST_POSE_BIAS = 1.2
+    # Single tag targets more ambiguous than this are ignored
+    MAX_AMBIGUITY = 0.25
 
     # Time since the last target sighting we allow before informing drivers
     TIMEOUT = 1.0  # s
 
+    # How often the ingest thread checks for new camera results
+    INGEST_PERIOD = 0.01  # s
+    # Candidates kept for the main loop, the oldest are dropped first
+    MAX_CANDIDATES = 32
+    # Most measurements fused in one loop, the newest are kept
+    MAX_MEASUREMENTS_PER_CYCLE = 8
+
+    # Use every result the camera has sent, rather than only the latest
+    drain_all_results = tunable(True)
+
+    # Std devs grow with the square of the tag distance beyond this
+    NOMINAL_TAG_DISTANCE = 2.0  # m
+    # Single tag estimates are much less reliable than multi-tag ones
+    SINGLE_TAG_UNCERTAINTY_SCALE = 10.0
+
+    # Uncertainty of the current estimate used to gate measurements (x, y, theta)
+    ESTIMATE_STD_DEVS = (0.3, 0.3, 0.1)
+    # Chi-squared with 3 degrees of freedom at p = 0.999
+    MAX_MAHALANOBIS_SQUARED = 16.27
+    # Furthest a measurement can be from the estimate, on top of how far the
+    # robot could have travelled since the measurement was taken
+    MAX_JUMP = 0.5  # m
+    FIELD_MARGIN = 0.5  # m
+    MAX_POSE_Z = 0.5  # m
+    # Without an accepted measurement for this long, the estimate may be wrong,
+    # so stop comparing new ones to it. Instead, accept them once this many in
+    # a row have agreed with each other, until the estimate agrees with them.
+    GATE_TIMEOUT = 2.0  # s
+    RECOVERY_MEASUREMENTS = 3
     add_to_estimator = tunable(True)
     should_log = tunable(True)
 
@@ -60,20 +141,109 @@ class VisualLocalizer:
         self.pose_log_entry = wpiutil.log.FloatArrayLogEntry(
             data_log, name + "vision_pose"
         )
+        # raw results for replaying matches
+        self.result_entry = wpiutil.log.DoubleArrayLogEntry(
+            data_log, name + CAMERA_RESULT_SUFFIX
+        )
+        wpiutil.log.DoubleArrayLogEntry(
+            data_log, name + CAMERA_TRANSFORM_SUFFIX
+        ).append(encode_transform(self.robot_to_camera))
 
         self.chassis = chassis
         self.current_reproj = 0.0
+        # pose used to pick between ambiguous single tag solutions, which is
+        # updated by the main loop for the ingest thread
+        self.reference_pose = Pose2d()
+
+        # A second subscriber to the camera's results, which queues every
+        # result sent rather than only keeping the latest.
+        self.unread_results = (
+            ntcore.NetworkTableInstance.getDefault()
+            .getTable("photonvision")
+            .getSubTable(name)
+            .getRawTopic("rawBytes")
+            .subscribe(
+                "rawBytes",
+                b"",
+                ntcore.PubSubOptions(
+                    periodic=0.01, sendAll=True, pollStorage=self.MAX_CANDIDATES
+                ),
+            )
+        )
 
-    @feedback
+        # Filled by the ingest thread and drained by the main loop.
+        # deque appends and pops are atomic, so this doesn't need a lock.
+        self.candidates: deque[PoseCandidate] = deque(maxlen=self.MAX_CANDIDATES)
+
+        self.received_count = 0
+        self.used_count = 0
+        # candidates dropped by the ingest thread and the main loop respectively
+        self.overflow_count = 0
+        self.capped_count = 0
+        self.rejection_counts = dict.fromkeys(Rejection, 0)
+        self.last_accepted_time = -math.inf
+        # the estimate isn't trusted until a measurement agrees with it
+        self.recovering = True
+        # the last measurement while recovering, and how many in a row agree
+        self.recovery_candidate: PoseCandidate | None = None
+        self.recovery_std_devs = (0.0, 0.0, 0.0)
+        self.recovery_count = 0
+
+        # there are no cameras in simulation, so don't poll them to stop warnings
+        self.ingest_notifier: wpilib.Notifier | None = None
+        if not wpilib.RobotBase.isSimulation():
+            self.ingest_notifier = wpilib.Notifier(self.ingest_results)
+            self.ingest_notifier.setName(name + " ingest")
+            self.ingest_notifier.startPeriodic(self.INGEST_PERIOD)
+
+    @feedback_rate(10)
     def reproj(self) -> float:
         return self.current_reproj
 
-    def execute(self) -> None:
-        # stop warnings in simulation
-        if wpilib.RobotBase.isSimulation():
-            return
+    @feedback_rate(1)
+    def results_received(self) -> int:
+        return self.received_count
+
+    @feedback_rate(1)
+    def measurements_used(self) -> int:
+        return self.used_count
+
+    @feedback_rate(1)
+    def measurements_dropped(self) -> int:
+        return self.overflow_count + self.capped_count
+
+    @feedback_rate(1)
+    def rejected_off_field(self) -> int:
+        return self.rejection_counts[Rejection.OFF_FIELD]
+
+    @feedback_rate(1)
+    def rejected_too_high(self) -> int:
+        return self.rejection_counts[Rejection.TOO_HIGH]
+
+    @feedback_rate(1)
+    def rejected_impossible_jump(self) -> int:
+        return self.rejection_counts[Rejection.IMPOSSIBLE_JUMP]
+
+    @feedback_rate(1)
+    def rejected_outlier(self) -> int:
+        return self.rejection_counts[Rejection.OUTLIER]
+
+    @feedback_rate(1)
+    def rejected_unconfirmed(self) -> int:
+        return self.rejection_counts[Rejection.UNCONFIRMED]
+
+    def ingest_results(self) -> None:
+        """Turn new camera results into pose candidates.
+
+        This runs on the ingest notifier thread.
+        """
+        if self.drain_all_results:
+            for results in read_unread_results(self.unread_results):
+                self.ingest_result(results)
+        else:
+            self.ingest_result(self.camera.getLatestResult())
 
-        results = self.camera.getLatestResult()
+    def ingest_result(self, results: PhotonPipelineResult) -> None:
         # if results didn't see any targets
         if not results.getTargets():
             return
@@ -81,112 +251,321 @@ class VisualLocalizer:
         # if we have already processed these results
         timestamp = results.getTimestamp()
 
-        if timestamp == self.last_timestamp:
+        if timestamp <= self.last_timestamp:
             return
         self.last_recieved_timestep = time.monotonic()
         self.last_timestamp = timestamp
+        self.received_count += 1
+        self.result_entry.append(encode_result(results))
 
         if results.multiTagResult.estimatedPose.isPresent:
             p = results.multiTagResult.estimatedPose
-            pose = (Pose3d() + p.best + self.camera_to_robot).toPose2d()
-            reprojectionErr = p.bestReprojError
-            self.current_reproj = reprojectionErr
+            pose = Pose3d() + p.best + self.camera_to_robot
+            targets = results.getTargets()
+            tag_distance = sum(
+                target.bestCameraToTarget.translation().norm() for target in targets
+            ) / len(targets)
+            self.push_candidate(
+                PoseCandidate(
+                    timestamp,
+                    pose.toPose2d(),
+                    True,
+                    p.bestReprojError,
+                    pose.z,
+                    tuple(results.multiTagResult.fiducialIDsUsed),
+                    tag_distance,
+                    Pose2d(p.best.x, p.best.y, p.best.rotation().toRotation2d()),
+                    Pose2d(p.alt.x, p.alt.y, p.alt.rotation().toRotation2d()),
+                )
+            )
+        else:
+            targets = results.getTargets()
+            solution = solve_single_tags(
+                self.robot_to_camera, targets, self.reference_pose
+            )
+            if solution is None:
+                return
+            pose, pose_z, tag_ids, tag_distance = solution
+
+            # log the camera's view of the first target
+            target = targets[0]
+            best_to_target = target.bestCameraToTarget
+            alt_to_target = target.altCameraToTarget
+            self.push_candidate(
+                PoseCandidate(
+                    timestamp,
+                    pose,
+                    False,
+                    0.0,
+                    pose_z,
+                    tag_ids,
+                    tag_distance,
+                    Pose2d(
+                        best_to_target.x,
+                        best_to_target.y,
+                        best_to_target.rotation().toRotation2d(),
+                    ),
+                    Pose2d(
+                        alt_to_target.x,
+                        alt_to_target.y,
+                        alt_to_target.rotation().toRotation2d(),
+                    ),
+                )
+            )
 
-            self.field_pos_obj.setPose(pose)
+    def push_candidate(self, candidate: PoseCandidate) -> None:
+        if len(self.candidates) == self.MAX_CANDIDATES:
+            self.overflow_count += 1
+        self.candidates.append(candidate)
 
-            if (
+    def execute(self) -> None:
+        # the ingest thread can't safely ask the chassis for its pose
+        self.reference_pose = self.chassis.get_pose()
+
+        candidates = self.candidates
+        if not candidates:
+            return
+        batch = []
+        while candidates:
+            batch.append(candidates.popleft())
+        batch.sort(key=lambda candidate: candidate.timestamp)
+
+        cap = self.MAX_MEASUREMENTS_PER_CYCLE
+        if len(batch) > cap:
+            self.capped_count += len(batch) - cap
+            batch = batch[-cap:]
+
+        measurements: list[CameraMeasurement] = []
+        for candidate in batch:
+            self.add_candidate(candidate, measurements)
+        self.vision_fusion.add_measurements(measurements)
+        self.used_count += len(measurements)
+
+    def add_candidate(
+        self, candidate: PoseCandidate, measurements: list[CameraMeasurement]
+    ) -> None:
+        pose = candidate.pose
+        self.field_pos_obj.setPose(pose)
+        if candidate.multi_tag:
+            self.current_reproj = candidate.reproj_error
+            if self.should_log:
+                self.multi_best_log.setPose(candidate.best_log)
+                self.multi_alt_log.setPose(candidate.alt_log)
+            if not (
                 self.add_to_estimator
                 and self.current_reproj < self.reproj_error_threshold
             ):
-                self.chassis.estimator.addVisionMeasurement(
-                    pose,
-                    timestamp,
-                    (
-                        self.linear_vision_uncertainty,
-                        self.linear_vision_uncertainty,
-                        self.rotation_vision_uncertainty,
-                    ),
-                )
-
+                return
+        else:
+            self.last_pose_z = candidate.pose_z
             if self.should_log:
-                self.multi_best_log.setPose(
-                    Pose2d(p.best.x, p.best.y, p.best.rotation().toRotation2d())
-                )
-                self.multi_alt_log.setPose(
-                    Pose2d(p.alt.x, p.alt.y, p.alt.rotation().toRotation2d())
-                )
+                self.single_best_log.setPose(candidate.best_log)
+                self.single_alt_log.setPose(candidate.alt_log)
+
+        std_devs = self.measurement_std_devs(candidate)
+        rejection = self.check_measurement(candidate, std_devs)
+        if rejection is not None:
+            self.rejection_counts[rejection] += 1
+            return
+        self.last_accepted_time = candidate.timestamp
+        measurements.append(
+            CameraMeasurement(
+                candidate.timestamp, pose, std_devs, frozenset(candidate.tag_ids)
+            )
+        )
+
+    def measurement_std_devs(
+        self, candidate: PoseCandidate
+    ) -> tuple[float, float, float]:
+        """Std devs for a measurement, scaled by the number and distance of tags."""
+        distance_scale = (
+            max(1.0, candidate.tag_distance / self.NOMINAL_TAG_DISTANCE) ** 2
+        )
+        scale = distance_scale / math.sqrt(max(1, len(candidate.tag_ids)))
+        linear = self.linear_vision_uncertainty * scale
+        if not candidate.multi_tag:
+            linear *= self.SINGLE_TAG_UNCERTAINTY_SCALE
+        rotation = self.rotation_vision_uncertainty * scale
+        return (linear, linear, rotation)
+
+    def check_measurement(
+        self, candidate: PoseCandidate, std_devs: tuple[float, float, float]
+    ) -> Rejection | None:
+        """Check whether a measurement is plausible given the current estimate."""
+        pose = candidate.pose
+        margin = self.FIELD_MARGIN
+        if not (
+            -margin <= pose.x <= FIELD_LENGTH + margin
+            and -margin <= pose.y <= FIELD_WIDTH + margin
+        ):
+            return Rejection.OFF_FIELD
+        if abs(candidate.pose_z) > self.MAX_POSE_Z:
+            return Rejection.TOO_HIGH
+
+        now = wpilib.Timer.getFPGATimestamp()
+        if now - self.last_accepted_time > self.GATE_TIMEOUT:
+            self.recovering = True
+
+        rejection = self.compare_poses(
+            pose,
+            std_devs,
+            self.chassis.get_pose(),
+            self.ESTIMATE_STD_DEVS,
+            max(0.0, now - candidate.timestamp),
+        )
+        if self.recovering:
+            return self.check_recovery(candidate, std_devs, rejection)
+        return rejection
+
+    def check_recovery(
+        self,
+        candidate: PoseCandidate,
+        std_devs: tuple[float, float, float],
+        estimate_rejection: Rejection | None,
+    ) -> Rejection | None:
+        """Check a measurement against the last ones while the estimate recovers.
+
+        Once enough in a row agree, keep accepting them until the estimate has
+        been pulled close enough to pass the normal gate, as each one only
+        moves the estimate part of the way.
+        """
+        if estimate_rejection is None:
+            self.recovering = False
+            self.recovery_candidate = None
+            self.recovery_count = 0
+            return None
+
+        previous = self.recovery_candidate
+        if previous is not None and (
+            self.compare_poses(
+                candidate.pose,
+                std_devs,
+                previous.pose,
+                self.recovery_std_devs,
+                abs(candidate.timestamp - previous.timestamp),
+            )
+            is None
+        ):
+            self.recovery_count += 1
         else:
-            for target in results.getTargets():
-                # filter out likely bad targets
-                if target.getPoseAmbiguity() > 0.25:
-                    continue
-
-                poses = estimate_poses_from_apriltag(self.robot_to_camera, target)
-                if poses is None:
-                    # tag doesn't exist
-                    continue
-
-                best, alt, self.last_pose_z = poses
-                pose = choose_pose(
-                    best,
-                    alt,
-                    self.chassis.get_pose(),
-                )
+            self.recovery_count = 1
+        self.recovery_candidate = candidate
+        self.recovery_std_devs = std_devs
 
-                self.field_pos_obj.setPose(pose)
-                self.chassis.estimator.addVisionMeasurement(pose, timestamp)
-
-                if self.should_log:
-                    self.single_best_log.setPose(
-                        Pose2d(
-                            target.bestCameraToTarget.x,
-                            target.bestCameraToTarget.y,
-                            target.bestCameraToTarget.rotation().toRotation2d(),
-                        )
-                    )
-                    self.single_alt_log.setPose(
-                        Pose2d(
-                            target.altCameraToTarget.x,
-                            target.altCameraToTarget.y,
-                            target.altCameraToTarget.rotation().toRotation2d(),
-                        )
-                    )
+        if self.recovery_count < self.RECOVERY_MEASUREMENTS:
+            return Rejection.UNCONFIRMED
+        return None
+
+    def compare_poses(
+        self,
+        pose: Pose2d,
+        std_devs: tuple[float, float, float],
+        reference: Pose2d,
+        reference_std_devs: tuple[float, float, float],
+        elapsed: float,
+    ) -> Rejection | None:
+        """Check a pose is consistent with a reference from elapsed seconds apart."""
+        error_x = pose.x - reference.x
+        error_y = pose.y - reference.y
+        velocity = self.chassis.get_velocity()
+        max_jump = self.MAX_JUMP + math.hypot(velocity.vx, velocity.vy) * elapsed
+        if math.hypot(error_x, error_y) > max_jump:
+            return Rejection.IMPOSSIBLE_JUMP
+
+        error_theta = constrain_angle(
+            pose.rotation().radians() - reference.rotation().radians()
+        )
+        mahalanobis_squared = 0.0
+        for error, reference_std_dev, std_dev in zip(
+            (error_x, error_y, error_theta), reference_std_devs, std_devs
+        ):
+            mahalanobis_squared += error**2 / (reference_std_dev**2 + std_dev**2)
+        if mahalanobis_squared > self.MAX_MAHALANOBIS_SQUARED:
+            return Rejection.OUTLIER
+        return None
 
     def sees_target(self):
         return time.monotonic() - self.last_recieved_timestep < self.TIMEOUT
 
 
-def estimate_poses_from_apriltag(
-    robot_to_camera: Transform3d, target: PhotonTrackedTarget
-) -> Optional[tuple[Pose2d, Pose2d, float]]:
-    tag_id = target.getFiducialId()
-    tag_pose = apriltag_layout.getTagPose(tag_id)
-    if tag_pose is None:
-        return None
+def read_unread_results(
+    subscriber: ntcore.RawSubscriber,
+) -> list[PhotonPipelineResult]:
+    """Decode every result sent since the last read, oldest first.
 
-    best_pose = objectToRobotPose(
-        tag_pose, target.getBestCameraToTarget(), robot_to_camera
-    )
-    alternate_pose = objectToRobotPose(
-        tag_pose, target.getAlternateCameraToTarget(), robot_to_camera
+    This decodes the same way as PhotonCamera.getLatestResult.
+    """
+    results = []
+    for packet in subscriber.readQueue():
+        if not packet.value:
+            continue
+        result = PhotonPipelineResult()
+        result.populateFromPacket(Packet(packet.value))
+        # NT4 allows us to correct the timestamp based on when the message was sent
+        result.setTimestampSeconds(packet.time / 1e6 - result.getLatencyMillis() / 1e3)
+        results.append(result)
+    results.sort(key=PhotonPipelineResult.getTimestamp)
+    return results
+
+
+def solve_single_tags(
+    robot_to_camera: Transform3d,
+    targets: list[PhotonTrackedTarget],
+    reference_pose: Pose2d,
+) -> tuple[Pose2d, float, tuple[int, ...], float] | None:
+    """
+    Estimate a single robot pose from every single tag solution in a result.
+
+    Targets that are too ambiguous or aren't on the field are skipped. For
+    each remaining tag, the best or alternate solution is picked, whichever
+    is nearer the reference pose after biasing towards the best, and the
+    picked poses are averaged.
+
+    Returns the fused pose, the mean height of the picked poses, the ids
+    of the tags used and their mean distance from the camera, or None if no
+    targets could be used.
+    """
+    ref_x = reference_pose.x
+    ref_y = reference_pose.y
+    bias = VisualLocalizer.BEST_POSE_BIAS
+
+    tag_ids: list[int] = []
+    sum_x = sum_y = sum_z = sum_cos = sum_sin = sum_distance = 0.0
+    for target in targets:
+        # filter out likely bad targets
+        if target.poseAmbiguity > VisualLocalizer.MAX_AMBIGUITY:
+            continue
+        tag_pose = get_tag_pose(target.fiducialId)
+        if tag_pose is None:
+            continue
+
+        pose = objectToRobotPose(tag_pose, target.bestCameraToTarget, robot_to_camera)
+        alt = objectToRobotPose(tag_pose, target.altCameraToTarget, robot_to_camera)
+        best_dist = math.hypot(pose.x - ref_x, pose.y - ref_y)
+        alt_dist = math.hypot(alt.x - ref_x, alt.y - ref_y) * bias
+        if alt_dist <= best_dist:
+            pose = alt
+
+        yaw = pose.rotation().z
+        tag_ids.append(target.fiducialId)
+        sum_distance += target.bestCameraToTarget.translation().norm()
+        sum_x += pose.x
+        sum_y += pose.y
+        sum_z += pose.z
+        sum_cos += math.cos(yaw)
+        sum_sin += math.sin(yaw)
+
+    if not tag_ids:
+        return None
+    count = len(tag_ids)
+    return (
+        Pose2d(sum_x / count, sum_y / count, math.atan2(sum_sin, sum_cos)),
+        sum_z / count,
+        tuple(tag_ids),
+        sum_distance / count,
     )
-    return best_pose.toPose2d(), alternate_pose.toPose2d(), best_pose.z
 
 
 def get_target_skew(target: PhotonTrackedTarget) -> float:
     tag_to_cam = target.getBestCameraToTarget().inverse()
     return math.atan2(tag_to_cam.y, tag_to_cam.x)
-
-
-def choose_pose(best_pose: Pose2d, alternate_pose: Pose2d, cur_robot: Pose2d) -> Pose2d:
-    """Picks either the best or alternate pose estimate"""
-    best_dist = best_pose.translation().distance(cur_robot.translation())
-    alternate_dist = (
-        alternate_pose.translation().distance(cur_robot.translation())
-        * VisualLocalizer.BEST_POSE_BIAS
-    )
-
-    if best_dist < alternate_dist:
-        return best_pose
-    else:
-        return alternate_pose
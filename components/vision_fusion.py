@@ -0,0 +1,147 @@
+import dataclasses
+import math
+from collections.abc import Iterable, Sequence
+
+from wpimath.geometry import Pose2d
+from wpimath.kinematics import ChassisSpeeds
+
+from components.chassis import ChassisComponent, VisionMeasurement
+from utilities.telemetry import feedback_rate
+
+
+@dataclasses.dataclass
+class CameraMeasurement:
+    """A pose measurement from one camera which has passed its gating."""
+
+    timestamp: float
+    pose: Pose2d
+    # (x, y, theta) standard deviations
+    std_devs: tuple[float, float, float]
+    tag_ids: frozenset[int]
+
+
+class VisionFusion:
+    """
+    Combines the measurements from every camera before they reach the pose estimator.
+
+    Measurements captured within half a frame of each other are merged into
+    one inverse variance weighted measurement. The estimator replays its
+    odometry history for every measurement, so this keeps the replay work
+    to once per frame no matter how many cameras there are.
+
+    The cameras aren't synchronised, so each measurement is first moved
+    along by the robot's velocity to the merged measurement's timestamp.
+    """
+
+    chassis: ChassisComponent
+
+    # the cameras' frame period, at 30 fps
+    CAMERA_FRAME_PERIOD = 1 / 30  # s
+    # Measurements captured this close together are fused as one frame, which
+    # pairs each camera's frame with the nearest frame from every other camera
+    TIMESTAMP_TOLERANCE = CAMERA_FRAME_PERIOD / 2  # s
+
+    def __init__(self) -> None:
+        self.pending: list[CameraMeasurement] = []
+        self.submitted_count = 0
+        self.merged_count = 0
+
+    @feedback_rate(1)
+    def measurements_submitted(self) -> int:
+        return self.submitted_count
+
+    @feedback_rate(1)
+    def measurements_merged(self) -> int:
+        return self.merged_count
+
+    def add_measurements(self, measurements: Iterable[CameraMeasurement]) -> None:
+        """Queue measurements from a camera, to be fused on the next execute."""
+        self.pending.extend(measurements)
+
+    def execute(self) -> None:
+        pending = self.pending
+        if not pending:
+            return
+        pending.sort(key=lambda measurement: measurement.timestamp)
+        velocity = ChassisSpeeds.fromRobotRelativeSpeeds(
+            self.chassis.get_velocity(), self.chassis.get_pose().rotation()
+        )
+
+        fused: list[VisionMeasurement] = []
+        group_start = 0
+        for i in range(1, len(pending) + 1):
+            if (
+                i == len(pending)
+                or pending[i].timestamp - pending[group_start].timestamp
+                > self.TIMESTAMP_TOLERANCE
+            ):
+                fused.append(fuse_measurements(pending[group_start:i], velocity))
+                group_start = i
+
+        self.chassis.add_vision_measurements(fused)
+        self.submitted_count += len(fused)
+        self.merged_count += len(pending) - len(fused)
+        pending.clear()
+
+
+STATIONARY = ChassisSpeeds()
+
+
+def fuse_measurements(
+    measurements: Sequence[CameraMeasurement],
+    velocity: ChassisSpeeds = STATIONARY,
+) -> VisionMeasurement:
+    """
+    Merge measurements of one frame, weighting each axis by its inverse variance.
+
+    Each measurement is moved to the mean timestamp along the field
+    relative velocity, so cameras that aren't synchronised still agree
+    while the robot is moving.
+
+    When measurements share tags their errors aren't independent, so the
+    fused std devs are no smaller than the best of the individual ones.
+    """
+    if len(measurements) == 1:
+        measurement = measurements[0]
+        return (measurement.pose, measurement.timestamp, measurement.std_devs)
+
+    timestamps = [measurement.timestamp for measurement in measurements]
+    timestamp = sum(timestamps) / len(timestamps)
+    weight_x = weight_y = weight_theta = 0.0
+    sum_x = sum_y = sum_cos = sum_sin = 0.0
+    tag_ids: set[int] = set()
+    tag_count = 0
+    for measurement in measurements:
+        pose = measurement.pose
+        elapsed = timestamp - measurement.timestamp
+        std_x, std_y, std_theta = measurement.std_devs
+        w_x = 1 / std_x**2
+        w_y = 1 / std_y**2
+        w_theta = 1 / std_theta**2
+        weight_x += w_x
+        weight_y += w_y
+        weight_theta += w_theta
+        sum_x += w_x * (pose.x + velocity.vx * elapsed)
+        sum_y += w_y * (pose.y + velocity.vy * elapsed)
+        heading = pose.rotation().radians() + velocity.omega * elapsed
+        sum_cos += w_theta * math.cos(heading)
+        sum_sin += w_theta * math.sin(heading)
+        tag_ids |= measurement.tag_ids
+        tag_count += len(measurement.tag_ids)
+
+    pose = Pose2d(sum_x / weight_x, sum_y / weight_y, math.atan2(sum_sin, sum_cos))
+
+    if len(tag_ids) < tag_count:
+        # overlapping observations of the same tags
+        std_devs = (
+            min(measurement.std_devs[0] for measurement in measurements),
+            min(measurement.std_devs[1] for measurement in measurements),
+            min(measurement.std_devs[2] for measurement in measurements),
+        )
+    else:
+        std_devs = (
+            math.sqrt(1 / weight_x),
+            math.sqrt(1 / weight_y),
+            math.sqrt(1 / weight_theta),
+        )
+    return (pose, timestamp, std_devs)
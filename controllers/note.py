@@ -1,25 +1,44 @@
-from magicbot import StateMachine, state, feedback, will_reset_to
+import math
+
+from magicbot import StateMachine, state, will_reset_to
 import wpilib
+from wpiutil.log import DataLog, FloatLogEntry
 
 from components.intake import IntakeComponent
 from components.led import LightStrip
+from components.shooter import ShooterComponent
 from controllers.shooter import Shooter
 from controllers.intake import Intake
+from utilities.telemetry import feedback_rate
 
 
 class NoteManager(StateMachine):
     shooter: Shooter
     intake_component: IntakeComponent
+    shooter_component: ShooterComponent
     intake: Intake
     status_lights: LightStrip
 
+    data_log: DataLog
+
     shot_desired = will_reset_to(False)
     intake_desired = will_reset_to(False)
     cancel_intake_desired = will_reset_to(False)
     jettison_desired = will_reset_to(False)
+    pre_align_desired = will_reset_to(False)
 
     def __init__(self) -> None:
         self.last_state = ""
+        # the break beam departure edge last seen, and whether it was a shot
+        self.last_departure_time = -math.inf
+        self.fired = False
+        # when the shot we're waiting for was asked for
+        self.trigger_time: float | None = None
+
+    def setup(self) -> None:
+        self.trigger_to_shot_entry = FloatLogEntry(
+            self.data_log, "NoteManager: Trigger to shot times"
+        )
 
     def try_intake(self) -> None:
         self.intake_desired = True
@@ -33,24 +52,39 @@ class NoteManager(StateMachine):
     def jettison(self) -> None:
         self.jettison_desired = True
 
-    @feedback
+    def try_pre_align(self) -> None:
+        """Turn towards the speaker while holding a note, when the driver isn't turning."""
+        self.pre_align_desired = True
+
+    @feedback_rate(10)
     def has_note(self) -> bool:
         return self.intake_component.has_note()
 
     def has_just_fired(self) -> bool:
         """Intended to be polled by autonomous to tell when shooting is finished"""
-        return (
-            self.last_state == "holding_note"
-            and self.current_state == "not_holding_note"
-        )
+        return self.fired
+
+    def last_fired_time(self) -> float:
+        """The FPGA time the last note left, from the break beam edge."""
+        return self.last_departure_time
 
     def execute(self) -> None:
+        # A note leaving while we held it, not while outtaking, was a shot.
+        # Polling may see the edge a loop after we stopped holding the note.
+        _, departure_time = self.intake_component.break_beam_edges()
+        self.fired = departure_time > self.last_departure_time and (
+            self.current_state == "holding_note" or self.last_state == "holding_note"
+        )
+        self.last_departure_time = departure_time
         self.last_state = self.current_state
         super().execute()
 
     def on_enable(self) -> None:
         super().on_enable()
         self.last_state = ""
+        # notes that left while disabled weren't shots
+        _, self.last_departure_time = self.intake_component.break_beam_edges()
+        self.fired = False
         if self.has_note() or wpilib.DriverStation.isAutonomous():
             self.engage()
         else:
@@ -58,14 +92,24 @@ class NoteManager(StateMachine):
 
     @state(must_finish=True, first=True)
     def holding_note(self) -> None:
-        self.shooter.update_range()
+        self.shooter.ready_ahead(align=self.pre_align_desired)
+
+        if self.shot_desired:
+            if self.trigger_time is None:
+                self.trigger_time = wpilib.Timer.getFPGATimestamp()
+        elif not self.shooter.is_executing:
+            self.trigger_time = None
 
         if self.jettison_desired:
+            self.trigger_time = None
             self.next_state(self.outtaking)
             return
 
         if self.shooter.in_range():
             self.status_lights.in_range()
+            self.status_lights.flywheel_spin_up(
+                self.shooter_component.flywheel_spin_up()
+            )
             if self.shot_desired:
                 self.shooter.engage()
         else:
@@ -78,6 +122,11 @@ class NoteManager(StateMachine):
     def not_holding_note(self, initial_call) -> None:
         if initial_call:
             self.status_lights.no_note()
+            if self.trigger_time is not None:
+                self.trigger_to_shot_entry.append(
+                    self.last_fired_time() - self.trigger_time
+                )
+                self.trigger_time = None
 
         if self.jettison_desired:
             self.next_state(self.outtaking)
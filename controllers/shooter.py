@@ -1,17 +1,83 @@
+import dataclasses
 import math
 
 from wpimath.geometry import Translation2d
 from wpiutil.log import DataLog, FloatArrayLogEntry, FloatLogEntry
-from wpilib import DriverStation
+from wpilib import DriverStation, Timer
 
-from magicbot import StateMachine, state, timed_state, feedback, tunable
+from magicbot import StateMachine, state, timed_state, tunable
 
 from components.chassis import ChassisComponent
 from components.intake import IntakeComponent
 from components.shooter import ShooterComponent
 from components.led import LightStrip
-from utilities.game import get_goal_speaker_position, NOTE_DIAMETER, SPEAKER_HOOD_WIDTH
+from utilities.game import (
+    get_goal_speaker_position_2d,
+    NOTE_DIAMETER,
+    SPEAKER_HOOD_WIDTH,
+)
 from utilities.functions import constrain_angle
+from utilities.telemetry import feedback_rate
+
+SHOT_RANGE_ENTRY = "Shooter: Shot ranges"
+# the inclination and flywheel speed of each shot, to fit the ballistic model
+SHOT_SETPOINT_ENTRY = "Shooter: Shot setpoints"
+
+# the fixed compute budget for the moving shot solver
+MAX_SOLVER_ITERATIONS = 5
+SOLVER_TOLERANCE = 0.01  # m
+
+
+@dataclasses.dataclass
+class ShotSolution:
+    """Where to aim so that a note released now lands in the goal."""
+
+    # the point to aim at, offset from the goal against the robot's motion
+    virtual_target: Translation2d
+    range: float
+    heading: float
+    inclination: float
+    flywheel_speed: float
+    time_of_flight: float
+    converged: bool
+
+
+def solve_moving_shot(
+    position: Translation2d, velocity: Translation2d, goal: Translation2d
+) -> ShotSolution:
+    """Aim a shot released at position while moving with a field relative velocity.
+
+    The note keeps the robot's velocity, so it lands where a stationary shot at
+    the virtual target would, displaced by the velocity times the time of
+    flight. The time of flight depends on the range to the virtual target, so
+    iterate until the range settles, giving up after a fixed number of steps.
+    """
+    distance = position.distance(goal)
+    time_of_flight = 0.0
+    target = goal
+    converged = False
+    for _ in range(MAX_SOLVER_ITERATIONS):
+        (time_of_flight,) = ShooterComponent.TIME_OF_FLIGHT_TABLE.evaluate(distance)
+        target = goal - velocity * time_of_flight
+        previous = distance
+        distance = position.distance(target)
+        if abs(distance - previous) < SOLVER_TOLERANCE:
+            converged = True
+            break
+
+    inclination, flywheel_speed = ShooterComponent.SHOOTING_TABLE.evaluate(distance)
+    to_target = target - position
+    # the shooter is on the back of the robot
+    heading = constrain_angle(math.atan2(to_target.y, to_target.x) + math.pi)
+    return ShotSolution(
+        target,
+        distance,
+        heading,
+        inclination,
+        flywheel_speed,
+        time_of_flight,
+        converged,
+    )
 
 
 class Shooter(StateMachine):
@@ -22,30 +88,54 @@ class Shooter(StateMachine):
 
     data_log: DataLog
 
-    SPEED_LIMIT = tunable(0.1)
+    # the fastest we trust the moving shot solver, in m/s
+    SPEED_LIMIT = tunable(2.0)
+    # the solver doesn't model the note's spin from turning, in rad/s
     SPINNING_SPEED_LIMIT = tunable(0.1)
+    # from the decision to fire until the note leaves the shooter
+    RELEASE_DELAY = tunable(0.1)
+    # how far ahead to get ready for the next shot, about the flywheel spin up time
+    READY_AHEAD_TIME = tunable(ShooterComponent.FLYWHEEL_RAMP_TIME)
+    # give up on a note that hasn't left the injector, so it can't hang here
+    FIRING_TIMEOUT = 1.0  # s
 
     def __init__(self):
         self.range = 0.0
         self.bearing_tolerance = 0.0
         self.bearing_to_speaker = 0.0
+        self.solution_converged = False
+        self.release_position = Translation2d()
+        self.fire_time = 0.0
 
     def setup(self):
         self.shot_time_entry = FloatLogEntry(self.data_log, "Shooter: Shot match times")
-        self.shot_range_entry = FloatLogEntry(self.data_log, "Shooter: Shot ranges")
+        self.shot_range_entry = FloatLogEntry(self.data_log, SHOT_RANGE_ENTRY)
+        self.shot_setpoint_entry = FloatArrayLogEntry(
+            self.data_log, SHOT_SETPOINT_ENTRY
+        )
         self.shot_pos_entry = FloatArrayLogEntry(
             self.data_log, "Shooter: Field translation from target"
         )
+        self.shot_velocity_entry = FloatArrayLogEntry(
+            self.data_log, "Shooter: Field velocity at shot"
+        )
 
     def translation_to_goal(self) -> Translation2d:
-        return (
-            get_goal_speaker_position().toTranslation2d()
-            - self.chassis.get_pose().translation()
+        return get_goal_speaker_position_2d() - self.chassis.get_pose().translation()
+
+    def field_velocity(self) -> Translation2d:
+        velocity = self.chassis.get_velocity()
+        return Translation2d(velocity.vx, velocity.vy).rotateBy(
+            self.chassis.get_rotation()
         )
 
-    @feedback
+    @feedback_rate(10)
     def is_aiming_finished(self) -> bool:
-        heading = self.chassis.get_rotation().radians()
+        # where we will be pointing when the note leaves
+        heading = (
+            self.chassis.get_rotation().radians()
+            + self.chassis.get_velocity().omega * self.RELEASE_DELAY
+        )
         # Check that we are greater than the min angle, and smaller than max. We might wrap past zero, so use the constrain_angle function
         return (
             abs(constrain_angle(self.bearing_to_speaker - heading))
@@ -55,9 +145,42 @@ class Shooter(StateMachine):
     def coast_down(self) -> None:
         self.shooter_component.coast_down()
 
-    def update_range(self) -> None:
-        self.range = self.translation_to_goal().norm()
+    def update_range(self) -> ShotSolution:
+        # Solve from where we will be when the note leaves
+        velocity = self.field_velocity()
+        self.release_position = (
+            self.chassis.get_pose().translation() + velocity * self.RELEASE_DELAY
+        )
+        solution = solve_moving_shot(
+            self.release_position, velocity, get_goal_speaker_position_2d()
+        )
+        self.solution_converged = solution.converged
+        self.range = solution.range
         self.shooter_component.set_range(self.range)
+        return solution
+
+    def ready_ahead(self, align: bool) -> None:
+        """Get ready for a shot from where we're driving to, while holding a note.
+
+        If we can't shoot from here but will be in range soon on the commanded
+        velocity, spin up and incline for that shot now, so the flywheels have
+        time to ramp. If align, also turn towards the speaker while in range.
+        """
+        solution = self.update_range()
+        if not self.in_range():
+            commanded = self.chassis.to_field_oriented(self.chassis.chassis_speeds)
+            velocity = Translation2d(commanded.vx, commanded.vy)
+            ahead = solve_moving_shot(
+                self.release_position + velocity * self.READY_AHEAD_TIME,
+                velocity,
+                get_goal_speaker_position_2d(),
+            )
+            if not self.shooter_component.is_range_in_bounds(ahead.range):
+                return
+            self.shooter_component.set_range(ahead.range)
+            solution = ahead
+        if align:
+            self.chassis.snap_to_heading(solution.heading)
 
     def try_jettison(self) -> None:
         self.engage(self.preparing_to_jettison)
@@ -66,9 +189,17 @@ class Shooter(StateMachine):
         translation = self.translation_to_goal()
         self.shot_time_entry.append(DriverStation.getMatchTime())
         self.shot_range_entry.append(self.range)
+        self.shot_setpoint_entry.append(
+            [
+                self.shooter_component.desired_inclinator_angle,
+                self.shooter_component.desired_flywheel_speed,
+            ]
+        )
         self.shot_pos_entry.append([translation.x, translation.y])
+        velocity = self.field_velocity()
+        self.shot_velocity_entry.append([velocity.x, velocity.y])
 
-    @feedback
+    @feedback_rate(10)
     def in_range(self) -> bool:
         return self.shooter_component.is_range_in_bounds(self.range)
 
@@ -81,27 +212,34 @@ class Shooter(StateMachine):
                 self.is_aiming_finished()
                 and self.shooter_component.is_ready()
                 and self.in_range()
-                and self.is_below_speed_limit()
-                and self.is_below_spinning_limit()
+                and self.is_shot_feasible()
             ):
                 self.log_shot()
                 self.next_state(self.firing)
             else:
                 self.aim()
 
+    @feedback_rate(10)
+    def is_shot_feasible(self) -> bool:
+        """Can the last solution be trusted to put a note in the goal?"""
+        return (
+            self.solution_converged
+            and self.shooter_component.is_range_in_bounds(self.range)
+            and self.is_below_speed_limit()
+            and self.is_below_spinning_limit()
+        )
+
     def is_below_speed_limit(self) -> bool:
-        vel = self.chassis.get_velocity()
-        return math.hypot(vel.vx, vel.vy) < self.SPEED_LIMIT
+        return self.field_velocity().norm() <= self.SPEED_LIMIT
 
     def is_below_spinning_limit(self) -> bool:
-        return self.chassis.get_velocity().omega < self.SPINNING_SPEED_LIMIT
+        return abs(self.chassis.get_velocity().omega) < self.SPINNING_SPEED_LIMIT
 
     def aim(self) -> None:
-        # Update range
-        self.update_range()
+        solution = self.update_range()
 
-        # Determine heading required for goal
-        translation_to_goal = self.translation_to_goal()
+        # Determine heading required for the virtual target
+        translation_to_goal = solution.virtual_target - self.release_position
 
         # We need to aim at least a note's radius inside the outer bounds of the goal. Also add a safety margin
         margin = 0.10
@@ -110,9 +248,7 @@ class Shooter(StateMachine):
             math.atan2(translation_to_goal.y + offset, translation_to_goal.x) + math.pi
         )
 
-        self.bearing_to_speaker = constrain_angle(
-            math.atan2(translation_to_goal.y, translation_to_goal.x) + math.pi
-        )
+        self.bearing_to_speaker = solution.heading
 
         self.bearing_tolerance = abs(
             constrain_angle(self.bearing_to_speaker - offset_bearing)
@@ -128,9 +264,19 @@ class Shooter(StateMachine):
             self.next_state(self.firing)
 
     @state(must_finish=True)
-    def firing(self) -> None:
+    def firing(self, state_tm: float, initial_call: bool) -> None:
+        if initial_call:
+            self.fire_time = Timer.getFPGATimestamp()
         self.intake_component.feed_shooter()
-        if not self.intake_component.has_note():
+        # the note has gone once it clears the break beam, which it may have
+        # done between loops. Fall back to the beam reading clear in case the
+        # edge was missed, and to a timeout in case the beam is faulty.
+        _, departure_time = self.intake_component.break_beam_edges()
+        if (
+            departure_time > self.fire_time
+            or not self.intake_component.has_note()
+            or state_tm > self.FIRING_TIMEOUT
+        ):
             self.next_state(self.waiting_for_shot_to_complete)
 
     @timed_state(duration=0.2, must_finish=True)
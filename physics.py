@@ -3,9 +3,11 @@ from __future__ import annotations
 import math
 import typing
 
+import ntcore
 import phoenix6
 import phoenix6.unmanaged
 import wpilib
+import wpiutil.log
 from pyfrc.physics.core import PhysicsInterface
 from wpilib.simulation import DCMotorSim, SimDeviceSim
 from wpimath.kinematics import SwerveDrive4Kinematics
@@ -13,7 +15,10 @@ from wpimath.system.plant import DCMotor
 from wpimath.units import kilogram_square_meters
 
 from components.chassis import SwerveModule
+from components.intake import IntakeComponent
 from components.shooter import ShooterComponent
+from utilities.replay import GROUND_TRUTH_ENTRY, encode_pose
+from utilities.vision_sim import SimulatedCamera
 
 if typing.TYPE_CHECKING:
     from robot import MyRobot
@@ -65,6 +70,31 @@ class Falcon500MotorSim:
             )
 
 
+class IntakeRollerSim(Falcon500MotorSim):
+    """The intake rollers, which a jammed note stops dead.
+
+    The simulated TalonFX draws its stall current while the rotor is held
+    still, as it would with a note wedged in the rollers.
+    """
+
+    def __init__(self, motor: phoenix6.hardware.TalonFX) -> None:
+        super().__init__(
+            motor,
+            gearing=IntakeComponent.INTAKE_GEAR_RATIO,
+            # a guess, the rollers are light
+            moi=0.0005,
+        )
+        self.jammed = False
+
+    def update(self, dt: float) -> None:
+        if not self.jammed:
+            super().update(dt)
+            return
+        self.motor_sim.setState(self.motor_sim.getAngularPosition(), 0)
+        for sim_state in self.sim_states:
+            sim_state.set_rotor_velocity(0)
+
+
 class PhysicsEngine:
     def __init__(self, physics_controller: PhysicsInterface, robot: MyRobot):
         self.physics_controller = physics_controller
@@ -73,6 +103,7 @@ class PhysicsEngine:
         self.swerve_modules: tuple[
             SwerveModule, SwerveModule, SwerveModule, SwerveModule
         ] = robot.chassis.modules
+        self.module_signals = robot.chassis.status_signals
 
         # Motors
         self.wheels = [
@@ -101,9 +132,26 @@ class PhysicsEngine:
             moi=2 * single_roller_moi,
         )
 
+        self.intake = IntakeRollerSim(robot.intake_component.motor)
+        # toggle from the dashboard to jam a note in the intake
+        self.intake_jammed = (
+            ntcore.NetworkTableInstance.getDefault()
+            .getBooleanTopic("/physics/intake_jammed")
+            .getEntry(False)
+        )
+        self.intake_jammed.set(False)
+
         self.imu = SimDeviceSim("navX-Sensor", 4)
         self.imu_yaw = self.imu.getDouble("Yaw")
 
+        self.cameras = [
+            SimulatedCamera(robot.vision_port, seed=1),
+            SimulatedCamera(robot.vision_starboard, seed=2),
+        ]
+        self.ground_truth_entry = wpiutil.log.DoubleArrayLogEntry(
+            robot.data_log, GROUND_TRUTH_ENTRY
+        )
+
     def update_sim(self, now: float, tm_diff: float) -> None:
         # Enable the Phoenix6 simulated devices
         # TODO: delete when phoenix6 integrates with wpilib
@@ -116,7 +164,10 @@ class PhysicsEngine:
             steer.update(tm_diff)
 
         self.flywheel.update(tm_diff)
+        self.intake.jammed = self.intake_jammed.get()
+        self.intake.update(tm_diff)
 
+        phoenix6.BaseStatusSignal.refresh_all(self.module_signals)
         speeds = self.kinematics.toChassisSpeeds(
             (
                 self.swerve_modules[0].get(),
@@ -128,4 +179,9 @@ class PhysicsEngine:
 
         self.imu_yaw.set(self.imu_yaw.get() - math.degrees(speeds.omega * tm_diff))
 
-        self.physics_controller.drive(speeds, tm_diff)
+        pose = self.physics_controller.drive(speeds, tm_diff)
+
+        now = wpilib.Timer.getFPGATimestamp()
+        for camera in self.cameras:
+            camera.update(now, pose)
+        self.ground_truth_entry.append([now, *encode_pose(pose)])
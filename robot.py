@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
 import math
+import typing
+
+import ntcore
 import wpilib
 import wpilib.event
 from wpimath.geometry import Rotation3d, Translation3d
@@ -8,6 +11,7 @@ from magicbot import tunable
 
 from components.chassis import ChassisComponent
 from components.vision import VisualLocalizer
+from components.vision_fusion import VisionFusion
 from components.shooter import ShooterComponent
 from components.intake import IntakeComponent
 from components.climber import Climber
@@ -23,6 +27,8 @@ from utilities.game import is_red
 from utilities.scalers import rescale_js
 from utilities.functions import clamp
 from utilities.position import distance_between
+from utilities.profiler import LoopProfiler, log_startup
+from utilities.telemetry import TelemetryScheduler, collect_feedbacks
 
 
 class MyRobot(magicbot.MagicRobot):
@@ -44,13 +50,20 @@ class MyRobot(magicbot.MagicRobot):
     max_spin_rate = magicbot.tunable(4)  # m/s
     lower_max_spin_rate = magicbot.tunable(2)  # m/s
     inclination_angle = tunable(0.0)
+    # turn towards the speaker while holding a note and not turning
+    pre_align = tunable(False)
     vision_port: VisualLocalizer
     vision_starboard: VisualLocalizer
+    # after the cameras, so it fuses this loop's measurements
+    vision_fusion: VisionFusion
 
     START_POS_TOLERANCE = 1
 
     def createObjects(self) -> None:
         self.data_log = wpilib.DataLogManager.getLog()
+        self.loop_profiler = LoopProfiler(self.data_log, self.control_loop_wait_time)
+        self.telemetry = TelemetryScheduler(self.control_loop_wait_time)
+        self.loop_instrumented = False
 
         self.gamepad = wpilib.XboxController(0)
 
@@ -72,6 +85,42 @@ class MyRobot(magicbot.MagicRobot):
             0, -math.radians(20), math.radians(180) + math.radians(90 - 71.252763)
         )
 
+    def instrument_loop(self) -> None:
+        """Publish feedbacks at their own rates, and time everything in the loop."""
+        profiler = self.loop_profiler
+        components = [
+            (name, getattr(self, name))
+            for name in typing.get_type_hints(type(self))
+            if hasattr(getattr(self, name, None), "execute")
+        ]
+        # the autonomous modes time themselves, as they are only reachable
+        # through magicbot's internals
+        for name, component in components:
+            profiler.wrap_component(name, component)
+
+        nt = ntcore.NetworkTableInstance.getDefault()
+        for name, component in components:
+            start = len(self.telemetry.items)
+            table = nt.getTable(f"/components/{name}")
+            self.telemetry.add_feedbacks(collect_feedbacks(component, table))
+            for item in self.telemetry.items[start:]:
+                method = item.getter
+                item.getter = profiler.wrap(f"{name}.{method.__name__}", method)
+
+        for periodic in ("teleopPeriodic", "testPeriodic", "disabledPeriodic"):
+            setattr(self, periodic, profiler.wrap(periodic, getattr(self, periodic)))
+        self.loop_instrumented = True
+
+    def robotPeriodic(self) -> None:
+        # the components are only created once the robot has started, after
+        # createObjects, and this is the first hook that runs after that
+        if not self.loop_instrumented:
+            self.instrument_loop()
+            log_startup(self.data_log, self.logger)
+        super().robotPeriodic()
+        self.telemetry.update(self.onException)
+        self.loop_profiler.end_cycle()
+
     def teleopInit(self) -> None:
         self.field.getObject("Intended start pos").setPoses([])
 
@@ -109,6 +158,8 @@ class MyRobot(magicbot.MagicRobot):
         # Give rotational access to the driver
         if drive_z != 0:
             self.chassis.stop_snapping()
+        elif self.pre_align:
+            self.note_manager.try_pre_align()
         # Climber Controls
         if self.gamepad.getYButton():
             self.climber.deploy()
@@ -197,14 +248,17 @@ class MyRobot(magicbot.MagicRobot):
         self.status_lights.execute()
         self.vision_port.execute()
         self.vision_starboard.execute()
+        self.vision_fusion.execute()
 
     def disabledPeriodic(self) -> None:
+        self.chassis.refresh_signals()
         self.chassis.update_alliance()
         self.chassis.update_odometry()
 
         self.intake_component.maybe_reindex_deployment_encoder()
         self.vision_port.execute()
         self.vision_starboard.execute()
+        self.vision_fusion.execute()
 
         # check if we can see targets
         if (
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import gc
+import tracemalloc
+import typing
+
+import pytest
+import wpilib.simulation
+from phoenix6 import controls
+
+if typing.TYPE_CHECKING:
+    from pyfrc.test_support.controller import TestController
+
+    from robot import MyRobot
+
+pytestmark = pytest.mark.integration_test
+
+# Control requests used by the components, which should be created up front
+REQUEST_TYPES = (
+    controls.NeutralOut,
+    controls.PositionDutyCycle,
+    controls.VelocityVoltage,
+    controls.VoltageOut,
+)
+
+LOOP_PERIOD = 0.02  # s
+LOOPS = 100
+# control requests that may be created per loop once the robot is running
+REQUESTS_PER_LOOP_BUDGET = 0
+# Loops to check for memory held onto, enough that leaking a block a loop
+# would blow the budget for what is in flight when the snapshots are taken,
+# like vision measurements waiting to be fused.
+RETENTION_LOOPS = 1000
+RETAINED_BYTES_BUDGET = 16_000
+RETAINED_BLOCKS_BUDGET = 500
+
+
+def start_driving(control: TestController) -> None:
+    """Drive, turn and intake so the hot paths are all running."""
+    gamepad = wpilib.simulation.XboxControllerSim(0)
+    control.step_timing(seconds=0.5, autonomous=False, enabled=False)
+    gamepad.setLeftY(-0.5)
+    gamepad.setRightX(0.3)
+    gamepad.setLeftTriggerAxis(1.0)
+    control.step_timing(seconds=0.5, autonomous=False, enabled=True)
+
+
+def test_control_request_allocations(
+    control: TestController, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    created = 0
+
+    def count_init(original: typing.Callable[..., None]) -> typing.Callable[..., None]:
+        def __init__(self, *args, **kwargs) -> None:
+            nonlocal created
+            created += 1
+            original(self, *args, **kwargs)
+
+        return __init__
+
+    for request_type in REQUEST_TYPES:
+        original_init = request_type.__init__  # type: ignore[misc]
+        monkeypatch.setattr(request_type, "__init__", count_init(original_init))
+
+    with control.run_robot():
+        start_driving(control)
+
+        created = 0
+        control.step_timing(seconds=LOOPS * LOOP_PERIOD, autonomous=False, enabled=True)
+
+    assert created <= REQUESTS_PER_LOOP_BUDGET * LOOPS
+
+
+def test_loop_retained_memory(control: TestController, robot: MyRobot) -> None:
+    ignore_tracemalloc = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+    def snapshot() -> tracemalloc.Snapshot:
+        # only count what is still reachable
+        gc.collect()
+        return tracemalloc.take_snapshot().filter_traces(ignore_tracemalloc)
+
+    with control.run_robot():
+        start_driving(control)
+        tracemalloc.start()
+        try:
+            # publishers and caches are created over the first loops
+            control.step_timing(seconds=2.0, autonomous=False, enabled=True)
+            robot.loop_profiler.publish()
+            # the first snapshot compiles the filter
+            snapshot()
+            before = snapshot()
+            control.step_timing(
+                seconds=RETENTION_LOOPS * LOOP_PERIOD, autonomous=False, enabled=True
+            )
+            after = snapshot()
+        finally:
+            tracemalloc.stop()
+
+    stats = after.compare_to(before, "lineno")
+    retained_bytes = sum(stat.size_diff for stat in stats)
+    retained_blocks = sum(stat.count_diff for stat in stats)
+    top = "\n".join(str(stat) for stat in stats[:5])
+    assert retained_bytes <= RETAINED_BYTES_BUDGET, top
+    assert retained_blocks <= RETAINED_BLOCKS_BUDGET, top
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import threading
+import typing
+
+import ntcore
+import pytest
+import wpilib.simulation
+
+if typing.TYPE_CHECKING:
+    from pyfrc.test_support.controller import TestController
+
+    from robot import MyRobot
+
+pytestmark = pytest.mark.integration_test
+
+LOOP_PERIOD = 0.02  # s
+
+
+def run_until(
+    control: TestController, condition: typing.Callable[[], bool], timeout: float
+) -> bool:
+    """Step the robot a loop at a time until the condition holds, or time runs out."""
+    for _ in range(round(timeout / LOOP_PERIOD)):
+        control.step_timing(seconds=LOOP_PERIOD, autonomous=False, enabled=True)
+        if condition():
+            return True
+    return False
+
+
+def test_jammed_intake_unstalls(control: TestController, robot: MyRobot) -> None:
+    with control.run_robot():
+        # created by the physics engine, which has started with the robot
+        jammed = (
+            ntcore.NetworkTableInstance.getDefault()
+            .getBooleanTopic("/physics/intake_jammed")
+            .getEntry(False)
+        )
+        intake = robot.intake
+        component = robot.intake_component
+
+        def rollers_running() -> bool:
+            return (
+                intake.current_state == "intaking"
+                and component.intake_speed > component.INTAKE_RUNNING_VELOCITY
+            )
+
+        control.step_timing(seconds=0.5, autonomous=False, enabled=False)
+        # the deploy arm isn't simulated, so start it deployed
+        component.deploy_encoder.setPosition(component.SHAFT_REV_DEPLOY_HARD_LIMIT)
+        wpilib.simulation.XboxControllerSim(0).setLeftTriggerAxis(1.0)
+        started = run_until(control, rollers_running, 1.0)
+
+        jammed.set(True)
+        unstalled = run_until(
+            control,
+            lambda: intake.current_state == "unstall_intake",
+            component.INTAKE_STALL_DEBOUNCE + 5 * LOOP_PERIOD,
+        )
+
+        # once the note is cleared, it goes back to intaking
+        jammed.set(False)
+        recovered = run_until(control, rollers_running, 1.0)
+
+    assert started
+    assert unstalled
+    assert recovered
+
+
+def test_injector_stops_on_arrival(control: TestController, robot: MyRobot) -> None:
+    with control.run_robot():
+        intake = robot.intake
+        component = robot.intake_component
+
+        control.step_timing(seconds=0.5, autonomous=False, enabled=False)
+        component.deploy_encoder.setPosition(component.SHAFT_REV_DEPLOY_HARD_LIMIT)
+        wpilib.simulation.XboxControllerSim(0).setLeftTriggerAxis(1.0)
+        injecting = run_until(
+            control,
+            lambda: intake.current_state == "intaking" and component.injector.get() > 0,
+            1.0,
+        )
+
+        # as the break beam thread would, between loops
+        edge = threading.Thread(
+            target=component.note_arrived, args=(wpilib.Timer.getFPGATimestamp(),)
+        )
+        edge.start()
+        edge.join()
+        speed_before_next_loop = component.injector.get()
+
+    assert injecting
+    assert speed_before_next_loop == 0
+
+
+def test_stall_sampling_stops_after_intaking(
+    control: TestController, robot: MyRobot
+) -> None:
+    with control.run_robot():
+        component = robot.intake_component
+        # as on the robot, which samples on a notifier while intaking
+        component.stall_notifier = wpilib.Notifier(
+            component.sample_stall_signals_periodic
+        )
+
+        control.step_timing(seconds=0.5, autonomous=False, enabled=False)
+        component.deploy_encoder.setPosition(component.SHAFT_REV_DEPLOY_HARD_LIMIT)
+        gamepad = wpilib.simulation.XboxControllerSim(0)
+        gamepad.setLeftTriggerAxis(1.0)
+        sampling = run_until(control, lambda: component.sampling_stall, 1.0)
+        control.step_timing(seconds=0.2, autonomous=False, enabled=True)
+        sampled_at = component.last_stall_sample_time
+
+        # cancelling the intake stops the notifier
+        gamepad.setLeftTriggerAxis(0.0)
+        gamepad.setLeftBumper(True)
+        stopped = run_until(control, lambda: not component.sampling_stall, 1.0)
+        # don't leave the notifier running, or keep it alive, past the test
+        component.stall_notifier.stop()
+        component.stall_notifier = None
+
+    assert sampling
+    assert sampled_at is not None
+    assert stopped
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import typing
+
+import ntcore
+import pytest
+
+if typing.TYPE_CHECKING:
+    from pyfrc.test_support.controller import TestController
+
+    from robot import MyRobot
+
+pytestmark = pytest.mark.integration_test
+
+
+def test_feedbacks_published(control: TestController, robot: MyRobot) -> None:
+    entry = (
+        ntcore.NetworkTableInstance.getDefault()
+        .getTable("/components/vision_port")
+        .getEntry("results_received")
+    )
+    with control.run_robot():
+        # long enough to start up and publish the slowest feedbacks, at 1 Hz
+        for _ in range(25):
+            control.step_timing(seconds=0.2, autonomous=False, enabled=False)
+            if entry.getInteger(-1) > 0:
+                break
+        published = entry.getInteger(-1)
+        # published up to a second ago
+        latest = robot.vision_port.results_received()
+        profiled = "vision_port.results_received" in robot.loop_profiler.stats
+
+    assert 0 < published <= latest
+    assert profiled
@@ -0,0 +1,117 @@
+import math
+
+from pytest import approx
+
+from components.shooter import ShooterComponent
+from utilities.ballistics import (
+    GRAVITY,
+    HIGHEST_CROSSING,
+    LOWEST_CROSSING,
+    NoteModel,
+    Shot,
+    TableRow,
+    fit_model,
+    fly,
+    plan_shot,
+    read_table,
+    solve_inclination,
+    speaker_crossing,
+    write_table,
+)
+from utilities.lookup import LookupTable
+
+MODEL = NoteModel(exit_efficiency=0.4, drag=0.03, launch_angle_offset=0.2)
+MIN_INCLINATION = ShooterComponent.MIN_INCLINE_ANGLE
+MAX_INCLINATION = ShooterComponent.MAX_INCLINE_ANGLE
+
+
+def test_drag_free_flight_is_a_parabola():
+    model = NoteModel(drag=0.0)
+    inclination = 0.6
+    speed = model.exit_speed(60)
+    crossings = fly(model, inclination, 60, (1.0, 3.0))
+    assert crossings is not None
+    for distance, (height, time) in zip((1.0, 3.0), crossings):
+        x = distance - model.release_distance
+        vx = speed * math.cos(inclination)
+        assert time == approx(x / vx, abs=1e-3)
+        expected = (
+            model.release_height
+            + x * math.tan(inclination)
+            - GRAVITY * x**2 / (2 * vx**2)
+        )
+        assert height == approx(expected, abs=1e-3)
+
+
+def test_drag_slows_the_note():
+    still = fly(NoteModel(drag=0.0), 0.6, 60, (4.0,))
+    draggy = fly(NoteModel(drag=0.1), 0.6, 60, (4.0,))
+    assert still is not None and draggy is not None
+    assert draggy[0][0] < still[0][0]
+    assert draggy[0][1] > still[0][1]
+
+
+def test_note_that_lands_short():
+    assert fly(MODEL, MIN_INCLINATION, 5, (6.0,)) is None
+
+
+def test_solved_inclination_enters_opening():
+    inclination = solve_inclination(MODEL, 3.0, 60, MIN_INCLINATION, MAX_INCLINATION)
+    assert inclination is not None
+    crossing = speaker_crossing(MODEL, Shot(3.0, inclination, 60))
+    assert crossing is not None
+    assert LOWEST_CROSSING <= crossing[0] <= HIGHEST_CROSSING
+
+
+def test_planned_shot_respects_limits():
+    row = plan_shot(
+        MODEL, 4.0, (50, 60, 70), MIN_INCLINATION, MAX_INCLINATION, 0.02, 1.0
+    )
+    assert row is not None
+    assert MIN_INCLINATION <= row.inclination <= MAX_INCLINATION
+    assert row.flywheel_speed in (50, 60, 70)
+    crossing = speaker_crossing(MODEL, Shot(4.0, row.inclination, row.flywheel_speed))
+    assert crossing is not None
+    assert crossing[1] == approx(row.time_of_flight)
+
+
+def test_fit_matches_shots_from_a_known_model():
+    shots = []
+    for distance, flywheel_speed in ((1.5, 55), (2.5, 60), (3.5, 65), (4.5, 70)):
+        inclination = solve_inclination(
+            MODEL, distance, flywheel_speed, MIN_INCLINATION, MAX_INCLINATION
+        )
+        assert inclination is not None
+        shots.append(Shot(distance, inclination, flywheel_speed))
+    model, error = fit_model(shots)
+    assert error < 0.01
+    assert model.exit_efficiency == approx(MODEL.exit_efficiency, rel=0.1)
+
+
+def test_written_table_loads(tmp_path):
+    path = tmp_path / "table.csv"
+    rows = [TableRow(1.0, 0.9, 60, 0.2, 0.0), TableRow(2.0, 0.7, 62, 0.3, 0.0)]
+    write_table(str(path), rows, ("a comment",))
+    table = LookupTable.from_csv(path, "range", ("inclination", "flywheel_speed"))
+    assert table.evaluate(1.5) == approx((0.8, 61))
+    assert read_table(str(path)) == rows
+
+
+def test_shooter_table_is_usable():
+    table = ShooterComponent.SHOOTING_TABLE
+    times = ShooterComponent.TIME_OF_FLIGHT_TABLE
+    assert table.xs == times.xs
+    previous = 0.0
+    for distance in table.xs:
+        if not (
+            ShooterComponent.MIN_SHOT_RANGE
+            < distance
+            <= ShooterComponent.MAX_SHOT_RANGE
+        ):
+            continue
+        inclination, flywheel_speed = table.evaluate(distance)
+        assert MIN_INCLINATION <= inclination <= MAX_INCLINATION
+        assert 0 < flywheel_speed <= ShooterComponent.FLYWHEEL_SHOOTING_SPEED
+        (time_of_flight,) = times.evaluate(distance)
+        assert time_of_flight > previous
+        previous = time_of_flight
@@ -0,0 +1,20 @@
+import pytest
+
+from utilities.game import (
+    TAG_POSES,
+    apriltag_layout,
+    get_tag_pose,
+)
+
+
+def test_tag_table_matches_layout():
+    for tag in apriltag_layout.getTags():
+        pose = get_tag_pose(tag.ID)
+        assert pose is not None
+        assert pose == tag.pose
+    assert TAG_POSES[0] is None
+
+
+@pytest.mark.parametrize("tag_id", [-1, 0, len(TAG_POSES)])
+def test_missing_tags(tag_id: int):
+    assert get_tag_pose(tag_id) is None
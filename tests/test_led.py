@@ -1,6 +1,197 @@
+import pytest
+import wpilib
+from magicbot.magic_tunable import setup_tunables
+
 from components import led
 
 
+class FakeLEDs:
+    LEDData = wpilib.AddressableLED.LEDData
+
+    def __init__(self, port: int) -> None:
+        self.writes = 0
+
+    def setLength(self, length: int) -> None:
+        pass
+
+    def setData(self, data: list[wpilib.AddressableLED.LEDData]) -> None:
+        self.writes += 1
+
+    def start(self) -> None:
+        pass
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# as on the robot: two sides and the front
+STRIP_LENGTH = (28 * 3) * 2 + (30 * 3) - 2
+
+
+def make_strip(monkeypatch, clock: FakeClock) -> led.LightStrip:
+    monkeypatch.setattr(wpilib, "AddressableLED", FakeLEDs)
+    monkeypatch.setattr(led.time, "monotonic", clock)
+    strip = led.LightStrip(STRIP_LENGTH)
+    setup_tunables(strip, "status_lights")
+    return strip
+
+
+def run(strip: led.LightStrip, clock: FakeClock, seconds: float) -> None:
+    for _ in range(round(seconds / 0.02)):
+        strip.execute()
+        clock.now += 0.02
+
+
 def test_morse_messages_are_valid() -> None:
     for message in led.Morse.MESSAGES:
         led.Morse.translate_message(message)
+
+
+def test_static_pattern_written_once(monkeypatch) -> None:
+    clock = FakeClock()
+    strip = make_strip(monkeypatch, clock)
+    strip.in_range()
+    run(strip, clock, 1.0)
+    assert strip.writes == 1
+
+    strip.not_in_range()
+    run(strip, clock, 1.0)
+    assert strip.writes == 2
+    for segment in strip.segments:
+        assert segment.sent == led.hsv_row([led.HsvColour.RED.value] * segment.length)
+
+
+def test_animation_capped_at_refresh_rate(monkeypatch) -> None:
+    clock = FakeClock()
+    strip = make_strip(monkeypatch, clock)
+    strip.pattern = led.Rainbow(led.HsvColour.RED, clock=clock)
+    run(strip, clock, 1.0)
+    assert strip.writes == strip.max_refresh_rate
+
+
+def test_animation_uncapped_without_refresh_rate(monkeypatch) -> None:
+    clock = FakeClock()
+    strip = make_strip(monkeypatch, clock)
+    # fast enough to change every loop
+    strip.pattern = led.Rainbow(led.HsvColour.RED, speed=1, clock=clock)
+    strip.max_refresh_rate = 0.0
+    run(strip, clock, 1.0)
+    assert strip.writes == 50
+
+
+def colours(segment: led.Segment) -> list[led.Hsv]:
+    buffer = segment.buffer
+    return list(zip(buffer[0::3], buffer[1::3], buffer[2::3]))
+
+
+def test_chase_moves_along_segment() -> None:
+    clock = FakeClock()
+    segment = led.Segment(0, 20)
+    chase = led.Chase(led.HsvColour.BLUE, speed=10, width=2, spacing=5, clock=clock)
+    chase.render(segment)
+    lit = [i for i, colour in enumerate(colours(segment)) if colour[2]]
+    assert lit == [0, 1, 5, 6, 10, 11, 15, 16]
+
+    clock.now = 0.1
+    chase.render(segment)
+    lit = [i for i, colour in enumerate(colours(segment)) if colour[2]]
+    assert lit == [1, 2, 6, 7, 11, 12, 16, 17]
+
+
+def test_gradient_ends() -> None:
+    segment = led.Segment(0, 10)
+    led.Gradient(led.HsvColour.RED, led.HsvColour.BLUE).render(segment)
+    pixels = colours(segment)
+    assert pixels[0] == led.HsvColour.RED.value
+    hues = [h for h, _, _ in pixels]
+    assert hues == sorted(hues)
+    assert hues[-1] > led.HsvColour.BLUE.value[0] * 0.8
+
+
+def test_progress_bar() -> None:
+    segment = led.Segment(0, 8)
+    bar = led.ProgressBar(led.HsvColour.GREEN, 0.5)
+    bar.render(segment)
+    assert (
+        colours(segment)
+        == [led.HsvColour.GREEN.value] * 4 + [led.HsvColour.OFF.value] * 4
+    )
+
+    bar.progress = 1.5
+    bar.render(segment)
+    assert colours(segment) == [led.HsvColour.GREEN.value] * 8
+
+
+def test_segment_priorities(monkeypatch) -> None:
+    clock = FakeClock()
+    strip = make_strip(monkeypatch, clock)
+    strip.in_range()
+    strip.flywheel_spin_up(0.0)
+    strip.execute()
+    # the progress bar only covers the front
+    assert colours(strip.port) == [led.HsvColour.GREEN.value] * strip.port.length
+    assert colours(strip.front) == [led.HsvColour.OFF.value] * strip.front.length
+
+    strip.climbing_arm_fully_extended()
+    clock.now += 1
+    strip.execute()
+    assert colours(strip.front) == [led.HsvColour.YELLOW.value] * strip.front.length
+
+    strip.climbing_arm_retracted()
+    strip.not_in_range()
+    clock.now += 1
+    strip.execute()
+    assert colours(strip.front) == [led.HsvColour.RED.value] * strip.front.length
+
+
+def test_only_changed_segments_written(monkeypatch) -> None:
+    clock = FakeClock()
+    strip = make_strip(monkeypatch, clock)
+    strip.in_range()
+    strip.flywheel_spin_up(0.5)
+    strip.execute()
+    writes = strip.writes
+
+    strip.flywheel_spin_up(0.75)
+    clock.now += 1
+    assert strip.render()
+    assert strip.front.has_changed()
+    assert not strip.port.has_changed()
+    assert not strip.starboard.has_changed()
+    strip.execute()
+    assert strip.writes == writes + 1
+
+
+def test_fill_reuses_buffer() -> None:
+    segment = led.Segment(0, 10)
+    buffer = segment.buffer
+    for colour in (led.HsvColour.RED, led.HsvColour.BLUE, led.HsvColour.RED):
+        segment.fill(colour.value)
+        assert segment.buffer is buffer
+        assert colours(segment) == [colour.value] * segment.length
+
+
+def test_repeated_frames_reuse_data() -> None:
+    clock = FakeClock()
+    palette = led.Palette()
+    segment = led.Segment(2, 10)
+    strip_data = [palette.get(led.HsvColour.OFF.value)] * 14
+    chase = led.Chase(led.HsvColour.BLUE, speed=10, width=2, spacing=5, clock=clock)
+    # twice round the chase's five frames
+    for step in range(10):
+        clock.now = step * 0.1
+        chase.render(segment)
+        segment.write(strip_data, palette)
+        assert strip_data[2:12] == [palette.get(colour) for colour in colours(segment)]
+    assert len(segment.frames) == 5
+
+
+def test_strip_too_short_for_sides(monkeypatch) -> None:
+    monkeypatch.setattr(wpilib, "AddressableLED", FakeLEDs)
+    with pytest.raises(ValueError):
+        led.LightStrip(2 * led.SIDE_LENGTH)
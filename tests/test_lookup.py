@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from hypothesis import given
+from hypothesis.strategies import floats
+from pytest import approx
+
+from utilities.lookup import LookupTable
+
+# the shooter's hand-tuned table, with a point to ramp the speed down to zero
+DISTANCES = (0, 1.3, 2.0, 3.0, 4.0, 5.0, 7.0)
+ANGLES = (0.93, 0.93, 0.77, 0.57, 0.49, 0.46, 0.354)
+SPEEDS = (54, 54, 60, 64, 65, 65, 0)
+TABLE = LookupTable(DISTANCES, (ANGLES, SPEEDS))
+
+
+@given(range=floats(-1, 9))
+def test_linear_table_matches_numpy(range):
+    angle, speed = TABLE.evaluate(range)
+    assert angle == approx(np.interp(range, DISTANCES, ANGLES))
+    assert speed == approx(np.interp(range, DISTANCES, SPEEDS, right=0.0))
+
+
+def test_cubic_passes_through_breakpoints():
+    table = LookupTable(DISTANCES, (ANGLES, SPEEDS), cubic=True)
+    for distance, angle, speed in zip(DISTANCES, ANGLES, SPEEDS):
+        assert table.evaluate(distance) == approx((angle, speed))
+
+
+@given(x=floats(0, 7))
+def test_cubic_does_not_overshoot(x):
+    table = LookupTable(DISTANCES, (ANGLES, SPEEDS), cubic=True)
+    i = max(0, int(np.searchsorted(DISTANCES, x, side="right")) - 1)
+    j = min(i + 1, len(DISTANCES) - 1)
+    angle, speed = table.evaluate(x)
+    assert min(ANGLES[i], ANGLES[j]) - 1e-9 <= angle <= max(ANGLES[i], ANGLES[j]) + 1e-9
+    assert min(SPEEDS[i], SPEEDS[j]) - 1e-9 <= speed <= max(SPEEDS[i], SPEEDS[j]) + 1e-9
+
+
+def test_invalid_tables():
+    with pytest.raises(ValueError):
+        LookupTable((1.0,), ((1.0,),))
+    with pytest.raises(ValueError):
+        LookupTable((1.0, 1.0), ((1.0, 2.0),))
+    with pytest.raises(ValueError):
+        LookupTable((1.0, 2.0), ((1.0,),))
+
+
+def test_from_csv(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("distance,speed,angle\n3,64,0.57\n1.3,54,0.93\n2,60,0.77\n")
+    table = LookupTable.from_csv(str(path), "distance", ("angle", "speed"))
+    assert table.evaluate(1.3) == approx((0.93, 54))
+    assert table.evaluate(2.5) == approx((0.67, 62))
+    assert table.evaluate(5) == approx((0.57, 64))
+
+
+def test_from_csv_skips_comments(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("# generated\ndistance,speed\n# 1.5,0\n1,2\n2,4\n")
+    table = LookupTable.from_csv(path, "distance", ("speed",))
+    assert table.evaluate(1.5) == approx((3,))
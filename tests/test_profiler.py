@@ -0,0 +1,78 @@
+import pathlib
+import subprocess
+import sys
+import time
+
+import wpiutil.log
+from pytest import approx
+
+from utilities.profiler import (
+    LoopProfiler,
+    TimingStats,
+    percentile,
+    process_uptime,
+    resident_memory,
+)
+
+
+def test_percentile():
+    samples = [float(i) for i in range(101)]
+    assert percentile(samples, 0.5) == 50
+    assert percentile(samples, 0.95) == 95
+    assert percentile([], 0.5) == 0
+
+
+def test_timing_stats_ring_buffer():
+    stats = TimingStats(4)
+    for duration in (1.0, 2.0, 3.0, 4.0, 5.0, 6.0):
+        stats.add(duration)
+    # only the most recent 4 durations are kept
+    assert sorted(stats.samples) == [3.0, 4.0, 5.0, 6.0]
+    assert stats.summary() == (5.0, 6.0, 6.0)
+
+
+def test_empty_timing_stats():
+    assert TimingStats(4).summary() == (0.0, 0.0, 0.0)
+
+
+def test_nested_calls_counted_once(tmp_path):
+    profiler = LoopProfiler(wpiutil.log.DataLog(str(tmp_path)), loop_period=0.02)
+
+    inner = profiler.wrap("inner", lambda: time.sleep(0.01))
+
+    def outer_func() -> None:
+        time.sleep(0.01)
+        inner()
+
+    outer = profiler.wrap("outer", outer_func)
+    outer()
+    durations = profiler.cycle_durations
+    assert durations["outer"] == approx(0.01, abs=0.005)
+    assert durations["inner"] == approx(0.01, abs=0.005)
+
+    profiler.end_cycle()
+    assert profiler.cycle_durations == {}
+    assert profiler.stats["outer"].count == 1
+
+
+def test_overrun_blames_slowest(tmp_path):
+    profiler = LoopProfiler(wpiutil.log.DataLog(str(tmp_path)), loop_period=0.02)
+    profiler.record("fast", 0.001)
+    profiler.record("slow", 0.03)
+    profiler.end_cycle()
+    assert profiler.stats["slow"].overruns == 1
+    assert profiler.stats["fast"].overruns == 0
+
+
+def test_startup_measurements():
+    rss = resident_memory()
+    uptime = process_uptime()
+    assert rss is None or rss > 0
+    assert uptime is None or uptime > 0
+
+
+def test_robot_import_does_not_load_numpy():
+    # numpy costs a noticeable chunk of boot time and memory on the roboRIO
+    check = "import sys, robot; sys.exit('numpy' in sys.modules)"
+    root = pathlib.Path(__file__).parent.parent
+    assert subprocess.run([sys.executable, "-c", check], cwd=root).returncode == 0
@@ -0,0 +1,82 @@
+import math
+
+from photonlibpy.multiTargetPNPResult import MultiTargetPNPResult, PNPResult
+from photonlibpy.photonPipelineResult import PhotonPipelineResult
+from photonlibpy.photonTrackedTarget import PhotonTrackedTarget
+from pytest import approx
+from wpimath.geometry import Rotation2d, Rotation3d, Transform3d, Translation3d
+from wpimath.kinematics import SwerveModulePosition
+
+from utilities.replay import (
+    decode_odometry,
+    decode_result,
+    encode_odometry,
+    encode_result,
+)
+
+
+def assert_transforms_equal(a: Transform3d, b: Transform3d) -> None:
+    assert a.translation().distance(b.translation()) == approx(0)
+    assert (a.rotation() - b.rotation()).angle == approx(0, abs=1e-9)
+
+
+def test_odometry_round_trip():
+    positions = [
+        SwerveModulePosition(i + 0.5, Rotation2d(i * 0.3 - 1)) for i in range(4)
+    ]
+    timestamp, gyro, decoded = decode_odometry(
+        encode_odometry(12.5, Rotation2d(2.0), positions)
+    )
+    assert timestamp == 12.5
+    assert gyro.radians() == approx(2.0)
+    assert list(decoded) == positions
+
+
+def test_result_round_trip():
+    best = Transform3d(Translation3d(3, 1, 0.5), Rotation3d(0.1, -0.2, math.pi))
+    alt = Transform3d(Translation3d(3, 1.2, 0.5), Rotation3d(0, 0.2, 3.0))
+    result = PhotonPipelineResult(
+        latencyMillis=25.0,
+        timestampSec=101.25,
+        targets=[
+            PhotonTrackedTarget(
+                yaw=-5.0,
+                pitch=12.0,
+                fiducialId=7,
+                bestCameraToTarget=best,
+                altCameraToTarget=alt,
+                poseAmbiguity=0.15,
+            ),
+            PhotonTrackedTarget(fiducialId=8, bestCameraToTarget=alt),
+        ],
+        multiTagResult=MultiTargetPNPResult(
+            estimatedPose=PNPResult(
+                isPresent=True, best=best, alt=alt, bestReprojError=0.4
+            ),
+            fiducialIDsUsed=[7, 8],
+        ),
+    )
+
+    decoded = decode_result(encode_result(result))
+    assert decoded.getTimestamp() == 101.25
+    assert decoded.getLatencyMillis() == 25.0
+    assert decoded.multiTagResult.fiducialIDsUsed == [7, 8]
+    solve = decoded.multiTagResult.estimatedPose
+    assert solve.isPresent
+    assert solve.bestReprojError == 0.4
+    assert_transforms_equal(solve.best, best)
+    assert_transforms_equal(solve.alt, alt)
+
+    assert [target.fiducialId for target in decoded.targets] == [7, 8]
+    target = decoded.targets[0]
+    assert target.poseAmbiguity == 0.15
+    assert (target.yaw, target.pitch) == (-5.0, 12.0)
+    assert_transforms_equal(target.bestCameraToTarget, best)
+    assert_transforms_equal(target.altCameraToTarget, alt)
+
+
+def test_empty_result_round_trip():
+    decoded = decode_result(encode_result(PhotonPipelineResult(timestampSec=3.0)))
+    assert decoded.getTimestamp() == 3.0
+    assert decoded.targets == []
+    assert not decoded.multiTagResult.estimatedPose.isPresent
@@ -0,0 +1,114 @@
+from magicbot.magic_tunable import setup_tunables
+from wpimath.geometry import Pose2d, Rotation2d, Translation2d
+from wpimath.kinematics import ChassisSpeeds
+
+from components.shooter import ShooterComponent
+from controllers.shooter import Shooter
+from utilities.game import BLUE_SPEAKER_POSITION_2D
+
+
+class FakeChassis:
+    def __init__(self, position: Translation2d, velocity: Translation2d) -> None:
+        self.pose = Pose2d(position, Rotation2d())
+        # the driver has just asked for this, facing along the field x axis
+        self.chassis_speeds = ChassisSpeeds(velocity.x, velocity.y, 0)
+        self.heading_goal: float | None = None
+        # what the robot is doing right now
+        self.velocity = ChassisSpeeds()
+
+    def get_pose(self) -> Pose2d:
+        return self.pose
+
+    def get_rotation(self) -> Rotation2d:
+        return self.pose.rotation()
+
+    def get_velocity(self) -> ChassisSpeeds:
+        return self.velocity
+
+    def to_field_oriented(self, speeds: ChassisSpeeds) -> ChassisSpeeds:
+        return speeds
+
+    def snap_to_heading(self, heading: float) -> None:
+        self.heading_goal = heading
+
+
+class FakeShooterComponent:
+    def __init__(self) -> None:
+        self.range: float | None = None
+
+    def is_range_in_bounds(self, range: float) -> bool:
+        return (
+            ShooterComponent.MIN_SHOT_RANGE < range <= ShooterComponent.MAX_SHOT_RANGE
+        )
+
+    def set_range(self, range: float) -> None:
+        self.range = range
+
+
+def make_shooter(
+    position: Translation2d, velocity: Translation2d
+) -> tuple[Shooter, FakeChassis, FakeShooterComponent]:
+    shooter = Shooter()
+    setup_tunables(shooter, "shooter")
+    chassis = FakeChassis(position, velocity)
+    component = FakeShooterComponent()
+    shooter.chassis = chassis  # type: ignore[assignment]
+    shooter.shooter_component = component  # type: ignore[assignment]
+    return shooter, chassis, component
+
+
+def test_ready_ahead_prepares_for_where_we_are_going():
+    # too far to shoot, but driving straight at the speaker
+    start = BLUE_SPEAKER_POSITION_2D + Translation2d(7.5, 0)
+    shooter, chassis, component = make_shooter(start, Translation2d(-3, 0))
+    shooter.ready_ahead(align=True)
+    assert not shooter.in_range()
+    shot_range = component.range
+    assert shot_range is not None
+    assert component.is_range_in_bounds(shot_range)
+    assert chassis.heading_goal is not None
+
+
+def test_ready_ahead_coasts_when_not_approaching():
+    start = BLUE_SPEAKER_POSITION_2D + Translation2d(7.5, 0)
+    shooter, chassis, component = make_shooter(start, Translation2d(0, 2))
+    shooter.ready_ahead(align=True)
+    shot_range = component.range
+    assert shot_range is not None
+    assert not component.is_range_in_bounds(shot_range)
+    assert chassis.heading_goal is None
+
+
+def test_ready_ahead_in_range_aims_from_here():
+    start = BLUE_SPEAKER_POSITION_2D + Translation2d(3, 0)
+    shooter, chassis, component = make_shooter(start, Translation2d())
+    shooter.ready_ahead(align=False)
+    assert shooter.in_range()
+    assert component.range == shooter.range
+    assert chassis.heading_goal is None
+
+
+def test_shot_feasible_when_still_in_range():
+    start = BLUE_SPEAKER_POSITION_2D + Translation2d(3, 0)
+    shooter, chassis, component = make_shooter(start, Translation2d())
+    shooter.update_range()
+    assert shooter.is_shot_feasible()
+
+
+def test_shot_not_feasible_when_spinning():
+    start = BLUE_SPEAKER_POSITION_2D + Translation2d(3, 0)
+    shooter, chassis, component = make_shooter(start, Translation2d())
+    chassis.velocity = ChassisSpeeds(0, 0, 1.0)
+    shooter.update_range()
+    assert not shooter.is_shot_feasible()
+
+
+def test_shot_not_feasible_when_virtual_target_out_of_range():
+    # in range, but driving away fast enough that the note falls short
+    start = BLUE_SPEAKER_POSITION_2D + Translation2d(4.9, 0)
+    shooter, chassis, component = make_shooter(start, Translation2d())
+    chassis.velocity = ChassisSpeeds(1.5, 0, 0)
+    solution = shooter.update_range()
+    assert solution.converged
+    assert not component.is_range_in_bounds(solution.range)
+    assert not shooter.is_shot_feasible()
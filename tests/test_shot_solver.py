@@ -0,0 +1,47 @@
+import math
+
+from pytest import approx
+from wpimath.geometry import Translation2d
+
+from components.shooter import ShooterComponent
+from controllers.shooter import SOLVER_TOLERANCE, solve_moving_shot
+
+GOAL = Translation2d(0.2, 5.5)
+POSITION = Translation2d(3.0, 4.5)
+STOPPED = Translation2d()
+
+
+def test_stationary_shot_aims_at_goal():
+    solution = solve_moving_shot(POSITION, STOPPED, GOAL)
+    assert solution.converged
+    assert solution.virtual_target == GOAL
+    assert solution.range == approx(POSITION.distance(GOAL))
+    to_goal = GOAL - POSITION
+    heading = math.atan2(to_goal.y, to_goal.x) + math.pi
+    assert math.cos(solution.heading - heading) == approx(1)
+    angle, speed = ShooterComponent.SHOOTING_TABLE.evaluate(solution.range)
+    assert (solution.inclination, solution.flywheel_speed) == (angle, speed)
+
+
+def test_moving_shot_lands_in_goal():
+    velocity = Translation2d(0.5, -1.5)
+    solution = solve_moving_shot(POSITION, velocity, GOAL)
+    assert solution.converged
+    # the note carries the robot's velocity for its whole flight
+    (time_of_flight,) = ShooterComponent.TIME_OF_FLIGHT_TABLE.evaluate(solution.range)
+    landing = solution.virtual_target + velocity * time_of_flight
+    assert landing.distance(GOAL) < 2 * SOLVER_TOLERANCE
+    # aim against the direction of travel
+    assert (solution.virtual_target - GOAL).y > 0
+
+
+def test_moving_towards_goal_shortens_range():
+    towards = (GOAL - POSITION) / (GOAL - POSITION).norm()
+    solution = solve_moving_shot(POSITION, towards * 2, GOAL)
+    assert solution.range < POSITION.distance(GOAL)
+
+
+def test_fast_shot_exceeds_compute_budget():
+    away = (POSITION - GOAL) / (POSITION - GOAL).norm()
+    solution = solve_moving_shot(POSITION, away * 4, GOAL)
+    assert not solution.converged
@@ -0,0 +1,66 @@
+import math
+
+from wpimath.system.plant import DCMotor
+
+from components.intake import IntakeComponent
+from utilities.stall import StallDetector
+
+SAMPLE_PERIOD = 1 / IntakeComponent.STALL_SIGNAL_FREQUENCY
+VOLTAGE = 0.7 * 12
+MOTOR = DCMotor.falcon500()
+
+
+def roller_sample(speed_fraction: float) -> tuple[float, float]:
+    """Stator current and velocity of the intake running at a fraction of free speed."""
+    motor_speed = MOTOR.freeSpeed * speed_fraction * VOLTAGE / MOTOR.nominalVoltage
+    current = MOTOR.current(motor_speed, VOLTAGE)
+    rps = motor_speed / math.tau / IntakeComponent.INTAKE_GEAR_RATIO
+    return current, rps
+
+
+def make_detector() -> StallDetector:
+    return StallDetector(
+        IntakeComponent.INTAKE_STALL_CURRENT,
+        IntakeComponent.INTAKE_STALL_VELOCITY,
+        IntakeComponent.INTAKE_STALL_DEBOUNCE,
+    )
+
+
+def run(detector: StallDetector, speeds: list[float]) -> float | None:
+    """Feed the detector samples at these speeds, returning when it first stalls."""
+    for i, speed in enumerate(speeds):
+        current, velocity = roller_sample(speed)
+        if detector.update(current, velocity, i * SAMPLE_PERIOD):
+            return i * SAMPLE_PERIOD
+    return None
+
+
+def test_free_running_intake_does_not_stall():
+    assert run(make_detector(), [0.95] * 100) is None
+
+
+def test_jammed_note_detected_within_debounce():
+    running = [0.95] * 50
+    # a jammed note stops the rollers dead
+    jammed = [0.0] * 50
+    jam_time = len(running) * SAMPLE_PERIOD
+    stall_time = run(make_detector(), running + jammed)
+    assert stall_time is not None
+    assert (
+        IntakeComponent.INTAKE_STALL_DEBOUNCE
+        <= stall_time - jam_time
+        <= IntakeComponent.INTAKE_STALL_DEBOUNCE + SAMPLE_PERIOD
+    )
+
+
+def test_note_pulled_in_is_not_a_stall():
+    # the rollers bog down for a sample or two as a note is pulled in
+    dip = [0.0] * 2
+    speeds = ([0.95] * 20 + dip) * 5
+    assert run(make_detector(), speeds) is None
+
+
+def test_slow_without_current_is_not_a_stall():
+    detector = make_detector()
+    for i in range(20):
+        assert not detector.update(0.0, 0.0, i * SAMPLE_PERIOD)
@@ -0,0 +1,102 @@
+import math
+
+from hypothesis import given
+from hypothesis.strategies import floats, lists, tuples
+from pytest import approx
+from wpimath.geometry import Rotation2d, Translation2d
+from wpimath.kinematics import ChassisSpeeds, SwerveDrive4Kinematics, SwerveModuleState
+
+from utilities.functions import constrain_angle, rate_limit_module
+from utilities.swerve import SwerveSetpoints
+
+MODULE_POSITIONS = ((0.2, 0.2), (-0.2, 0.2), (-0.2, -0.2), (0.2, -0.2))
+MAX_WHEEL_SPEED = 4.0
+ACCEL_LIMIT = 15.0
+DT = 0.02
+# wpimath snaps the direction of tiny vectors to zero, so allow for small differences
+TOLERANCE = 1e-4
+
+velocities = floats(-6, 6, allow_nan=False)
+angles = floats(-10, 10, allow_nan=False)
+commands = tuples(
+    velocities, velocities, velocities, tuples(angles, angles, angles, angles)
+)
+
+
+def assert_same_angle(a: float, b: float) -> None:
+    assert math.cos(a) == approx(math.cos(b), abs=TOLERANCE)
+    assert math.sin(a) == approx(math.sin(b), abs=TOLERANCE)
+
+
+@given(steps=lists(commands, min_size=1, max_size=5))
+def test_matches_wpimath(steps):
+    """The batched setpoints should match the per module wpimath calculations."""
+    kinematics = SwerveDrive4Kinematics(
+        *(Translation2d(x, y) for x, y in MODULE_POSITIONS)
+    )
+    states = [SwerveModuleState(0, Rotation2d(0)) for _ in MODULE_POSITIONS]
+    setpoints = SwerveSetpoints(MODULE_POSITIONS)
+
+    for vx, vy, omega, current_angles in steps:
+        setpoints.calculate(
+            vx, vy, omega, current_angles, MAX_WHEEL_SPEED, ACCEL_LIMIT, DT
+        )
+
+        desired_states = kinematics.desaturateWheelSpeeds(
+            kinematics.toSwerveModuleStates(ChassisSpeeds(vx, vy, omega)),
+            MAX_WHEEL_SPEED,
+        )
+        for i, desired in enumerate(desired_states):
+            current = Rotation2d(current_angles[i])
+            state = rate_limit_module(states[i], desired, ACCEL_LIMIT, DT)
+            state = SwerveModuleState.optimize(state, current)
+            states[i] = state
+
+            # compare velocity vectors, as modules pointing exactly sideways can
+            # equally be optimized to drive forwards or backwards
+            speed = setpoints.speeds[i]
+            angle = setpoints.angles[i]
+            assert speed * math.cos(angle) == approx(
+                state.speed * state.angle.cos(), abs=TOLERANCE
+            )
+            assert speed * math.sin(angle) == approx(
+                state.speed * state.angle.sin(), abs=TOLERANCE
+            )
+            assert (
+                abs(constrain_angle(angle - current_angles[i]))
+                <= math.pi / 2 + TOLERANCE
+            )
+
+            drive_speed = state.speed * (state.angle - current).cos() ** 2
+            assert setpoints.drive_speeds[i] == approx(drive_speed, abs=TOLERANCE)
+
+            if abs(state.speed) < SwerveSetpoints.STOPPED_SPEED - TOLERANCE:
+                assert setpoints.stopped[i]
+            elif abs(state.speed) > SwerveSetpoints.STOPPED_SPEED + TOLERANCE:
+                assert not setpoints.stopped[i]
+
+
+@given(vx=velocities, vy=velocities, omega=velocities)
+def test_desaturates(vx, vy, omega):
+    setpoints = SwerveSetpoints(MODULE_POSITIONS)
+    setpoints.calculate(vx, vy, omega, (0, 0, 0, 0), MAX_WHEEL_SPEED, None, DT)
+    for speed in setpoints.speeds:
+        assert abs(speed) <= MAX_WHEEL_SPEED or abs(speed) == approx(MAX_WHEEL_SPEED)
+
+
+def test_stopped_holds_angle():
+    setpoints = SwerveSetpoints(MODULE_POSITIONS)
+    setpoints.calculate(0, 1, 0, (0, 0, 0, 0), MAX_WHEEL_SPEED, None, DT)
+    setpoints.calculate(0, 0, 0, (0, 0, 0, 0), MAX_WHEEL_SPEED, None, DT)
+    assert setpoints.stopped == [True] * 4
+    for angle in setpoints.angles:
+        assert_same_angle(angle, math.pi / 2)
+
+
+def test_lock():
+    setpoints = SwerveSetpoints(MODULE_POSITIONS)
+    lock_angles = [math.atan2(y, x) for x, y in MODULE_POSITIONS]
+    setpoints.lock(lock_angles, lock_angles)
+    assert setpoints.angles == approx(lock_angles)
+    assert setpoints.drive_speeds == [0.0] * 4
+    assert setpoints.stopped == [False] * 4
@@ -0,0 +1,106 @@
+import ntcore
+
+from utilities.telemetry import TelemetryScheduler, collect_feedbacks, feedback_rate
+
+LOOP_PERIOD = 0.02
+
+
+class Source:
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.reads = 0
+
+    def every_loop(self) -> float:
+        self.reads += 1
+        return self.value
+
+    @feedback_rate(10)
+    def slow(self) -> float:
+        self.reads += 1
+        return self.value
+
+    @feedback_rate(50, threshold=0.5)
+    def thresholded(self) -> float:
+        return self.value
+
+
+def ignore_errors() -> None:
+    pass
+
+
+def test_rates():
+    source = Source()
+    published: list[float] = []
+    scheduler = TelemetryScheduler(LOOP_PERIOD)
+    scheduler.add_feedbacks([(source.slow, published.append)])
+
+    for _ in range(50):
+        scheduler.update(ignore_errors)
+    # 10 Hz from a 50 Hz loop
+    assert source.reads == 10
+    assert len(published) == 10
+
+
+def test_undeclared_rate_reads_every_loop():
+    source = Source()
+    scheduler = TelemetryScheduler(LOOP_PERIOD)
+    scheduler.add_feedbacks([(source.every_loop, lambda value: None)])
+
+    for _ in range(5):
+        scheduler.update(ignore_errors)
+    assert source.reads == 5
+
+
+def test_staggered():
+    sources = [Source() for _ in range(5)]
+    scheduler = TelemetryScheduler(LOOP_PERIOD)
+    scheduler.add_feedbacks([(source.slow, lambda value: None) for source in sources])
+
+    # each slow item is read in a different loop
+    for i, source in enumerate(sources):
+        scheduler.update(ignore_errors)
+        assert source.reads == 1
+        assert sum(s.reads for s in sources) == i + 1
+
+
+def test_threshold():
+    source = Source()
+    published: list[float] = []
+    scheduler = TelemetryScheduler(LOOP_PERIOD)
+    scheduler.add_feedbacks([(source.thresholded, published.append)])
+
+    for value in (0.0, 0.2, 0.4, 0.6, 0.7, 1.2):
+        source.value = value
+        scheduler.update(ignore_errors)
+    assert published == [0.0, 0.6, 1.2]
+
+
+def test_errors_reported():
+    errors = []
+    published: list[float] = []
+
+    def broken() -> float:
+        raise RuntimeError
+
+    source = Source()
+    scheduler = TelemetryScheduler(LOOP_PERIOD)
+    scheduler.add_feedbacks(
+        [(broken, published.append), (source.every_loop, published.append)]
+    )
+    scheduler.update(lambda: errors.append(True))
+    assert errors == [True]
+    assert published == [0.0]
+
+
+def test_collect_feedbacks():
+    source = Source()
+    table = ntcore.NetworkTableInstance.getDefault().getTable("/telemetry_test")
+    feedbacks = collect_feedbacks(source, table)
+    assert sorted(getter.__name__ for getter, _ in feedbacks) == ["slow", "thresholded"]
+
+    source.value = 1.5
+    scheduler = TelemetryScheduler(LOOP_PERIOD)
+    scheduler.add_feedbacks(feedbacks)
+    scheduler.update(ignore_errors)
+    assert table.getTopic("slow").getTypeString() == "double"
+    assert table.getNumber("thresholded", 0.0) == 1.5
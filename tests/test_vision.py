@@ -0,0 +1,304 @@
+import wpilib
+import wpiutil.log
+from wpilib.simulation import pauseTiming, resumeTiming, stepTiming
+from magicbot.magic_tunable import setup_tunables
+from photonlibpy.photonTrackedTarget import PhotonTrackedTarget
+from pytest import approx
+from wpimath.geometry import (
+    Pose2d,
+    Pose3d,
+    Rotation2d,
+    Rotation3d,
+    Transform3d,
+    Translation2d,
+    Translation3d,
+)
+from wpimath.kinematics import ChassisSpeeds, SwerveDrive4Kinematics
+
+from components.vision import (
+    PoseCandidate,
+    Rejection,
+    VisualLocalizer,
+    solve_single_tags,
+)
+from components.vision_fusion import CameraMeasurement, VisionFusion
+from utilities.estimator import EstimatorChassis, module_positions
+from utilities.game import get_tag_pose
+
+ROBOT_TO_CAMERA = Transform3d(Translation3d(0.2, 0.1, 0.5), Rotation3d(0, -0.3, 3.0))
+
+
+ESTIMATE = Pose2d(2, 4, 0)
+
+
+class FakeChassis:
+    def __init__(self) -> None:
+        self.measurements: list[CameraMeasurement] = []
+        self.velocity = ChassisSpeeds()
+
+    def get_pose(self) -> Pose2d:
+        return ESTIMATE
+
+    def get_velocity(self) -> ChassisSpeeds:
+        return self.velocity
+
+    # stands in for the fusion component too, to collect the measurements
+    def add_measurements(self, measurements: list[CameraMeasurement]) -> None:
+        self.measurements.extend(measurements)
+
+
+def make_localizer(tmp_path, chassis: FakeChassis) -> VisualLocalizer:
+    localizer = VisualLocalizer(
+        "test_camera",
+        Translation3d(),
+        Rotation3d(),
+        wpilib.Field2d(),
+        wpiutil.log.DataLog(str(tmp_path)),
+        chassis,  # type: ignore[arg-type]
+    )
+    localizer.vision_fusion = chassis  # type: ignore[assignment]
+    setup_tunables(localizer, "vision_test")
+    return localizer
+
+
+def make_tracking_localizer(tmp_path, chassis: FakeChassis) -> VisualLocalizer:
+    """Make a localizer that has just confirmed the estimate."""
+    localizer = make_localizer(tmp_path, chassis)
+    localizer.last_accepted_time = wpilib.Timer.getFPGATimestamp()
+    localizer.recovering = False
+    return localizer
+
+
+def make_candidate(
+    timestamp: float,
+    pose: Pose2d = ESTIMATE,
+    *,
+    multi_tag: bool = False,
+    pose_z: float = 0.0,
+    tag_ids: tuple[int, ...] = (7,),
+    tag_distance: float = 1.0,
+) -> PoseCandidate:
+    return PoseCandidate(
+        timestamp, pose, multi_tag, 0.0, pose_z, tag_ids, tag_distance, pose, pose
+    )
+
+
+def test_measurements_batched_in_order(tmp_path):
+    chassis = FakeChassis()
+    localizer = make_tracking_localizer(tmp_path, chassis)
+
+    for timestamp in (3.0, 1.0, 2.0):
+        localizer.push_candidate(make_candidate(timestamp))
+    localizer.execute()
+
+    assert [m.timestamp for m in chassis.measurements] == [1.0, 2.0, 3.0]
+    assert localizer.measurements_used() == 3
+    assert localizer.measurements_dropped() == 0
+
+
+def test_measurements_capped_per_cycle(tmp_path):
+    chassis = FakeChassis()
+    localizer = make_tracking_localizer(tmp_path, chassis)
+    cap = VisualLocalizer.MAX_MEASUREMENTS_PER_CYCLE
+
+    for timestamp in range(cap + 3):
+        localizer.push_candidate(make_candidate(float(timestamp)))
+    localizer.execute()
+
+    # the newest measurements are kept
+    assert [m.timestamp for m in chassis.measurements] == [
+        float(timestamp) for timestamp in range(3, cap + 3)
+    ]
+    assert localizer.measurements_used() == cap
+    assert localizer.measurements_dropped() == 3
+
+
+def test_queue_overflow_counted(tmp_path):
+    localizer = make_localizer(tmp_path, FakeChassis())
+
+    for timestamp in range(VisualLocalizer.MAX_CANDIDATES + 2):
+        localizer.push_candidate(make_candidate(float(timestamp)))
+
+    assert len(localizer.candidates) == VisualLocalizer.MAX_CANDIDATES
+    assert localizer.measurements_dropped() == 2
+
+
+def make_target(
+    tag_id: int, robot_pose: Pose3d, alt_offset: Translation3d, ambiguity: float = 0.1
+) -> PhotonTrackedTarget:
+    """Make a target as seen by a camera on a robot at robot_pose."""
+    tag_pose = get_tag_pose(tag_id)
+    assert tag_pose is not None
+    camera_pose = robot_pose.transformBy(ROBOT_TO_CAMERA)
+    alt_camera_pose = Pose3d(
+        camera_pose.translation() + alt_offset, camera_pose.rotation()
+    )
+    return PhotonTrackedTarget(
+        fiducialId=tag_id,
+        bestCameraToTarget=Transform3d(camera_pose, tag_pose),
+        altCameraToTarget=Transform3d(alt_camera_pose, tag_pose),
+        poseAmbiguity=ambiguity,
+    )
+
+
+def test_solve_single_tags():
+    robot_pose = Pose3d(2, 5, 0, Rotation3d(0, 0, 3.0))
+    targets = [
+        make_target(7, robot_pose, Translation3d(1, 0, 0)),
+        make_target(8, robot_pose, Translation3d(0, -1, 0)),
+    ]
+    solution = solve_single_tags(ROBOT_TO_CAMERA, targets, Pose2d(2.1, 5, 0))
+    assert solution is not None
+    pose, z, tag_ids, tag_distance = solution
+    assert pose.x == approx(2)
+    assert pose.y == approx(5)
+    assert pose.rotation().radians() == approx(3.0)
+    assert z == approx(0, abs=1e-9)
+    assert tag_ids == (7, 8)
+    assert tag_distance == approx(
+        sum(target.bestCameraToTarget.translation().norm() for target in targets) / 2
+    )
+
+
+def test_solve_single_tags_picks_alternate():
+    robot_pose = Pose3d(2, 5, 0, Rotation3d(0, 0, 0.5))
+    # the alternate solution puts the robot 1 m closer to the tag
+    target = make_target(7, robot_pose, Translation3d(-1, 0, 0))
+    best = solve_single_tags(ROBOT_TO_CAMERA, [target], Pose2d(2, 5, 0))
+    alt = solve_single_tags(ROBOT_TO_CAMERA, [target], Pose2d(0.8, 5, 0))
+    assert best is not None and alt is not None
+    assert best[0].x == approx(2)
+    assert alt[0].x == approx(1)
+
+
+def test_solve_single_tags_filters():
+    robot_pose = Pose3d(2, 5, 0, Rotation3d())
+    targets = [
+        make_target(7, robot_pose, Translation3d(), ambiguity=0.5),
+        PhotonTrackedTarget(fiducialId=99),
+    ]
+    assert solve_single_tags(ROBOT_TO_CAMERA, targets, Pose2d()) is None
+
+
+def recovered(timestamp: float) -> list[PoseCandidate]:
+    """A candidate agreeing with the estimate, to start gating against it."""
+    return [make_candidate(timestamp)]
+
+
+def gate(tmp_path, *candidates: PoseCandidate) -> tuple[VisualLocalizer, FakeChassis]:
+    chassis = FakeChassis()
+    localizer = make_localizer(tmp_path, chassis)
+    for candidate in candidates:
+        localizer.push_candidate(candidate)
+    localizer.execute()
+    return localizer, chassis
+
+
+def test_rejects_off_field(tmp_path):
+    localizer, chassis = gate(tmp_path, make_candidate(1.0, Pose2d(-2, 4, 0)))
+    assert chassis.measurements == []
+    assert localizer.rejection_counts[Rejection.OFF_FIELD] == 1
+
+
+def test_rejects_too_high(tmp_path):
+    localizer, chassis = gate(tmp_path, make_candidate(1.0, pose_z=1.0))
+    assert chassis.measurements == []
+    assert localizer.rejection_counts[Rejection.TOO_HIGH] == 1
+
+
+def test_rejects_impossible_jump(tmp_path):
+    localizer, chassis = gate(
+        tmp_path, *recovered(1.0), make_candidate(1.1, Pose2d(4, 4, 0))
+    )
+    assert len(chassis.measurements) == 1
+    assert localizer.rejection_counts[Rejection.IMPOSSIBLE_JUMP] == 1
+
+
+def test_rejects_outlier(tmp_path):
+    localizer, chassis = gate(
+        tmp_path, *recovered(1.0), make_candidate(1.1, Pose2d(2, 4, 1.0))
+    )
+    assert len(chassis.measurements) == 1
+    assert localizer.rejection_counts[Rejection.OUTLIER] == 1
+
+
+def test_recovers_from_consistent_measurements(tmp_path):
+    # the estimate may be wrong, so don't gate against it
+    far = Pose2d(8, 2, 2.0)
+    count = VisualLocalizer.RECOVERY_MEASUREMENTS
+    localizer, chassis = gate(
+        tmp_path, *(make_candidate(1.0 + i * 0.02, far) for i in range(count + 1))
+    )
+    # once confirmed, keep accepting them while the estimate catches up
+    assert [measurement.pose for measurement in chassis.measurements] == [far, far]
+    assert localizer.rejection_counts[Rejection.UNCONFIRMED] == count - 1
+    assert localizer.recovering
+
+
+def test_recovery_needs_consistent_measurements(tmp_path):
+    # a bad measurement in amongst others doesn't re-seed the estimate
+    poses = [Pose2d(8, 2, 2.0), Pose2d(8, 2, 2.0), Pose2d(3, 6, 0.0)]
+    localizer, chassis = gate(
+        tmp_path,
+        *(make_candidate(1.0 + i * 0.02, pose) for i, pose in enumerate(poses)),
+    )
+    assert chassis.measurements == []
+    assert localizer.rejection_counts[Rejection.UNCONFIRMED] == len(poses)
+
+
+def test_recovery_converges(tmp_path):
+    truth = Pose2d(3, 4, 0)
+    kinematics = SwerveDrive4Kinematics(
+        Translation2d(0.3, 0.3),
+        Translation2d(-0.3, 0.3),
+        Translation2d(-0.3, -0.3),
+        Translation2d(0.3, -0.3),
+    )
+    # odometry thinks the robot is several metres away from where it is
+    chassis = EstimatorChassis(kinematics, Pose2d(6, 6, 0))
+    fusion = VisionFusion()
+    fusion.chassis = chassis  # type: ignore[assignment]
+    localizer = make_localizer(tmp_path, chassis)  # type: ignore[arg-type]
+    localizer.vision_fusion = fusion
+
+    loop_period = 0.02
+    converged_after = None
+    pauseTiming()
+    try:
+        for loop in range(100):
+            stepTiming(loop_period)
+            now = wpilib.Timer.getFPGATimestamp()
+            chassis.estimator.updateWithTime(now, Rotation2d(), module_positions())
+            localizer.push_candidate(make_candidate(now, truth))
+            localizer.execute()
+            fusion.execute()
+            if not localizer.recovering:
+                converged_after = loop * loop_period
+                break
+    finally:
+        resumeTiming()
+
+    assert converged_after is not None and converged_after < 1.0
+    error = chassis.get_pose().translation().distance(truth.translation())
+    assert error < localizer.MAX_JUMP
+
+
+def test_std_devs_scaled(tmp_path):
+    localizer = make_localizer(tmp_path, FakeChassis())
+    linear = localizer.linear_vision_uncertainty
+    rotation = localizer.rotation_vision_uncertainty
+
+    near = localizer.measurement_std_devs(
+        make_candidate(1.0, multi_tag=True, tag_ids=(7,), tag_distance=1.0)
+    )
+    assert near == approx((linear, linear, rotation))
+
+    # twice the nominal distance is 4 times the std dev, 4 tags halves it
+    far = localizer.measurement_std_devs(
+        make_candidate(1.0, multi_tag=True, tag_ids=(5, 6, 7, 8), tag_distance=4.0)
+    )
+    assert far == approx((linear * 2, linear * 2, rotation * 2))
+
+    single = localizer.measurement_std_devs(make_candidate(1.0))
+    scale = VisualLocalizer.SINGLE_TAG_UNCERTAINTY_SCALE
+    assert single == approx((linear * scale, linear * scale, rotation))
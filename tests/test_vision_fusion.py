@@ -0,0 +1,144 @@
+import math
+import random
+
+from pytest import approx
+from wpimath.geometry import Pose2d
+from wpimath.kinematics import ChassisSpeeds
+
+from components.chassis import VisionMeasurement
+from components.vision_fusion import (
+    CameraMeasurement,
+    VisionFusion,
+    fuse_measurements,
+)
+
+
+class FakeChassis:
+    def __init__(self) -> None:
+        self.batches: list[list[VisionMeasurement]] = []
+        self.pose = Pose2d()
+        self.velocity = ChassisSpeeds()
+
+    def get_pose(self) -> Pose2d:
+        return self.pose
+
+    def get_velocity(self) -> ChassisSpeeds:
+        return self.velocity
+
+    def add_vision_measurements(self, measurements: list[VisionMeasurement]) -> None:
+        self.batches.append(list(measurements))
+
+
+def make_fusion() -> tuple[VisionFusion, FakeChassis]:
+    fusion = VisionFusion()
+    chassis = FakeChassis()
+    fusion.chassis = chassis  # type: ignore[assignment]
+    return fusion, chassis
+
+
+POSE = Pose2d(2, 4, 0)
+
+
+def measurement(
+    timestamp: float,
+    pose: Pose2d = POSE,
+    std_devs: tuple[float, float, float] = (0.1, 0.1, 0.1),
+    tag_ids: frozenset[int] = frozenset({7}),
+) -> CameraMeasurement:
+    return CameraMeasurement(timestamp, pose, std_devs, tag_ids)
+
+
+def test_simultaneous_measurements_merged():
+    fusion, chassis = make_fusion()
+    fusion.add_measurements(
+        [measurement(1.0, tag_ids=frozenset({1})), measurement(2.0)]
+    )
+    fusion.add_measurements(
+        [measurement(1.002, tag_ids=frozenset({2})), measurement(1.5)]
+    )
+    fusion.execute()
+
+    # one submission per loop, one measurement per capture time
+    assert len(chassis.batches) == 1
+    assert [timestamp for _, timestamp, _ in chassis.batches[0]] == approx(
+        [1.001, 1.5, 2.0]
+    )
+    assert fusion.measurements_submitted() == 3
+    assert fusion.measurements_merged() == 1
+    assert fusion.pending == []
+
+
+def test_nothing_submitted_without_measurements():
+    fusion, chassis = make_fusion()
+    fusion.execute()
+    assert chassis.batches == []
+
+
+def test_single_measurement_unchanged():
+    m = measurement(1.0, Pose2d(1, 2, 3), (0.1, 0.2, 0.3))
+    assert fuse_measurements([m]) == (m.pose, m.timestamp, m.std_devs)
+
+
+def test_inverse_variance_weighting():
+    pose, _, std_devs = fuse_measurements(
+        [
+            measurement(1.0, Pose2d(0, 0, 0), (0.1, 0.2, 0.1), frozenset({1})),
+            measurement(1.0, Pose2d(1, 1, 0.5), (0.2, 0.1, 0.1), frozenset({2})),
+        ]
+    )
+    # x is weighted 4:1 towards the first, y towards the second
+    assert pose.x == approx(0.2)
+    assert pose.y == approx(0.8)
+    assert pose.rotation().radians() == approx(0.25)
+    assert std_devs == approx((math.sqrt(0.008), math.sqrt(0.008), math.sqrt(0.005)))
+
+
+def test_heading_wraps():
+    pose, _, _ = fuse_measurements(
+        [
+            measurement(1.0, Pose2d(0, 0, math.pi - 0.1), tag_ids=frozenset({1})),
+            measurement(1.0, Pose2d(0, 0, -math.pi + 0.1), tag_ids=frozenset({2})),
+        ]
+    )
+    assert abs(pose.rotation().radians()) == approx(math.pi)
+
+
+def test_shared_tags_not_double_counted():
+    _, _, std_devs = fuse_measurements(
+        [
+            measurement(1.0, std_devs=(0.1, 0.2, 0.3), tag_ids=frozenset({7, 8})),
+            measurement(1.0, std_devs=(0.2, 0.1, 0.3), tag_ids=frozenset({8})),
+        ]
+    )
+    assert std_devs == approx((0.1, 0.1, 0.3))
+
+
+def test_unsynchronised_cameras_merged():
+    fusion, chassis = make_fusion()
+    # driving forwards at 3 m/s, facing along the field's y axis
+    chassis.pose = Pose2d(2, 1, math.pi / 2)
+    chassis.velocity = ChassisSpeeds(3, 0, 0)
+
+    def true_pose(timestamp: float) -> Pose2d:
+        return Pose2d(2, 1 + 3 * (timestamp - 10), math.pi / 2)
+
+    # both cameras at 30 fps, free running 13 ms apart, with a little jitter
+    jitter = random.Random(0)
+    for phase, tag_id in ((0.0, 1), (0.013, 2)):
+        timestamps = [
+            10 + phase + frame / 30 + jitter.uniform(-0.002, 0.002)
+            for frame in range(15)
+        ]
+        fusion.add_measurements(
+            measurement(timestamp, true_pose(timestamp), tag_ids=frozenset({tag_id}))
+            for timestamp in timestamps
+        )
+    fusion.execute()
+
+    # one measurement per frame, each where the robot was at its timestamp
+    assert fusion.measurements_submitted() == 15
+    assert fusion.measurements_merged() == 15
+    for pose, timestamp, _ in chassis.batches[0]:
+        expected = true_pose(timestamp)
+        assert pose.translation().distance(expected.translation()) < 0.001
+        assert pose.rotation().radians() == approx(math.pi / 2)
@@ -0,0 +1,100 @@
+import math
+
+import wpilib
+import wpiutil.log
+from magicbot.magic_tunable import setup_tunables
+from pytest import approx
+from wpimath.geometry import Pose2d, Pose3d, Rotation3d, Translation3d
+from wpimath.kinematics import ChassisSpeeds
+
+from components.vision import VisualLocalizer, solve_single_tags
+from components.vision_fusion import CameraMeasurement
+from utilities.vision_sim import SimulatedCamera
+
+# facing the blue speaker tags (7 and 8)
+ROBOT_POSE = Pose2d(2, 5.5, 0)
+
+
+class FakeChassis:
+    def __init__(self) -> None:
+        self.measurements: list[CameraMeasurement] = []
+
+    def get_pose(self) -> Pose2d:
+        return ROBOT_POSE
+
+    def get_velocity(self) -> ChassisSpeeds:
+        return ChassisSpeeds()
+
+    def add_measurements(self, measurements: list[CameraMeasurement]) -> None:
+        self.measurements.extend(measurements)
+
+
+def make_camera(tmp_path, **kwargs) -> tuple[SimulatedCamera, VisualLocalizer]:
+    chassis = FakeChassis()
+    localizer = VisualLocalizer(
+        "sim_camera",
+        Translation3d(0.2, 0.1, 0.5),
+        # looking out the back, tilted up
+        Rotation3d(0, -0.3, math.pi),
+        wpilib.Field2d(),
+        wpiutil.log.DataLog(str(tmp_path)),
+        chassis,  # type: ignore[arg-type]
+    )
+    localizer.vision_fusion = chassis  # type: ignore[assignment]
+    setup_tunables(localizer, "vision_sim_test")
+    return SimulatedCamera(localizer, **kwargs), localizer
+
+
+def test_sees_tags_in_view(tmp_path):
+    camera, localizer = make_camera(tmp_path, linear_noise=0, angular_noise=0)
+    result = camera.capture(1.0, ROBOT_POSE)
+    assert result.getTimestamp() == 1.0
+    assert sorted(target.fiducialId for target in result.targets) == [7, 8]
+    assert result.multiTagResult.estimatedPose.isPresent
+
+    solution = solve_single_tags(localizer.robot_to_camera, result.targets, ROBOT_POSE)
+    assert solution is not None
+    assert solution[0].x == approx(ROBOT_POSE.x)
+    assert solution[0].y == approx(ROBOT_POSE.y)
+
+    # the coprocessor's solve is for the camera
+    camera_pose = Pose3d() + result.multiTagResult.estimatedPose.best
+    robot_pose = camera_pose.transformBy(localizer.camera_to_robot)
+    assert robot_pose.x == approx(ROBOT_POSE.x)
+    assert robot_pose.y == approx(ROBOT_POSE.y)
+
+
+def test_no_tags_out_of_view(tmp_path):
+    camera, _ = make_camera(tmp_path)
+    # looking away from the speaker
+    result = camera.capture(1.0, Pose2d(2, 5.5, math.pi))
+    assert 7 not in [target.fiducialId for target in result.targets]
+    # too far away
+    camera, _ = make_camera(tmp_path, max_distance=1.0)
+    assert camera.capture(1.0, ROBOT_POSE).targets == []
+
+
+def test_frame_rate_and_latency(tmp_path):
+    camera, localizer = make_camera(tmp_path, fps=25, latency=0.05)
+    dt = 0.02
+    for step in range(50):
+        camera.update(step * dt, ROBOT_POSE)
+    # one frame per 40 ms in a second, the newest are still in flight
+    assert camera.frames_captured == 25
+    assert len(camera.in_flight) in (1, 2)
+    assert localizer.results_received() == 25 - len(camera.in_flight)
+
+
+def test_feeds_localizer(tmp_path):
+    camera, localizer = make_camera(tmp_path, seed=0)
+    fusion: FakeChassis = localizer.vision_fusion  # type: ignore[assignment]
+    for step in range(10):
+        camera.update(step * 0.02, ROBOT_POSE)
+    localizer.execute()
+
+    assert fusion.measurements
+    for measurement in fusion.measurements:
+        assert measurement.tag_ids == {7, 8}
+        assert measurement.pose.translation().distance(
+            ROBOT_POSE.translation()
+        ) == approx(0, abs=0.1)
@@ -0,0 +1,326 @@
+"""
+Replay a match log through the pose estimator and the vision pipeline.
+
+The odometry samples, pose resets and camera results the robot logged are
+fed through a fresh estimator and the real VisualLocalizer and VisionFusion
+code, as fast as possible. The replayed track is compared against the pose
+the robot estimated, and against the true pose for logs from simulation.
+
+Options change the estimator std devs and the vision gating, so two
+configurations can be compared on the same match:
+
+    python -m tools.replay FRC_xxx.wpilog --linear-uncertainty 0.08
+"""
+
+import argparse
+import csv
+import dataclasses
+import math
+import tempfile
+import time
+
+import wpilib
+import wpiutil.log
+from magicbot.magic_tunable import setup_tunables
+from wpilib.simulation import pauseTiming, restartTiming, resumeTiming, stepTiming
+from wpimath.geometry import Pose2d, Translation2d
+from wpimath.kinematics import ChassisSpeeds, SwerveDrive4Kinematics
+
+from components.chassis import ChassisComponent
+from components.vision import Rejection, VisualLocalizer
+from components.vision_fusion import VisionFusion
+from utilities.estimator import EstimatorChassis
+from utilities.replay import (
+    CAMERA_RESULT_SUFFIX,
+    CAMERA_TRANSFORM_SUFFIX,
+    ESTIMATE_ENTRY,
+    GROUND_TRUTH_ENTRY,
+    ODOMETRY_ENTRY,
+    ODOMETRY_SAMPLE_LENGTH,
+    POSE_RESET_ENTRY,
+    decode_odometry,
+    decode_pose,
+    decode_result,
+    decode_transform,
+)
+
+
+@dataclasses.dataclass
+class Config:
+    name: str
+    state_std_devs: tuple[float, float, float] = (0.05, 0.05, 0.01)
+    vision_std_devs: tuple[float, float, float] = (0.4, 0.4, 0.03)
+    # None leaves the localizer's default
+    linear_uncertainty: float | None = None
+    rotation_uncertainty: float | None = None
+    max_mahalanobis_squared: float = VisualLocalizer.MAX_MAHALANOBIS_SQUARED
+
+
+@dataclasses.dataclass
+class Match:
+    """The estimator inputs from a log, in the order they were logged."""
+
+    # (log time, entry name, values)
+    events: list[tuple[float, str, list[float]]]
+    cameras: dict[str, list[float]]
+    # only logs from simulation know where the robot really was
+    has_ground_truth: bool
+
+
+@dataclasses.dataclass
+class Track:
+    # (timestamp, logged estimate, replayed estimate, true pose)
+    poses: list[tuple[float, Pose2d, Pose2d, Pose2d | None]]
+    measurements_used: int
+    rejections: dict[Rejection, int]
+    duration: float  # s of wall time
+
+
+def read_match(path: str) -> Match:
+    reader = wpiutil.log.DataLogReader(path)
+    if not reader.isValid():
+        raise ValueError(f"{path} is not a wpilog file")
+
+    names: dict[int, str] = {}
+    events = []
+    cameras = {}
+    replayed = (ODOMETRY_ENTRY, POSE_RESET_ENTRY, ESTIMATE_ENTRY, GROUND_TRUTH_ENTRY)
+    for record in reader:
+        if record.isStart():
+            start = record.getStartData()
+            names[start.entry] = start.name
+            continue
+        if record.isControl():
+            continue
+        name = names.get(record.getEntry())
+        if name is None:
+            continue
+        if name in replayed or name.endswith(CAMERA_RESULT_SUFFIX):
+            events.append((record.getTimestamp() / 1e6, name, record.getDoubleArray()))
+        elif name.endswith(CAMERA_TRANSFORM_SUFFIX):
+            cameras[name.removesuffix(CAMERA_TRANSFORM_SUFFIX)] = (
+                record.getDoubleArray()
+            )
+    has_ground_truth = any(name == GROUND_TRUTH_ENTRY for _, name, _ in events)
+    return Match(events, cameras, has_ground_truth)
+
+
+class Pipeline:
+    """A fresh estimator and vision pipeline, as the robot code starts with."""
+
+    def __init__(
+        self,
+        match: Match,
+        config: Config,
+        field: wpilib.Field2d,
+        data_log: wpiutil.log.DataLog,
+    ) -> None:
+        x = ChassisComponent.WHEEL_BASE / 2
+        y = ChassisComponent.TRACK_WIDTH / 2
+        kinematics = SwerveDrive4Kinematics(
+            Translation2d(x, y),
+            Translation2d(-x, y),
+            Translation2d(-x, -y),
+            Translation2d(x, -y),
+        )
+        self.chassis = EstimatorChassis(
+            kinematics, Pose2d(), config.state_std_devs, config.vision_std_devs
+        )
+        self.fusion = VisionFusion()
+        self.fusion.chassis = self.chassis  # type: ignore[assignment]
+
+        self.localizers = {}
+        for name, transform in match.cameras.items():
+            robot_to_camera = decode_transform(transform, 0)
+            localizer = VisualLocalizer(
+                name,
+                robot_to_camera.translation(),
+                robot_to_camera.rotation(),
+                field,
+                data_log,
+                self.chassis,  # type: ignore[arg-type]
+            )
+            localizer.vision_fusion = self.fusion
+            setup_tunables(localizer, "replay_" + name)
+            if config.linear_uncertainty is not None:
+                localizer.linear_vision_uncertainty = config.linear_uncertainty
+            if config.rotation_uncertainty is not None:
+                localizer.rotation_vision_uncertainty = config.rotation_uncertainty
+            localizer.MAX_MAHALANOBIS_SQUARED = config.max_mahalanobis_squared
+            self.localizers[name + CAMERA_RESULT_SUFFIX] = localizer
+
+
+def replay(match: Match, config: Config) -> Track:
+    field = wpilib.Field2d()
+    data_log = wpiutil.log.DataLog(tempfile.gettempdir())
+    pipelines = [Pipeline(match, config, field, data_log)]
+    pipeline = pipelines[0]
+    estimator = pipeline.chassis.estimator
+
+    poses = []
+    previous: tuple[float, Pose2d] | None = None
+    truth: Pose2d | None = None
+    begin = time.perf_counter()
+    restartTiming()
+    pauseTiming()
+    for log_time, name, values in match.events:
+        now = wpilib.Timer.getFPGATimestamp()
+        if log_time < now:
+            # logs from tests hold a run of the robot code for each test
+            restartTiming()
+            pauseTiming()
+            pipeline = Pipeline(match, config, field, data_log)
+            pipelines.append(pipeline)
+            estimator = pipeline.chassis.estimator
+            previous = None
+            truth = None
+            now = 0.0
+        # the localizer gates against the current time
+        stepTiming(log_time - now)
+
+        if name == ODOMETRY_ENTRY:
+            estimator.updateWithTime(*decode_odometry(values))
+        elif name == POSE_RESET_ENTRY:
+            _, gyro_angle, module_positions = decode_odometry(values)
+            pose = decode_pose(values[ODOMETRY_SAMPLE_LENGTH:])
+            estimator.resetPosition(gyro_angle, module_positions, pose)
+            previous = None
+            truth = None
+        elif name == GROUND_TRUTH_ENTRY:
+            truth = decode_pose(values[1:])
+        elif name == ESTIMATE_ENTRY:
+            # the end of a loop on the robot, when the cameras are drained
+            timestamp = values[0]
+            pose = estimator.getEstimatedPosition()
+            if previous is not None and timestamp > previous[0]:
+                dt = timestamp - previous[0]
+                delta = pose.translation() - previous[1].translation()
+                pipeline.chassis.velocity = ChassisSpeeds(delta.x / dt, delta.y / dt, 0)
+            previous = (timestamp, pose)
+            for localizer in pipeline.localizers.values():
+                localizer.execute()
+            pipeline.fusion.execute()
+            poses.append(
+                (
+                    timestamp,
+                    decode_pose(values[1:]),
+                    estimator.getEstimatedPosition(),
+                    truth,
+                )
+            )
+        elif name in pipeline.localizers:
+            pipeline.localizers[name].ingest_result(decode_result(values))
+    resumeTiming()
+    duration = time.perf_counter() - begin
+
+    used = 0
+    rejections = dict.fromkeys(Rejection, 0)
+    for pipeline in pipelines:
+        for localizer in pipeline.localizers.values():
+            used += localizer.used_count
+            for rejection, count in localizer.rejection_counts.items():
+                rejections[rejection] += count
+    return Track(poses, used, rejections, duration)
+
+
+def rms_error(pairs: list[tuple[Pose2d, Pose2d | None]]) -> tuple[float, float]:
+    """RMS position and heading error of poses from their expected poses."""
+    position = heading = 0.0
+    count = 0
+    for pose, expected in pairs:
+        if expected is None:
+            continue
+        position += pose.translation().distance(expected.translation()) ** 2
+        heading += (pose.rotation() - expected.rotation()).radians() ** 2
+        count += 1
+    if count == 0:
+        return math.nan, math.nan
+    return math.sqrt(position / count), math.sqrt(heading / count)
+
+
+def write_tracks(path: str, tracks: dict[str, Track]) -> None:
+    names = list(tracks)
+    first = tracks[names[0]]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        header = ["timestamp", "logged_x", "logged_y", "logged_heading"]
+        for name in names:
+            header += [f"{name}_x", f"{name}_y", f"{name}_heading"]
+        writer.writerow(header)
+        for i, (timestamp, logged, _, _) in enumerate(first.poses):
+            row = [timestamp, logged.x, logged.y, logged.rotation().radians()]
+            for name in names:
+                pose = tracks[name].poses[i][2]
+                row += [pose.x, pose.y, pose.rotation().radians()]
+            writer.writerow(row)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("log", help="wpilog file to replay")
+    parser.add_argument("--linear-uncertainty", type=float)
+    parser.add_argument("--rotation-uncertainty", type=float)
+    parser.add_argument("--max-mahalanobis-squared", type=float)
+    parser.add_argument(
+        "--vision-std-devs", type=float, nargs=3, metavar=("X", "Y", "THETA")
+    )
+    parser.add_argument(
+        "--state-std-devs", type=float, nargs=3, metavar=("X", "Y", "THETA")
+    )
+    parser.add_argument("--tracks", help="write the pose tracks to this CSV file")
+    args = parser.parse_args()
+
+    match = read_match(args.log)
+    baseline = Config("a")
+    candidate = Config("b")
+    candidate.linear_uncertainty = args.linear_uncertainty
+    candidate.rotation_uncertainty = args.rotation_uncertainty
+    if args.max_mahalanobis_squared is not None:
+        candidate.max_mahalanobis_squared = args.max_mahalanobis_squared
+    if args.vision_std_devs is not None:
+        x, y, theta = args.vision_std_devs
+        candidate.vision_std_devs = (x, y, theta)
+    if args.state_std_devs is not None:
+        x, y, theta = args.state_std_devs
+        candidate.state_std_devs = (x, y, theta)
+
+    tracks = {config.name: replay(match, config) for config in (baseline, candidate)}
+    if not tracks["a"].poses:
+        print(f"{args.log} has no estimator inputs to replay")
+        return
+    # logs from tests hold several runs, so only count time moving forwards
+    times = [timestamp for timestamp, _, _, _ in tracks["a"].poses]
+    match_time = sum(max(0.0, b - a) for a, b in zip(times, times[1:]))
+    print(
+        f"{len(match.events)} events, {len(match.cameras)} cameras,"
+        f" {match_time:.1f} s of match"
+    )
+    for name, track in tracks.items():
+        config = baseline if name == "a" else candidate
+        position, heading = rms_error(
+            [(replayed, logged) for _, logged, replayed, _ in track.poses]
+        )
+        print(f"{name}: {config}")
+        print(
+            f"   {match_time / track.duration:6.1f}x real time,"
+            f" {track.measurements_used} measurements used, rejected"
+            f" {', '.join(f'{r.name.lower()} {n}' for r, n in track.rejections.items())}"
+        )
+        print(
+            f"   RMS difference from logged estimate {position:.3f} m,"
+            f" {math.degrees(heading):.2f} deg"
+        )
+        if match.has_ground_truth:
+            position, heading = rms_error(
+                [(replayed, truth) for _, _, replayed, truth in track.poses]
+            )
+            print(
+                f"   RMS error from ground truth {position:.3f} m,"
+                f" {math.degrees(heading):.2f} deg"
+            )
+    if args.tracks:
+        write_tracks(args.tracks, tracks)
+
+
+if __name__ == "__main__":
+    main()
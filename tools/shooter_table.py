@@ -0,0 +1,212 @@
+"""
+Fit the ballistic model to logged shots and regenerate the shooter's table.
+
+Shots are read from robot logs (the shot ranges and setpoints the Shooter
+controller logs) or from CSV files with range, inclination and
+flywheel_speed columns. Every shot is assumed to have scored, so drop the
+misses from a tuning session before fitting.
+
+Until there are logged shots to fit to, the robot keeps the inclinations and
+flywheel speeds hand-tuned on the field. Without any shots, only the times of
+flight of that table are regenerated, from a model fitted to its tuned rows.
+
+    python -m tools.shooter_table FRC_xxx.wpilog tuning.csv
+    python -m tools.shooter_table
+"""
+
+import argparse
+import csv
+import dataclasses
+import datetime
+import time
+
+import wpiutil.log
+
+from components.shooter import ShooterComponent
+from controllers.shooter import SHOT_RANGE_ENTRY, SHOT_SETPOINT_ENTRY
+from utilities.ballistics import (
+    NoteModel,
+    Shot,
+    fit_model,
+    plan_shot,
+    read_table,
+    shot_residuals,
+    speaker_crossing,
+    write_table,
+)
+
+MIN_RANGE = 1.0
+MAX_RANGE = 6.0
+RANGE_STEP = 0.05
+MIN_FLYWHEEL_SPEED = 50.0
+FLYWHEEL_SPEED_STEP = 2.5
+
+
+def read_log_shots(path: str) -> list[Shot]:
+    reader = wpiutil.log.DataLogReader(path)
+    if not reader.isValid():
+        raise ValueError(f"{path} is not a wpilog file")
+
+    names: dict[int, str] = {}
+    ranges = []
+    setpoints = []
+    for record in reader:
+        if record.isStart():
+            start = record.getStartData()
+            names[start.entry] = start.name
+            continue
+        if record.isControl():
+            continue
+        name = names.get(record.getEntry())
+        if name == SHOT_RANGE_ENTRY:
+            ranges.append(record.getFloat())
+        elif name == SHOT_SETPOINT_ENTRY:
+            setpoints.append(record.getFloatArray())
+    # both are logged for every shot, one after the other
+    return [
+        Shot(range, inclination, flywheel_speed)
+        for range, (inclination, flywheel_speed) in zip(ranges, setpoints)
+    ]
+
+
+def read_csv_shots(path: str) -> list[Shot]:
+    with open(path, newline="") as f:
+        return [
+            Shot(
+                float(row["range"]),
+                float(row["inclination"]),
+                float(row["flywheel_speed"]),
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def describe_model(model: NoteModel) -> str:
+    return ", ".join(
+        f"{field.name}={getattr(model, field.name):.4g}"
+        for field in dataclasses.fields(model)
+    )
+
+
+def fit_time_of_flight(path: str, output: str) -> None:
+    """Regenerate the times of flight of a hand-tuned table.
+
+    The tuned rows are shots that score, so the model is fitted to them.
+    Rows outside the tuned range, where the model may not reach the speaker,
+    are extrapolated linearly from the nearest two tuned rows.
+    """
+    rows = read_table(path)
+    tuned = [
+        row
+        for row in rows
+        if ShooterComponent.MIN_SHOT_RANGE
+        < row.range
+        <= ShooterComponent.MAX_SHOT_RANGE
+    ]
+    shots = [Shot(row.range, row.inclination, row.flywheel_speed) for row in tuned]
+    model, error = fit_model(shots)
+    print(f"fitted to {len(shots)} tuned rows of {path}")
+    print(f"  {model}")
+    print(f"  RMS entry height error {error * 100:.1f} cm")
+
+    for row, shot in zip(tuned, shots):
+        crossing = speaker_crossing(model, shot)
+        if crossing is None:
+            raise SystemExit(f"the fitted model falls short at {row.range:.2f} m")
+        row.time_of_flight = crossing[1]
+    for row in rows:
+        if row in tuned:
+            continue
+        below = [other for other in tuned if other.range < row.range][-2:]
+        above = [other for other in tuned if other.range > row.range][:2]
+        near, far = (below[1], below[0]) if len(below) == 2 else (above[0], above[1])
+        slope = (far.time_of_flight - near.time_of_flight) / (far.range - near.range)
+        row.time_of_flight = max(
+            0.0, near.time_of_flight + slope * (row.range - near.range)
+        )
+
+    write_table(
+        output,
+        rows,
+        (
+            "Inclinations and flywheel speeds hand-tuned on the field.",
+            "Times of flight generated by python -m tools.shooter_table from a model",
+            f"fitted to the tuned rows on {datetime.date.today()}",
+            f"with an RMS entry height error of {error * 100:.1f} cm:",
+            describe_model(model),
+            "The rows at either end are outside the tuned range, so their times of",
+            "flight are extrapolated. The last ramps the flywheels down beyond it.",
+            "Regenerate the whole table from logged shots once a fit has been",
+            "validated against them.",
+        ),
+    )
+    for row in rows:
+        print(f"  {row.range:5.2f} m: {row.time_of_flight:.3f} s")
+    print(f"wrote {output}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("shots", nargs="*", help="wpilog or CSV files of shots")
+    parser.add_argument("--output", default=str(ShooterComponent.SHOOTING_TABLE_PATH))
+    args = parser.parse_args()
+
+    shots: list[Shot] = []
+    for path in args.shots:
+        if path.endswith(".wpilog"):
+            shots.extend(read_log_shots(path))
+        else:
+            shots.extend(read_csv_shots(path))
+    if not shots:
+        # keep the hand-tuned setpoints, and only model their flight times
+        fit_time_of_flight(str(ShooterComponent.SHOOTING_TABLE_PATH), args.output)
+        return
+    source = f"{len(shots)} shots from {len(args.shots)} files"
+
+    start = time.perf_counter()
+    model, error = fit_model(shots)
+    print(f"fitted to {source} in {time.perf_counter() - start:.1f} s")
+    print(f"  {model}")
+    print(f"  RMS entry height error {error * 100:.1f} cm")
+    for shot, residual in zip(shots, shot_residuals(model, shots)):
+        print(f"  {shot.range:5.2f} m: {residual * 100:+6.1f} cm")
+
+    start = time.perf_counter()
+    speeds = []
+    speed = MIN_FLYWHEEL_SPEED
+    while speed <= ShooterComponent.FLYWHEEL_SHOOTING_SPEED:
+        speeds.append(speed)
+        speed += FLYWHEEL_SPEED_STEP
+    rows = []
+    steps = round((MAX_RANGE - MIN_RANGE) / RANGE_STEP)
+    for i in range(steps + 1):
+        row = plan_shot(
+            model,
+            MIN_RANGE + i * RANGE_STEP,
+            speeds,
+            ShooterComponent.MIN_INCLINE_ANGLE,
+            ShooterComponent.MAX_INCLINE_ANGLE,
+            ShooterComponent.INCLINATOR_TOLERANCE,
+            ShooterComponent.FLYWHEEL_TOLERANCE,
+        )
+        if row is None:
+            print(f"  no shot at {MIN_RANGE + i * RANGE_STEP:.2f} m")
+        else:
+            rows.append(row)
+    print(f"planned {len(rows)} ranges in {time.perf_counter() - start:.1f} s")
+
+    write_table(
+        args.output,
+        rows,
+        (
+            "Generated by python -m tools.shooter_table, do not edit.",
+            f"Fitted to {source} on {datetime.date.today()}",
+            f"with an RMS entry height error of {error * 100:.1f} cm:",
+            describe_model(model),
+        ),
+    )
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+A model of a note's flight from the shooter to the speaker.
+
+This is too slow to run on the robot. It is fitted to logged shots and used
+offline to generate the shooter's lookup table (see tools/shooter_table.py),
+so the robot only interpolates the table.
+"""
+
+import csv
+import dataclasses
+import math
+from collections.abc import Iterable, Sequence
+
+from utilities.game import (
+    SPEAKER_HOOD_DEPTH,
+    SPEAKER_HOOD_HEIGHT,
+    SPEAKER_OPENING_HEIGHT,
+)
+
+GRAVITY = 9.81
+STEP = 0.01  # s
+MAX_FLIGHT_TIME = 2.0  # s
+
+NOTE_THICKNESS = 0.0254 * 2
+# keep the note this far inside the speaker opening
+CLEARANCE = 0.01
+LOWEST_CROSSING = SPEAKER_OPENING_HEIGHT + NOTE_THICKNESS / 2 + CLEARANCE
+HIGHEST_CROSSING = SPEAKER_HOOD_HEIGHT - NOTE_THICKNESS / 2 - CLEARANCE
+TARGET_HEIGHT = (LOWEST_CROSSING + HIGHEST_CROSSING) / 2
+
+TABLE_COLUMNS = ("range", "inclination", "flywheel_speed", "time_of_flight")
+
+# the parameters fitted to logged shots, with their initial search steps and limits
+FIT_STEPS = {
+    "exit_efficiency": 0.05,
+    "drag": 0.02,
+    "launch_angle_offset": 0.05,
+}
+FIT_BOUNDS = {
+    "exit_efficiency": (0.05, 1.0),
+    "drag": (0.0, 0.5),
+    "launch_angle_offset": (-0.5, 0.8),
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class NoteModel:
+    """Physical parameters of a shot."""
+
+    # fraction of the flywheel surface speed the note leaves with
+    exit_efficiency: float = 0.45
+    # quadratic drag deceleration per unit speed squared, in 1/m
+    drag: float = 0.05
+    wheel_diameter: float = 0.0254 * 4
+    # the note leaves this much steeper than the inclinator angle
+    launch_angle_offset: float = 0.0
+    # where the note leaves the shooter, relative to the robot centre
+    release_height: float = 0.45
+    release_distance: float = 0.25
+
+    def exit_speed(self, flywheel_speed: float) -> float:
+        """The note's speed in m/s when the flywheels spin at flywheel_speed rps."""
+        return flywheel_speed * math.pi * self.wheel_diameter * self.exit_efficiency
+
+
+DEFAULT_MODEL = NoteModel()
+
+
+@dataclasses.dataclass
+class Shot:
+    """A shot at a range from the robot centre to the speaker tag."""
+
+    range: float
+    inclination: float
+    flywheel_speed: float
+
+
+@dataclasses.dataclass
+class TableRow:
+    range: float
+    inclination: float
+    flywheel_speed: float
+    time_of_flight: float
+    # expected crossing height error from the shooter's tolerances, in m
+    error: float
+
+
+def fly(
+    model: NoteModel,
+    inclination: float,
+    flywheel_speed: float,
+    distances: Sequence[float],
+) -> list[tuple[float, float]] | None:
+    """Find the height and time at each horizontal distance from the robot centre.
+
+    distances must be increasing. Returns None if the note lands first.
+    """
+    speed = model.exit_speed(flywheel_speed)
+    x = model.release_distance
+    z = model.release_height
+    launch_angle = inclination + model.launch_angle_offset
+    vx = speed * math.cos(launch_angle)
+    vz = speed * math.sin(launch_angle)
+    t = 0.0
+    crossings = []
+    remaining = iter(distances)
+    target = next(remaining, None)
+
+    def acceleration(vx: float, vz: float) -> tuple[float, float]:
+        drag = model.drag * math.hypot(vx, vz)
+        return -drag * vx, -drag * vz - GRAVITY
+
+    while target is not None:
+        if z < 0 or vx <= 0 or t > MAX_FLIGHT_TIME:
+            return None
+        # classic fourth order Runge-Kutta
+        ax1, az1 = acceleration(vx, vz)
+        vx2, vz2 = vx + ax1 * STEP / 2, vz + az1 * STEP / 2
+        ax2, az2 = acceleration(vx2, vz2)
+        vx3, vz3 = vx + ax2 * STEP / 2, vz + az2 * STEP / 2
+        ax3, az3 = acceleration(vx3, vz3)
+        vx4, vz4 = vx + ax3 * STEP, vz + az3 * STEP
+        ax4, az4 = acceleration(vx4, vz4)
+        next_x = x + STEP / 6 * (vx + 2 * vx2 + 2 * vx3 + vx4)
+        next_z = z + STEP / 6 * (vz + 2 * vz2 + 2 * vz3 + vz4)
+        vx += STEP / 6 * (ax1 + 2 * ax2 + 2 * ax3 + ax4)
+        vz += STEP / 6 * (az1 + 2 * az2 + 2 * az3 + az4)
+
+        while target is not None and next_x >= target:
+            fraction = (target - x) / (next_x - x)
+            crossings.append((z + (next_z - z) * fraction, t + STEP * fraction))
+            target = next(remaining, None)
+        x, z = next_x, next_z
+        t += STEP
+    return crossings
+
+
+def speaker_crossing(model: NoteModel, shot: Shot) -> tuple[float, float] | None:
+    """The note's height and time as it enters the front of the speaker."""
+    # the speaker tag is on the wall, under the back of the hood
+    front = shot.range - SPEAKER_HOOD_DEPTH
+    crossings = fly(model, shot.inclination, shot.flywheel_speed, (front,))
+    return None if crossings is None else crossings[0]
+
+
+def solve_inclination(
+    model: NoteModel,
+    distance: float,
+    flywheel_speed: float,
+    min_inclination: float,
+    max_inclination: float,
+    iterations: int = 20,
+) -> float | None:
+    """Find the flattest inclination that enters the middle of the speaker opening."""
+
+    def height(inclination: float) -> float:
+        crossing = speaker_crossing(model, Shot(distance, inclination, flywheel_speed))
+        return -math.inf if crossing is None else crossing[0]
+
+    # bracket the first time the note reaches the target height
+    steps = 16
+    low = min_inclination
+    if height(low) > TARGET_HEIGHT:
+        return None
+    for i in range(1, steps + 1):
+        high = min_inclination + (max_inclination - min_inclination) * i / steps
+        if height(high) >= TARGET_HEIGHT:
+            break
+        low = high
+    else:
+        return None
+
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        if height(middle) < TARGET_HEIGHT:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def solve_flywheel_speed(
+    model: NoteModel,
+    distance: float,
+    inclination: float,
+    min_speed: float,
+    max_speed: float,
+    iterations: int = 20,
+) -> float | None:
+    """Find the flywheel speed that enters the middle of the opening at inclination.
+
+    This errs on the slow side, so the note never passes above the middle.
+    """
+
+    def height(flywheel_speed: float) -> float:
+        crossing = speaker_crossing(model, Shot(distance, inclination, flywheel_speed))
+        return -math.inf if crossing is None else crossing[0]
+
+    low = min_speed
+    high = max_speed
+    if not height(low) <= TARGET_HEIGHT <= height(high):
+        return None
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        if height(middle) < TARGET_HEIGHT:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+def plan_shot(
+    model: NoteModel,
+    distance: float,
+    flywheel_speeds: Iterable[float],
+    min_inclination: float,
+    max_inclination: float,
+    inclination_tolerance: float,
+    flywheel_tolerance: float,
+) -> TableRow | None:
+    """Choose the shot at distance least sensitive to the shooter's tolerances.
+
+    Each flywheel speed is paired with the flattest inclination that enters
+    the middle of the opening, between its lip and the hood. The shot whose
+    entry height moves least when the inclinator and flywheels are at the
+    edge of their tolerances is chosen.
+
+    Faster shots are usually less sensitive, until the inclinator reaches its
+    lower limit. The speed that puts the note in the opening at that limit is
+    also tried, so the chosen speed changes smoothly with distance.
+    """
+    speeds = sorted(flywheel_speeds)
+    limit_speed = solve_flywheel_speed(
+        model, distance, min_inclination, speeds[0], speeds[-1]
+    )
+    if limit_speed is not None:
+        speeds.append(limit_speed)
+
+    best: TableRow | None = None
+    for flywheel_speed in speeds:
+        inclination = solve_inclination(
+            model, distance, flywheel_speed, min_inclination, max_inclination
+        )
+        if inclination is None:
+            continue
+        crossing = speaker_crossing(model, Shot(distance, inclination, flywheel_speed))
+        if crossing is None:
+            continue
+        entry_height, time_of_flight = crossing
+
+        error = 0.0
+        for shot in (
+            Shot(distance, inclination + inclination_tolerance, flywheel_speed),
+            Shot(distance, inclination, flywheel_speed + flywheel_tolerance),
+        ):
+            perturbed = speaker_crossing(model, shot)
+            # a shot that can fall short at the edge of tolerance is no good
+            error += math.inf if perturbed is None else abs(perturbed[0] - entry_height)
+        if error < math.inf and (best is None or error < best.error):
+            best = TableRow(
+                distance, inclination, flywheel_speed, time_of_flight, error
+            )
+    return best
+
+
+def shot_residuals(model: NoteModel, shots: Iterable[Shot]) -> list[float]:
+    """How far above the middle of the opening each shot enters the speaker."""
+    residuals = []
+    for shot in shots:
+        crossing = speaker_crossing(model, shot)
+        # a shot that falls short is as wrong as one hitting the carpet
+        residuals.append(
+            -TARGET_HEIGHT if crossing is None else crossing[0] - TARGET_HEIGHT
+        )
+    return residuals
+
+
+def rms_error(model: NoteModel, shots: Sequence[Shot]) -> float:
+    residuals = shot_residuals(model, shots)
+    return math.sqrt(sum(r * r for r in residuals) / len(residuals))
+
+
+def fit_model(
+    shots: Sequence[Shot], initial: NoteModel = DEFAULT_MODEL, iterations: int = 200
+) -> tuple[NoteModel, float]:
+    """Fit the exit efficiency, drag and launch angle offset to shots that scored.
+
+    This is a compass search: step each parameter up and down, keep any
+    improvement, and halve the steps when nothing improves. Returns the fitted
+    model and its RMS entry height error.
+    """
+    best = initial
+    best_error = rms_error(best, shots)
+    steps = dict(FIT_STEPS)
+    for _ in range(iterations):
+        improved = False
+        for name, step in steps.items():
+            for direction in (1, -1):
+                value = getattr(best, name) + direction * step
+                low, high = FIT_BOUNDS[name]
+                if not low <= value <= high:
+                    continue
+                model = dataclasses.replace(best, **{name: value})
+                error = rms_error(model, shots)
+                if error < best_error:
+                    best = model
+                    best_error = error
+                    improved = True
+                    break
+        if not improved:
+            steps = {name: step / 2 for name, step in steps.items()}
+            if all(step < FIT_STEPS[name] / 1000 for name, step in steps.items()):
+                break
+    return best, best_error
+
+
+def read_table(path: str) -> list[TableRow]:
+    """Read a table written by write_table, skipping the comments."""
+    with open(path, newline="") as f:
+        lines = (line for line in f if not line.startswith("#"))
+        return [
+            TableRow(
+                float(row["range"]),
+                float(row["inclination"]),
+                float(row["flywheel_speed"]),
+                float(row["time_of_flight"]),
+                0.0,
+            )
+            for row in csv.DictReader(lines)
+        ]
+
+
+def write_table(path: str, rows: Sequence[TableRow], header: Sequence[str]) -> None:
+    """Write the table as CSV, with the header lines as comments."""
+    with open(path, "w", newline="") as f:
+        for line in header:
+            f.write(f"# {line}\n")
+        writer = csv.writer(f)
+        writer.writerow(TABLE_COLUMNS)
+        for row in rows:
+            writer.writerow(
+                (
+                    f"{row.range:.3f}",
+                    f"{row.inclination:.4f}",
+                    f"{row.flywheel_speed:.2f}",
+                    f"{row.time_of_flight:.4f}",
+                )
+            )
@@ -0,0 +1,68 @@
+"""A stand-in for the chassis over a bare pose estimator, for offline tools."""
+
+from __future__ import annotations
+
+import typing
+
+from wpimath.estimator import SwerveDrive4PoseEstimator
+from wpimath.geometry import Pose2d, Rotation2d
+from wpimath.kinematics import (
+    ChassisSpeeds,
+    SwerveDrive4Kinematics,
+    SwerveModulePosition,
+)
+
+if typing.TYPE_CHECKING:
+    from components.chassis import VisionMeasurement
+
+
+class EstimatorChassis:
+    """The parts of the chassis the vision pipeline uses."""
+
+    def __init__(
+        self,
+        kinematics: SwerveDrive4Kinematics,
+        pose: Pose2d,
+        state_std_devs: tuple[float, float, float] = (0.05, 0.05, 0.01),
+        vision_std_devs: tuple[float, float, float] = (0.4, 0.4, 0.03),
+    ) -> None:
+        self.estimator = SwerveDrive4PoseEstimator(
+            kinematics,
+            pose.rotation(),
+            module_positions(),
+            pose,
+            state_std_devs,
+            vision_std_devs,
+        )
+        self.velocity = ChassisSpeeds()
+
+    def get_pose(self) -> Pose2d:
+        return self.estimator.getEstimatedPosition()
+
+    def get_velocity(self) -> ChassisSpeeds:
+        return self.velocity
+
+    def add_vision_measurements(self, measurements: list[VisionMeasurement]) -> None:
+        for pose, timestamp, std_devs in measurements:
+            if std_devs is None:
+                self.estimator.addVisionMeasurement(pose, timestamp)
+            else:
+                self.estimator.addVisionMeasurement(pose, timestamp, std_devs)
+
+
+def module_positions(
+    distances: list[float] | None = None, angles: list[Rotation2d] | None = None
+) -> tuple[
+    SwerveModulePosition,
+    SwerveModulePosition,
+    SwerveModulePosition,
+    SwerveModulePosition,
+]:
+    distances = distances or [0.0] * 4
+    angles = angles or [Rotation2d()] * 4
+    return (
+        SwerveModulePosition(distances[0], angles[0]),
+        SwerveModulePosition(distances[1], angles[1]),
+        SwerveModulePosition(distances[2], angles[2]),
+        SwerveModulePosition(distances[3], angles[3]),
+    )
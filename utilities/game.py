@@ -30,6 +30,8 @@ FIELD_LENGTH = RED_SPEAKER_POSE.x + BLUE_SPEAKER_POSE.x
 
 # Minimum height of the overhanging speaker hood as obtained from a field Onshape model.
 SPEAKER_HOOD_HEIGHT = 2.104883
+# Height of the lower edge of the speaker opening, from the game manual.
+SPEAKER_OPENING_HEIGHT = 1.98
 SPEAKER_HOOD_WIDTH = 1.05
 SPEAKER_HOOD_DEPTH = 0.456499
 
@@ -41,6 +43,12 @@ RED_SPEAKER_TARGET_POSITION = RED_SPEAKER_POSE.translation() - Translation3d(
     SPEAKER_HOOD_DEPTH, 0, 0
 )
 
+# The goal positions are used every loop, so don't recreate them on each call
+BLUE_SPEAKER_POSITION = BLUE_SPEAKER_POSE.translation()
+RED_SPEAKER_POSITION = RED_SPEAKER_POSE.translation()
+BLUE_SPEAKER_POSITION_2D = BLUE_SPEAKER_POSITION.toTranslation2d()
+RED_SPEAKER_POSITION_2D = RED_SPEAKER_POSITION.toTranslation2d()
+
 NOTE_DIAMETER = 0.0254 * 14
 
 
@@ -67,6 +75,25 @@ def field_flip_translation2d(t: Translation2d):
     return Translation2d(FIELD_LENGTH - t.x, t.y)
 
 
+def _build_tag_table() -> tuple[Pose3d | None, ...]:
+    tags = apriltag_layout.getTags()
+    poses: list[Pose3d | None] = [None] * (max(tag.ID for tag in tags) + 1)
+    for tag in tags:
+        poses[tag.ID] = tag.pose
+    return tuple(poses)
+
+
+# Tag poses indexed by fiducial ID, None where there is no tag with that ID.
+TAG_POSES = _build_tag_table()
+
+
+def get_tag_pose(tag_id: int) -> Pose3d | None:
+    """Get the field pose of a tag, or None if it isn't on the field."""
+    if 0 <= tag_id < len(TAG_POSES):
+        return TAG_POSES[tag_id]
+    return None
+
+
 # This will default to the blue alliance if a proper link to the driver station has not yet been established
 def is_red() -> bool:
     return wpilib.DriverStation.getAlliance() == wpilib.DriverStation.Alliance.kRed
@@ -74,10 +101,17 @@ def is_red() -> bool:
 
 def get_goal_speaker_position() -> Translation3d:
     if is_red():
-        return RED_SPEAKER_POSE.translation()
+        return RED_SPEAKER_POSITION
+
+    return BLUE_SPEAKER_POSITION
+
+
+def get_goal_speaker_position_2d() -> Translation2d:
+    if is_red():
+        return RED_SPEAKER_POSITION_2D
 
-    return BLUE_SPEAKER_POSE.translation()
+    return BLUE_SPEAKER_POSITION_2D
 
 
 def translation_to_goal(position: Translation2d) -> Translation2d:
-    return get_goal_speaker_position().toTranslation2d() - position
+    return get_goal_speaker_position_2d() - position
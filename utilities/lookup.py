@@ -0,0 +1,120 @@
+import bisect
+import csv
+import os
+from collections.abc import Sequence
+
+# a + b s + c s^2 + d s^3, where s is the distance into the segment
+Coefficients = tuple[float, float, float, float]
+
+
+class LookupTable:
+    """
+    Interpolate several outputs against one input, precomputed once.
+
+    Each segment between breakpoints is stored as a cubic polynomial, so an
+    evaluation is one bisect and a Horner step per output. Linear
+    interpolation matches numpy.interp. Monotone cubic interpolation
+    (Fritsch-Carlson, as in PCHIP) is smooth but never overshoots the data.
+    Inputs outside the table are clamped to its ends.
+    """
+
+    def __init__(
+        self,
+        xs: Sequence[float],
+        columns: Sequence[Sequence[float]],
+        *,
+        cubic: bool = False,
+    ) -> None:
+        if len(xs) < 2:
+            raise ValueError("a lookup table needs at least two breakpoints")
+        if any(b <= a for a, b in zip(xs, xs[1:])):
+            raise ValueError("lookup table breakpoints must be strictly increasing")
+        if any(len(column) != len(xs) for column in columns):
+            raise ValueError("lookup table columns must match the breakpoints")
+
+        self.xs = [float(x) for x in xs]
+        self.first = tuple(float(column[0]) for column in columns)
+        self.last = tuple(float(column[-1]) for column in columns)
+        # segments[i] holds the coefficients of every column for xs[i] to xs[i+1]
+        make_segments = _cubic_segments if cubic else _linear_segments
+        per_column = [make_segments(self.xs, column) for column in columns]
+        self.segments = [list(segment) for segment in zip(*per_column)]
+
+    @classmethod
+    def from_csv(
+        cls,
+        path: str | os.PathLike,
+        x_column: str,
+        columns: Sequence[str],
+        *,
+        cubic: bool = False,
+    ) -> "LookupTable":
+        """Load a table from a CSV file with a header row naming its columns.
+
+        Lines starting with # are comments.
+        """
+        with open(path, newline="") as f:
+            lines = (line for line in f if not line.startswith("#"))
+            rows = sorted(
+                (float(row[x_column]), [float(row[name]) for name in columns])
+                for row in csv.DictReader(lines)
+            )
+        return cls(
+            [x for x, _ in rows],
+            [[values[i] for _, values in rows] for i in range(len(columns))],
+            cubic=cubic,
+        )
+
+    def evaluate(self, x: float) -> tuple[float, ...]:
+        """The value of every column at x."""
+        xs = self.xs
+        if x <= xs[0]:
+            return self.first
+        if x >= xs[-1]:
+            return self.last
+        i = bisect.bisect_right(xs, x) - 1
+        s = x - xs[i]
+        return tuple([a + s * (b + s * (c + s * d)) for a, b, c, d in self.segments[i]])
+
+
+def _linear_segments(xs: list[float], ys: Sequence[float]) -> list[Coefficients]:
+    return [
+        (ys[i], (ys[i + 1] - ys[i]) / (xs[i + 1] - xs[i]), 0.0, 0.0)
+        for i in range(len(xs) - 1)
+    ]
+
+
+def _cubic_segments(xs: list[float], ys: Sequence[float]) -> list[Coefficients]:
+    n = len(xs) - 1
+    widths = [xs[i + 1] - xs[i] for i in range(n)]
+    secants = [(ys[i + 1] - ys[i]) / widths[i] for i in range(n)]
+
+    # Fritsch-Carlson tangents: flat at local extrema, otherwise a weighted
+    # harmonic mean of the neighbouring secants
+    tangents = [secants[0]]
+    for i in range(1, n):
+        before = secants[i - 1]
+        after = secants[i]
+        if before * after <= 0:
+            tangents.append(0.0)
+        else:
+            w1 = 2 * widths[i] + widths[i - 1]
+            w2 = widths[i] + 2 * widths[i - 1]
+            tangents.append((w1 + w2) / (w1 / before + w2 / after))
+    tangents.append(secants[-1])
+
+    segments = []
+    for i in range(n):
+        h = widths[i]
+        m0 = tangents[i]
+        m1 = tangents[i + 1]
+        secant = secants[i]
+        segments.append(
+            (
+                float(ys[i]),
+                m0,
+                (3 * secant - 2 * m0 - m1) / h,
+                (m0 + m1 - 2 * secant) / h**2,
+            )
+        )
+    return segments
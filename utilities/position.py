@@ -4,7 +4,7 @@ from wpimath.geometry import Rotation2d, Translation2d, Pose2d
 
 from utilities.game import (
     RED_SPEAKER_POSE,
-    BLUE_SPEAKER_POSE,
+    BLUE_SPEAKER_POSITION_2D,
     field_flip_pose2d,
     field_flip_translation2d,
     field_flip_angle,
@@ -22,10 +22,7 @@ class Path:
         if face_target:
             last_waypoint = waypoints[-1]
             self.final_heading = (
-                (
-                    BLUE_SPEAKER_POSE.translation().toTranslation2d()
-                    - field_flip_translation2d(last_waypoint)
-                )
+                (BLUE_SPEAKER_POSITION_2D - field_flip_translation2d(last_waypoint))
                 .angle()
                 .radians()
             )
@@ -0,0 +1,211 @@
+import array
+import functools
+import logging
+import os
+import time
+import weakref
+from collections.abc import Callable
+from typing import TypeVar
+
+import ntcore
+import wpiutil.log
+from magicbot import StateMachine
+
+T = TypeVar("T")
+
+
+def percentile(sorted_samples: list[float], fraction: float) -> float:
+    """Nearest rank percentile of an already sorted list of samples."""
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[round(fraction * (len(sorted_samples) - 1))]
+
+
+def resident_memory() -> int | None:
+    """Resident set size of this process in bytes, or None if the OS doesn't say."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def process_uptime() -> float | None:
+    """Seconds since this process started, or None if the OS doesn't say."""
+    try:
+        with open("/proc/self/stat") as f:
+            stat = f.read()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except OSError:
+        return None
+    # the process name may contain spaces, so count fields after it
+    start_ticks = int(stat.rsplit(")", 1)[1].split()[19])
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def log_startup(data_log: wpiutil.log.DataLog, logger: logging.Logger) -> None:
+    """Record how long the process took to boot and how much memory it uses."""
+    boot_time = process_uptime()
+    rss = resident_memory()
+    if boot_time is None or rss is None:
+        return
+    wpiutil.log.DoubleLogEntry(data_log, "startup/boot_time").append(boot_time)
+    wpiutil.log.IntegerLogEntry(data_log, "startup/rss").append(rss)
+    logger.info("Booted in %.2f s using %.1f MiB", boot_time, rss / 2**20)
+
+
+class TimingStats:
+    """Keeps the most recent durations for one piece of code in a ring buffer."""
+
+    def __init__(self, size: int) -> None:
+        self.samples = array.array("d", bytes(8 * size))
+        self.size = size
+        self.index = 0
+        self.count = 0
+        self.overruns = 0
+
+    def add(self, duration: float) -> None:
+        self.samples[self.index] = duration
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def summary(self) -> tuple[float, float, float]:
+        """Get the (p50, p95, max) of the recorded durations."""
+        samples = sorted(self.samples[: self.count])
+        if not samples:
+            return (0.0, 0.0, 0.0)
+        return (percentile(samples, 0.5), percentile(samples, 0.95), samples[-1])
+
+
+class LoopProfiler:
+    """
+    Times each part of the robot loop.
+
+    Wrapped functions have their durations kept in a TimingStats per name,
+    and every cycle's durations are written to the data log. Summaries are
+    published to NetworkTables every publish_period seconds.
+    """
+
+    def __init__(
+        self,
+        data_log: wpiutil.log.DataLog,
+        loop_period: float,
+        *,
+        window: int = 500,
+        publish_period: float = 1.0,
+    ) -> None:
+        self.loop_period = loop_period
+        self.window = window
+        self.publish_period = publish_period
+        self.last_publish_time = time.monotonic()
+
+        self.stats: dict[str, TimingStats] = {}
+        # time spent in timed calls nested inside the call currently being timed
+        self.nested_time = 0.0
+        # durations of everything that ran this cycle, in order of first run
+        self.names: list[str] = []
+        self.cycle_durations: dict[str, float] = {}
+
+        self.names_entry = wpiutil.log.StringArrayLogEntry(data_log, "profiler/names")
+        self.durations_entry = wpiutil.log.DoubleArrayLogEntry(
+            data_log, "profiler/durations"
+        )
+        self.total_entry = wpiutil.log.DoubleLogEntry(data_log, "profiler/total")
+        self.rss_entry = wpiutil.log.IntegerLogEntry(data_log, "profiler/rss")
+
+        self.nt = ntcore.NetworkTableInstance.getDefault().getTable("/profiler")
+        self.publishers: dict[str, ntcore.DoubleArrayPublisher] = {}
+        self.rss_publisher = self.nt.getIntegerTopic("rss").publish()
+
+    def wrap(self, name: str, func: Callable[[], T]) -> Callable[[], T]:
+        """Wrap a function with no arguments so that its calls are timed."""
+
+        def timed() -> T:
+            return self.time_call(name, func)
+
+        return timed
+
+    def wrap_component(self, name: str, component) -> None:
+        """Time a component's execute, with state machines timed per state."""
+        # the wrapper is stored on the component, so only hold a weak reference
+        # to it to avoid a reference cycle keeping the component alive
+        execute = functools.partial(type(component).execute, weakref.proxy(component))
+        if isinstance(component, StateMachine):
+            state_machine = weakref.proxy(component)
+
+            def timed() -> None:
+                state = state_machine.current_state or "idle"
+                self.time_call(f"{name}.{state}", execute)
+
+        else:
+            timed = self.wrap(name, execute)
+        component.execute = timed
+
+    def time_call(self, name: str, func: Callable[[], T]) -> T:
+        """
+        Call func, recording the time spent in it.
+
+        Time spent in other timed calls made by func is only counted against
+        those calls, so the durations for a cycle add up to the time taken.
+        """
+        outer_nested_time = self.nested_time
+        self.nested_time = 0.0
+        start = time.perf_counter()
+        try:
+            return func()
+        finally:
+            elapsed = time.perf_counter() - start
+            self.record(name, elapsed - self.nested_time)
+            self.nested_time = outer_nested_time + elapsed
+
+    def record(self, name: str, duration: float) -> None:
+        if name not in self.stats:
+            self.stats[name] = TimingStats(self.window)
+            self.names.append(name)
+            self.names_entry.append(self.names)
+        self.cycle_durations[name] = self.cycle_durations.get(name, 0.0) + duration
+
+    def end_cycle(self) -> None:
+        """Commit this cycle's durations. Call once at the end of each loop."""
+        durations = self.cycle_durations
+        if not durations:
+            return
+
+        for name, duration in durations.items():
+            self.stats[name].add(duration)
+
+        total = sum(durations.values())
+        if total > self.loop_period:
+            # blame the overrun on whatever took the longest
+            slowest = max(durations, key=durations.__getitem__)
+            self.stats[slowest].overruns += 1
+
+        self.durations_entry.append([durations.get(name, 0.0) for name in self.names])
+        self.total_entry.append(total)
+        self.cycle_durations = {}
+        self.nested_time = 0.0
+
+        now = time.monotonic()
+        if now - self.last_publish_time >= self.publish_period:
+            self.last_publish_time = now
+            self.publish()
+
+    def publish(self) -> None:
+        """
+        Publish [p50, p95, max, overruns] in milliseconds for everything timed.
+
+        The process' memory use is published and logged alongside.
+        """
+        rss = resident_memory()
+        if rss is not None:
+            self.rss_publisher.set(rss)
+            self.rss_entry.append(rss)
+        for name, stats in self.stats.items():
+            publisher = self.publishers.get(name)
+            if publisher is None:
+                publisher = self.nt.getDoubleArrayTopic(name).publish()
+                self.publishers[name] = publisher
+            p50, p95, max_duration = stats.summary()
+            publisher.set([p50 * 1000, p95 * 1000, max_duration * 1000, stats.overruns])
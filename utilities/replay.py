@@ -0,0 +1,155 @@
+"""
+Encoding of the raw inputs to the pose estimator in the robot's DataLog.
+
+The chassis logs every odometry sample it feeds the estimator and the
+cameras log every result they receive, so that a match can be replayed
+through the estimator offline. See tools/replay.py.
+"""
+
+from __future__ import annotations
+
+import typing
+from collections.abc import Sequence
+
+from photonlibpy.multiTargetPNPResult import MultiTargetPNPResult, PNPResult
+from photonlibpy.photonPipelineResult import PhotonPipelineResult
+from photonlibpy.photonTrackedTarget import PhotonTrackedTarget
+from wpimath.geometry import (
+    Pose2d,
+    Quaternion,
+    Rotation2d,
+    Rotation3d,
+    Transform3d,
+    Translation3d,
+)
+from wpimath.kinematics import SwerveModulePosition
+
+if typing.TYPE_CHECKING:
+    from components.chassis import OdometrySample
+
+# [timestamp, gyro, (distance, angle) for each module]
+ODOMETRY_ENTRY = "replay/odometry"
+# an odometry sample, then [x, y, heading] of the new pose
+POSE_RESET_ENTRY = "replay/pose_reset"
+# [timestamp, x, y, heading] of the estimate at the end of each loop
+ESTIMATE_ENTRY = "replay/estimate"
+# [timestamp, x, y, heading] of the true pose, only in simulation
+GROUND_TRUTH_ENTRY = "replay/ground_truth"
+# appended to the camera name, see encode_result for the layout
+CAMERA_RESULT_SUFFIX = "/result"
+# appended to the camera name, logged once
+CAMERA_TRANSFORM_SUFFIX = "/robot_to_camera"
+
+ODOMETRY_SAMPLE_LENGTH = 10
+TRANSFORM_LENGTH = 7
+TARGET_LENGTH = 4 + 2 * TRANSFORM_LENGTH
+
+
+def encode_odometry(
+    timestamp: float, gyro: Rotation2d, positions: Sequence[SwerveModulePosition]
+) -> list[float]:
+    values = [timestamp, gyro.radians()]
+    for position in positions:
+        values.append(position.distance)
+        values.append(position.angle.radians())
+    return values
+
+
+def decode_odometry(values: Sequence[float]) -> OdometrySample:
+    return (
+        values[0],
+        Rotation2d(values[1]),
+        (
+            SwerveModulePosition(values[2], Rotation2d(values[3])),
+            SwerveModulePosition(values[4], Rotation2d(values[5])),
+            SwerveModulePosition(values[6], Rotation2d(values[7])),
+            SwerveModulePosition(values[8], Rotation2d(values[9])),
+        ),
+    )
+
+
+def encode_pose(pose: Pose2d) -> list[float]:
+    return [pose.x, pose.y, pose.rotation().radians()]
+
+
+def decode_pose(values: Sequence[float]) -> Pose2d:
+    return Pose2d(values[0], values[1], values[2])
+
+
+def encode_result(result: PhotonPipelineResult) -> list[float]:
+    """
+    Flatten the parts of a camera result the localizer uses.
+
+    The layout is [timestamp, latency, multi-tag solve, tag ids used,
+    targets]. The multi-tag solve is always present, and the id and target
+    lists are each preceded by their length.
+    """
+    solve = result.multiTagResult.estimatedPose
+    values = [
+        result.getTimestamp(),
+        result.getLatencyMillis(),
+        float(solve.isPresent),
+        *encode_transform(solve.best),
+        *encode_transform(solve.alt),
+        solve.bestReprojError,
+        solve.altReprojError,
+        solve.ambiguity,
+    ]
+    ids = result.multiTagResult.fiducialIDsUsed
+    values.append(len(ids))
+    values.extend(ids)
+    targets = result.getTargets()
+    values.append(len(targets))
+    for target in targets:
+        values.append(target.fiducialId)
+        values.append(target.poseAmbiguity)
+        values.append(target.yaw)
+        values.append(target.pitch)
+        values.extend(encode_transform(target.bestCameraToTarget))
+        values.extend(encode_transform(target.altCameraToTarget))
+    return values
+
+
+def decode_result(values: Sequence[float]) -> PhotonPipelineResult:
+    solve = PNPResult(
+        isPresent=bool(values[2]),
+        best=decode_transform(values, 3),
+        alt=decode_transform(values, 10),
+        bestReprojError=values[17],
+        altReprojError=values[18],
+        ambiguity=values[19],
+    )
+    id_count = int(values[20])
+    i = 21 + id_count
+    ids = [int(tag_id) for tag_id in values[21:i]]
+    target_count = int(values[i])
+    i += 1
+    targets = []
+    for _ in range(target_count):
+        targets.append(
+            PhotonTrackedTarget(
+                fiducialId=int(values[i]),
+                poseAmbiguity=values[i + 1],
+                yaw=values[i + 2],
+                pitch=values[i + 3],
+                bestCameraToTarget=decode_transform(values, i + 4),
+                altCameraToTarget=decode_transform(values, i + 4 + TRANSFORM_LENGTH),
+            )
+        )
+        i += TARGET_LENGTH
+    return PhotonPipelineResult(
+        latencyMillis=values[1],
+        timestampSec=values[0],
+        targets=targets,
+        multiTagResult=MultiTargetPNPResult(estimatedPose=solve, fiducialIDsUsed=ids),
+    )
+
+
+def encode_transform(transform: Transform3d) -> list[float]:
+    q = transform.rotation().getQuaternion()
+    return [transform.x, transform.y, transform.z, q.W(), q.X(), q.Y(), q.Z()]
+
+
+def decode_transform(values: Sequence[float], start: int) -> Transform3d:
+    x, y, z, w, i, j, k = values[start : start + TRANSFORM_LENGTH]
+    return Transform3d(Translation3d(x, y, z), Rotation3d(Quaternion(w, i, j, k)))
@@ -0,0 +1,32 @@
+class StallDetector:
+    """Detect a stalled motor from timestamped current and velocity samples.
+
+    A motor is stalling when it draws at least stall_current while turning
+    slower than stall_velocity. A single sample can look like that as a note
+    is pulled in, so it is only stalled once every sample over debounce_time
+    has been stalling.
+    """
+
+    def __init__(
+        self, stall_current: float, stall_velocity: float, debounce_time: float
+    ) -> None:
+        self.stall_current = stall_current
+        self.stall_velocity = stall_velocity
+        self.debounce_time = debounce_time
+        # timestamp of the first sample of the current stall
+        self.stall_start: float | None = None
+        self.stalled = False
+
+    def reset(self) -> None:
+        self.stall_start = None
+        self.stalled = False
+
+    def update(self, current: float, velocity: float, timestamp: float) -> bool:
+        """Add a sample, returning whether the motor has stalled."""
+        if abs(current) >= self.stall_current and abs(velocity) < self.stall_velocity:
+            if self.stall_start is None:
+                self.stall_start = timestamp
+            self.stalled = timestamp - self.stall_start >= self.debounce_time
+        else:
+            self.reset()
+        return self.stalled
@@ -0,0 +1,115 @@
+import math
+from collections.abc import Sequence
+
+from utilities.functions import constrain_angle
+
+
+class SwerveSetpoints:
+    """
+    Calculates the setpoints for every swerve module at once.
+
+    This does the same job as toSwerveModuleStates, desaturateWheelSpeeds,
+    rate_limit_module and SwerveModuleState.optimize, but keeps every module's
+    state in preallocated lists of floats rather than creating wpimath objects
+    for each module every loop.
+    """
+
+    # module speeds below this are treated as stopped
+    STOPPED_SPEED = 0.01  # m/s
+
+    def __init__(self, module_positions: Sequence[tuple[float, float]]) -> None:
+        """
+        module_positions: (x, y) of each module relative to the center of the robot
+        """
+        self.module_xs = [x for x, _ in module_positions]
+        self.module_ys = [y for _, y in module_positions]
+        num_modules = len(module_positions)
+
+        # rate limited velocity vector of each module
+        self.vxs = [0.0] * num_modules
+        self.vys = [0.0] * num_modules
+
+        # optimized module states, these are the setpoints sent to the modules
+        self.speeds = [0.0] * num_modules
+        self.angles = [0.0] * num_modules
+        # speed to drive at, reduced while the module is still turning
+        self.drive_speeds = [0.0] * num_modules
+        self.stopped = [True] * num_modules
+
+    def calculate(
+        self,
+        vx: float,
+        vy: float,
+        omega: float,
+        current_angles: Sequence[float],
+        max_wheel_speed: float,
+        accel_limit: float | None,
+        dt: float,
+    ) -> None:
+        """
+        Update the module setpoints for a robot relative chassis velocity.
+
+        current_angles: measured steer angle of each module in radians
+        accel_limit: maximum change in module velocity in m/s^2, or None to not limit
+        """
+        xs = self.module_xs
+        ys = self.module_ys
+        num_modules = len(xs)
+
+        # inverse kinematics
+        target_vxs = [vx - omega * y for y in ys]
+        target_vys = [vy + omega * x for x in xs]
+
+        # desaturate, preserving the ratio between module speeds
+        max_speed = max(map(math.hypot, target_vxs, target_vys))
+        if max_speed > max_wheel_speed:
+            scale = max_wheel_speed / max_speed
+            target_vxs = [v * scale for v in target_vxs]
+            target_vys = [v * scale for v in target_vys]
+
+        max_change = math.inf if accel_limit is None else accel_limit * dt
+
+        for i in range(num_modules):
+            cur_vx = self.vxs[i]
+            cur_vy = self.vys[i]
+            err_x = target_vxs[i] - cur_vx
+            err_y = target_vys[i] - cur_vy
+            err = math.hypot(err_x, err_y)
+            if err <= max_change:
+                new_vx = target_vxs[i]
+                new_vy = target_vys[i]
+            else:
+                new_vx = cur_vx + err_x / err * max_change
+                new_vy = cur_vy + err_y / err * max_change
+            self.vxs[i] = new_vx
+            self.vys[i] = new_vy
+
+            speed = math.hypot(new_vx, new_vy)
+            # hold the previous heading when stationary
+            angle = math.atan2(new_vy, new_vx) if speed != 0 else self.angles[i]
+
+            # never turn the module by more than 90 degrees, drive backwards instead
+            current_angle = current_angles[i]
+            if abs(constrain_angle(angle - current_angle)) > math.pi / 2:
+                speed = -speed
+                angle = constrain_angle(angle + math.pi)
+
+            self.speeds[i] = speed
+            self.angles[i] = angle
+            # rescale the speed target based on how close we are to being correctly aligned
+            self.drive_speeds[i] = speed * math.cos(angle - current_angle) ** 2
+            self.stopped[i] = abs(speed) < self.STOPPED_SPEED
+
+    def lock(
+        self, lock_angles: Sequence[float], current_angles: Sequence[float]
+    ) -> None:
+        """Point every module at lock_angles with zero speed."""
+        for i, (angle, current_angle) in enumerate(zip(lock_angles, current_angles)):
+            if abs(constrain_angle(angle - current_angle)) > math.pi / 2:
+                angle = constrain_angle(angle + math.pi)
+            self.vxs[i] = 0.0
+            self.vys[i] = 0.0
+            self.speeds[i] = 0.0
+            self.angles[i] = angle
+            self.drive_speeds[i] = 0.0
+            self.stopped[i] = False
@@ -0,0 +1,139 @@
+import inspect
+import typing
+from collections.abc import Callable, Sequence
+from typing import Any, TypeVar
+
+import ntcore
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+Getter = Callable[[], Any]
+Setter = Callable[[Any], Any]
+
+# NetworkTables topic types for the return annotations of feedback methods
+TOPIC_TYPES: dict[Any, Callable[[ntcore.Topic], Any]] = {
+    bool: ntcore.BooleanTopic,
+    int: ntcore.IntegerTopic,
+    float: ntcore.DoubleTopic,
+    str: ntcore.StringTopic,
+}
+
+
+def feedback_rate(hz: float, threshold: float = 0.0) -> Callable[[F], F]:
+    """
+    Declare a method as a feedback, read and published at its own rate.
+
+    This replaces magicbot's @feedback, which reads every feedback every loop.
+    The methods are found by collect_feedbacks.
+
+    hz: how many times a second to read the value
+    threshold: numeric values are only published once they have changed
+        by at least this much since the last published value
+    """
+
+    def decorator(f: F) -> F:
+        f._feedback_rate = hz  # type: ignore[attr-defined]
+        f._feedback_threshold = threshold  # type: ignore[attr-defined]
+        return f
+
+    return decorator
+
+
+def collect_feedbacks(
+    obj: object, table: ntcore.NetworkTable
+) -> list[tuple[Getter, Setter]]:
+    """
+    Find the feedback methods of an object, and setters publishing to table.
+
+    Like magicbot, a get_ prefix is dropped from the key.
+    """
+    feedbacks: list[tuple[Getter, Setter]] = []
+    for name, method in inspect.getmembers(obj, inspect.ismethod):
+        if not hasattr(method, "_feedback_rate"):
+            continue
+        key = name.removeprefix("get_")
+        topic_type = TOPIC_TYPES.get(typing.get_type_hints(method).get("return"))
+        setter: Setter
+        if topic_type is None:
+            setter = table.getEntry(key).setValue
+        else:
+            setter = topic_type(table.getTopic(key)).publish().set
+        feedbacks.append((method, setter))
+    return feedbacks
+
+
+class TelemetryItem:
+    def __init__(
+        self, getter: Getter, setter: Setter, period: int, offset: int, threshold: float
+    ) -> None:
+        self.getter = getter
+        self.setter = setter
+        # read on ticks where tick % period == offset
+        self.period = period
+        self.offset = offset
+        self.threshold = threshold
+        self.last_value: Any = None
+
+    def should_publish(self, value: Any) -> bool:
+        last_value = self.last_value
+        if self.threshold == 0.0 or last_value is None:
+            return True
+        if isinstance(value, float):
+            return abs(value - last_value) >= self.threshold
+        return value != last_value
+
+
+class TelemetryScheduler:
+    """
+    Publishes feedback values, each at its own rate.
+
+    Feedbacks without a feedback_rate are read every loop. Items which
+    share a rate are spread across ticks so slow items don't all land in
+    the same loop. Everything due in a tick is read first and then all the
+    values are published together.
+    """
+
+    def __init__(self, loop_period: float) -> None:
+        self.loop_rate = 1 / loop_period
+        self.items: list[TelemetryItem] = []
+        self.tick = 0
+        # number of items at each period, used to stagger their offsets
+        self.period_counts: dict[int, int] = {}
+        self.pending: list[tuple[TelemetryItem, Any]] = []
+
+    def add_feedbacks(self, feedbacks: Sequence[tuple[Getter, Setter]]) -> None:
+        for getter, setter in feedbacks:
+            hz = getattr(getter, "_feedback_rate", self.loop_rate)
+            threshold = getattr(getter, "_feedback_threshold", 0.0)
+            period = max(1, round(self.loop_rate / hz))
+            count = self.period_counts.get(period, 0)
+            self.period_counts[period] = count + 1
+            self.items.append(
+                TelemetryItem(getter, setter, period, count % period, threshold)
+            )
+
+    def update(self, on_error: Callable[[], None]) -> None:
+        """
+        Read and publish everything due this tick. Call once per loop.
+
+        on_error is called from within the except block if a getter raises.
+        """
+        tick = self.tick
+        self.tick += 1
+
+        pending = self.pending
+        for item in self.items:
+            if tick % item.period != item.offset:
+                continue
+            try:
+                value = item.getter()
+            except Exception:
+                on_error()
+            else:
+                if item.should_publish(value):
+                    pending.append((item, value))
+
+        for item, value in pending:
+            item.setter(value)
+            item.last_value = value
+        pending.clear()
@@ -0,0 +1,174 @@
+import math
+import random
+from collections import deque
+
+from photonlibpy.multiTargetPNPResult import MultiTargetPNPResult, PNPResult
+from photonlibpy.photonPipelineResult import PhotonPipelineResult
+from photonlibpy.photonTrackedTarget import PhotonTrackedTarget
+from wpimath.geometry import (
+    Pose2d,
+    Pose3d,
+    Rotation3d,
+    Transform3d,
+    Translation3d,
+)
+
+from components.vision import VisualLocalizer
+from utilities.game import apriltag_layout
+
+
+class SimulatedCamera:
+    """
+    Stands in for a PhotonVision camera in simulation.
+
+    Tags from the field layout are projected through the localizer's
+    robot_to_camera transform from the true robot pose. The results a real
+    coprocessor would send are handed to the localizer's ingest path, so the
+    rest of the vision pipeline runs unchanged.
+
+    The noise model is deliberately simple: position noise grows with
+    distance to the tag and headings get a fixed amount of noise. The
+    alternate solution of each tag has its yaw mirrored about the line of
+    sight, which is where the ambiguous solution of a planar target ends up.
+    """
+
+    def __init__(
+        self,
+        localizer: VisualLocalizer,
+        *,
+        horizontal_fov: float = math.radians(70),
+        vertical_fov: float = math.radians(55),
+        max_distance: float = 6.0,  # m
+        fps: float = 30.0,
+        latency: float = 0.03,  # s
+        # std dev of the position of a tag per metre away from the camera
+        linear_noise: float = 0.005,
+        angular_noise: float = math.radians(0.5),
+        # ambiguity of a single tag per metre away from the camera
+        ambiguity_per_metre: float = 0.04,
+        seed: int | None = None,
+    ) -> None:
+        self.localizer = localizer
+        self.robot_to_camera = localizer.robot_to_camera
+        self.half_horizontal_fov = horizontal_fov / 2
+        self.half_vertical_fov = vertical_fov / 2
+        self.max_distance = max_distance
+        self.frame_period = 1 / fps
+        self.latency = latency
+        self.linear_noise = linear_noise
+        self.angular_noise = angular_noise
+        self.ambiguity_per_metre = ambiguity_per_metre
+        self.random = random.Random(seed)
+
+        self.tags = [(tag.ID, tag.pose) for tag in apriltag_layout.getTags()]
+        self.next_capture = 0.0
+        # results captured but not yet delivered, oldest first
+        self.in_flight: deque[tuple[float, PhotonPipelineResult]] = deque()
+        self.frames_captured = 0
+
+    def update(self, now: float, robot_pose: Pose2d) -> None:
+        """Capture any frame due at the true robot pose, and deliver any result due."""
+        if now >= self.next_capture:
+            self.next_capture = max(self.next_capture + self.frame_period, now)
+            self.frames_captured += 1
+            result = self.capture(now, robot_pose)
+            self.in_flight.append((now + self.latency, result))
+
+        in_flight = self.in_flight
+        while in_flight and in_flight[0][0] <= now:
+            _, result = in_flight.popleft()
+            self.localizer.ingest_result(result)
+
+    def capture(self, timestamp: float, robot_pose: Pose2d) -> PhotonPipelineResult:
+        """The result the camera would produce at the given robot pose."""
+        camera_pose = Pose3d(robot_pose).transformBy(self.robot_to_camera)
+        targets = []
+        for tag_id, tag_pose in self.tags:
+            target = self.observe(camera_pose, tag_id, tag_pose)
+            if target is not None:
+                targets.append(target)
+
+        result = PhotonPipelineResult(
+            latencyMillis=self.latency * 1000, timestampSec=timestamp, targets=targets
+        )
+        if len(targets) > 1:
+            result.multiTagResult = self.solve_multi_tag(camera_pose, targets)
+        return result
+
+    def observe(
+        self, camera_pose: Pose3d, tag_id: int, tag_pose: Pose3d
+    ) -> PhotonTrackedTarget | None:
+        camera_to_tag = Transform3d(camera_pose, tag_pose)
+        x = camera_to_tag.x
+        y = camera_to_tag.y
+        z = camera_to_tag.z
+        if x <= 0:
+            return None
+        distance = camera_to_tag.translation().norm()
+        if distance > self.max_distance:
+            return None
+        yaw = math.atan2(y, x)
+        pitch = math.atan2(z, math.hypot(x, y))
+        if abs(yaw) > self.half_horizontal_fov or abs(pitch) > self.half_vertical_fov:
+            return None
+        # the camera has to be in front of the tag to see it
+        if Transform3d(tag_pose, camera_pose).x <= 0:
+            return None
+
+        gauss = self.random.gauss
+        linear_std = self.linear_noise * distance
+        best = Transform3d(
+            Translation3d(
+                x + gauss(0, linear_std),
+                y + gauss(0, linear_std),
+                z + gauss(0, linear_std),
+            ),
+            camera_to_tag.rotation().rotateBy(
+                Rotation3d(0, 0, gauss(0, self.angular_noise))
+            ),
+        )
+        # mirror the tag's yaw away from the line of sight, which keeps the
+        # alternate robot pose on the ground
+        line_of_sight = Rotation3d(0, -pitch, yaw)
+        relative = best.rotation().rotateBy(-line_of_sight)
+        alt = Transform3d(
+            best.translation(),
+            Rotation3d(relative.x, relative.y, -relative.z).rotateBy(line_of_sight),
+        )
+        return PhotonTrackedTarget(
+            yaw=-math.degrees(yaw),
+            pitch=math.degrees(pitch),
+            fiducialId=tag_id,
+            bestCameraToTarget=best,
+            altCameraToTarget=alt,
+            poseAmbiguity=min(1.0, self.ambiguity_per_metre * distance),
+        )
+
+    def solve_multi_tag(
+        self, camera_pose: Pose3d, targets: list[PhotonTrackedTarget]
+    ) -> MultiTargetPNPResult:
+        """Stand in for the coprocessor's solve using every tag in view."""
+        mean_distance = sum(
+            target.bestCameraToTarget.translation().norm() for target in targets
+        ) / len(targets)
+        gauss = self.random.gauss
+        linear_std = self.linear_noise * mean_distance / math.sqrt(len(targets))
+        angular_std = self.angular_noise / math.sqrt(len(targets))
+        field_to_camera = Transform3d(
+            Translation3d(
+                camera_pose.x + gauss(0, linear_std),
+                camera_pose.y + gauss(0, linear_std),
+                camera_pose.z + gauss(0, linear_std),
+            ),
+            camera_pose.rotation().rotateBy(Rotation3d(0, 0, gauss(0, angular_std))),
+        )
+        return MultiTargetPNPResult(
+            estimatedPose=PNPResult(
+                isPresent=True,
+                best=field_to_camera,
+                alt=field_to_camera,
+                bestReprojError=0.3,
+                altReprojError=0.3,
+            ),
+            fiducialIDsUsed=[target.fiducialId for target in targets],
+        )